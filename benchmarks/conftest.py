@@ -0,0 +1,62 @@
+"""
+效能基準測試共用 fixture - 載入錄製的 OWM / One Call / 環境部 AQI 回應
+"""
+from pathlib import Path
+
+import pytest
+
+from weather_analysis import payload
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def _load_bytes(name: str) -> bytes:
+    return (FIXTURES_DIR / name).read_bytes()
+
+
+@pytest.fixture(scope="session")
+def weather_raw() -> bytes:
+    """OWM /data/2.5/weather 原始回應"""
+    return _load_bytes("owm_weather.json")
+
+
+@pytest.fixture(scope="session")
+def forecast_raw() -> bytes:
+    """OWM /data/2.5/forecast 原始回應（40 筆 3 小時預報）"""
+    return _load_bytes("owm_forecast.json")
+
+
+@pytest.fixture(scope="session")
+def onecall_raw() -> bytes:
+    """OWM /data/3.0/onecall 原始回應"""
+    return _load_bytes("owm_onecall.json")
+
+
+@pytest.fixture(scope="session")
+def aqi_raw() -> bytes:
+    """環境部 aqx_p_432 原始回應"""
+    return _load_bytes("moenv_aqi.json")
+
+
+@pytest.fixture(scope="session")
+def current_weather(weather_raw):
+    from weather_analysis.weather_api import parse_current_weather
+    return parse_current_weather(payload.loads(weather_raw), "Taipei")
+
+
+@pytest.fixture(scope="session")
+def forecast_list(forecast_raw):
+    from weather_analysis.weather_api import parse_forecast
+    return parse_forecast(payload.loads(forecast_raw))
+
+
+@pytest.fixture(scope="session")
+def daily_summary(forecast_list):
+    from weather_analysis.weather_api import build_daily_summary
+    return build_daily_summary(forecast_list)
+
+
+@pytest.fixture(scope="session")
+def aqi_records(aqi_raw):
+    from weather_analysis.aqi_api import parse_aqi_payload
+    return parse_aqi_payload(payload.loads(aqi_raw))
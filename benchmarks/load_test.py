@@ -0,0 +1,282 @@
+"""
+多使用者負載測試 - 以 Streamlit AppTest 模擬 N 個同時連線的 session
+
+每個 session 在獨立執行緒中重複執行 app.py 的 rerun（切換城市 / 語言、按更新鈕、
+觸發 AI 分析），上游 API 全部導向本地模擬器（weather_analysis.emulator）。
+
+報告：
+- rerun 延遲百分位（依動作分組）
+- 上游呼叫次數（依端點 / 狀態碼）
+- 各階段耗時（weather_analysis.metrics 的 weather_stage_seconds）
+- 每個 session 的記憶體（行程 RSS 增量 / session 數、session_state 序列化大小）
+
+執行方式：
+    uv run python -m benchmarks.load_test --sessions 8 --iterations 10 --latency-ms 80
+"""
+import argparse
+import logging
+import os
+import pickle
+import random
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+APP_PATH = Path(__file__).resolve().parent.parent / "src" / "weather_analysis" / "app.py"
+
+# 模擬使用者的動作與權重
+ACTIONS = {
+    "switch_city": 6,
+    "switch_lang": 1,
+    "refresh": 1,
+    "ai_analysis": 1,
+    "idle_rerun": 3,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb() -> float:
+    """行程 RSS 峰值（MB；Linux 單位為 KB，macOS 為 bytes）"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def start_emulator(settings, port: int):
+    """在背景執行緒啟動模擬器，回傳 ASGI app（可讀取 app.state.calls）"""
+    import uvicorn
+
+    from weather_analysis.emulator import create_app
+
+    app = create_app(settings)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("emulator failed to start")
+        time.sleep(0.05)
+    return app
+
+
+def _serialize_script_compile() -> None:
+    """
+    Streamlit 每次 rerun 以 ast.parse 處理腳本（magic）；CPython 3.11 的 ast 模組
+    在多執行緒同時 parse 時可能丟出 SystemError，僅對此步驟加鎖。
+    """
+    from streamlit.runtime.scriptrunner import magic
+
+    original = magic.add_magic
+    lock = threading.Lock()
+
+    def add_magic(code, script_path):
+        with lock:
+            return original(code, script_path)
+
+    magic.add_magic = add_magic
+
+
+def _keep_mock_runtime() -> None:
+    """
+    AppTest 每次 run 都把全域 Runtime._instance 換成 mock、結束時設回 None；
+    多個 session 並行時，其他執行緒可能在 None 的空檔呼叫 st.context 而失敗。
+    改為在空檔回傳最近一次的 mock runtime。
+    """
+    from streamlit.runtime.runtime import Runtime
+
+    original = Runtime.instance.__func__
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        return original(cls)
+
+    Runtime.instance = classmethod(instance)
+
+
+def _session_state_bytes(at) -> int:
+    """session_state 可序列化部分的大小（近似每個 session 保存的資料量）"""
+    total = 0
+    for value in at.session_state.to_dict().values():
+        try:
+            total += len(pickle.dumps(value))
+        except Exception:
+            pass
+    return total
+
+
+class Session:
+    """單一模擬使用者"""
+
+    def __init__(self, index: int, timeout: float, seed: int):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.rng = random.Random(seed + index)
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self.errors = 0
+
+    def _timed(self, action: str, fn) -> None:
+        start = time.perf_counter()
+        try:
+            fn()
+            if self.at.exception:
+                self.errors += 1
+        except Exception:
+            self.errors += 1
+        self.timings[action].append(time.perf_counter() - start)
+
+    def _selectbox(self, index: int):
+        return self.at.sidebar.selectbox[index]
+
+    def step(self, action: str) -> None:
+        at = self.at
+        if action == "switch_city":
+            box = self._selectbox(1)
+            options = [o for o in box.options if o != box.value]
+            self._timed(action, lambda: box.select(self.rng.choice(options)).run())
+        elif action == "switch_lang":
+            box = self._selectbox(0)
+            options = [o for o in box.options if o != box.value]
+            self._timed(action, lambda: box.select(options[0]).run())
+        elif action == "refresh":
+            self._timed(action, lambda: at.sidebar.button[0].click().run())
+        elif action == "ai_analysis":
+            buttons = [b for b in at.main.button if b.proto.type == "primary"]
+            if buttons:
+                self._timed(action, lambda: buttons[0].click().run())
+        else:
+            self._timed(action, at.run)
+
+    def run(self, iterations: int) -> None:
+        self._timed("first_load", self.at.run)
+        names, weights = zip(*ACTIONS.items())
+        for _ in range(iterations):
+            self.step(self.rng.choices(names, weights)[0])
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def format_report(sessions: list[Session], calls, elapsed: float, rss_before: float, rss_after: float) -> str:
+    lines = [f"sessions={len(sessions)}  wall={elapsed:.1f}s", ""]
+    by_action: dict[str, list[float]] = defaultdict(list)
+    for s in sessions:
+        for action, values in s.timings.items():
+            by_action[action].extend(values)
+    everything = [v for values in by_action.values() for v in values]
+    by_action["ALL"] = everything
+
+    lines.append(f"{'action':<14}{'n':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for action, values in by_action.items():
+        if not values:
+            continue
+        lines.append(
+            f"{action:<14}{len(values):>6}"
+            f"{_percentile(values, 50) * 1000:>10.0f}{_percentile(values, 90) * 1000:>10.0f}"
+            f"{_percentile(values, 99) * 1000:>10.0f}{max(values) * 1000:>10.0f}"
+        )
+    if everything:
+        lines.append(f"reruns/s: {len(everything) / elapsed:.2f}  errors: {sum(s.errors for s in sessions)}")
+
+    lines += ["", f"{'upstream':<28}{'status':>8}{'calls':>8}"]
+    for (path, status), count in sorted(calls.items()):
+        lines.append(f"{path:<28}{status:>8}{count:>8}")
+    lines.append(f"{'total':<28}{'':>8}{sum(calls.values()):>8}")
+
+    from weather_analysis import metrics
+
+    stages = sorted(metrics.STAGE_SECONDS.series(), key=lambda row: -row[2])
+    if stages:
+        lines += ["", f"{'stage':<28}{'n':>8}{'total s':>10}{'mean ms':>10}"]
+        for labels, count, total in stages:
+            lines.append(f"{labels['stage']:<28}{count:>8}{total:>10.2f}{total / count * 1000:>10.1f}")
+
+    state_sizes = [_session_state_bytes(s.at) for s in sessions]
+    lines += [
+        "",
+        f"peak RSS: {rss_before:.0f} MB → {rss_after:.0f} MB"
+        f"  (+{(rss_after - rss_before) / max(len(sessions), 1):.1f} MB / session)",
+        f"session_state: {statistics.mean(state_sizes) / 1024:.1f} KB / session (pickled)",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for app.py")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=10, help="reruns per session after first load")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--quota-per-minute", type=int, default=0)
+    args = parser.parse_args()
+
+    # 設定須在匯入 weather_analysis.config 之前完成
+    port = _free_port()
+    tmp = tempfile.mkdtemp(prefix="weather-load-")
+    os.environ["UPSTREAM_EMULATOR_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["HISTORY_DB_PATH"] = os.path.join(tmp, "history.sqlite3")
+    os.environ["CACHE_CHECKPOINT_PATH"] = ""  # 每次都從冷快取開始
+    for key in ("OPENWEATHER_API_KEY", "ONECALL_API_KEY", "AQI_API_KEY", "OPENAI_API_KEY"):
+        os.environ[key] = "load-test"
+
+    from weather_analysis.emulator import EmulatorSettings
+
+    emulator_app = start_emulator(EmulatorSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        quota_per_minute=args.quota_per_minute,
+    ), port)
+
+    # AppTest 在 bare mode 下的警告（ScriptRunContext、棄用提示）會淹沒報告
+    logging.disable(logging.WARNING)
+    _serialize_script_compile()
+    _keep_mock_runtime()
+
+    # 先載入重量級相依套件，RSS 增量才反映 session 本身
+    import folium  # noqa: F401
+    import streamlit_folium  # noqa: F401
+    from streamlit.testing.v1 import AppTest  # noqa: F401
+
+    from weather_analysis import ai_analyzer, visualization  # noqa: F401
+
+    rss_before = _rss_mb()
+    sessions = [Session(i, args.timeout, args.seed) for i in range(args.sessions)]
+    threads = [threading.Thread(target=s.run, args=(args.iterations,)) for s in sessions]
+    start = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - start
+
+    print(format_report(sessions, emulator_app.state.calls, elapsed, rss_before, _rss_mb()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+資料管線效能基準 - 以錄製的上游回應重播解析、彙整、警報、風險掃描、AQI、旅遊推薦與圖表建立
+
+執行方式見 README「效能基準測試」。
+"""
+
+import pytest
+
+from weather_analysis import config, payload
+from weather_analysis.alerts import evaluate_alerts
+from weather_analysis.aqi_api import get_all_cities_aqi, parse_aqi_payload
+from weather_analysis.hazards import scan_forecasts
+from weather_analysis.travel import recommend_best_days
+from weather_analysis.visualization import WeatherCharts
+from weather_analysis.weather_api import (
+    build_daily_summary, parse_current_weather, parse_forecast, parse_onecall_uvi,
+)
+
+
+# ── 解析（含 JSON 解碼） ──
+
+
+def test_parse_current_weather(benchmark, weather_raw):
+    result = benchmark(lambda: parse_current_weather(payload.loads(weather_raw), "Taipei"))
+    assert result["temperature"]
+
+
+def test_parse_forecast(benchmark, forecast_raw):
+    result = benchmark(lambda: parse_forecast(payload.loads(forecast_raw)))
+    assert len(result) == 40
+
+
+def test_parse_onecall_uvi(benchmark, onecall_raw):
+    result = benchmark(lambda: parse_onecall_uvi(payload.loads(onecall_raw)))
+    assert result["uvi"] > 0
+
+
+def test_parse_aqi(benchmark, aqi_raw):
+    result = benchmark(lambda: parse_aqi_payload(payload.loads(aqi_raw)))
+    assert len(result) > 12
+
+
+# ── 純邏輯 ──
+
+
+def test_daily_forecast_summary(benchmark, forecast_list):
+    result = benchmark(build_daily_summary, forecast_list)
+    assert len(result) >= 5
+
+
+def test_evaluate_alerts(benchmark, current_weather, daily_summary):
+    benchmark(evaluate_alerts, current_weather, daily_summary)
+
+
+def test_get_all_cities_aqi(benchmark, aqi_records):
+    result = benchmark(get_all_cities_aqi, aqi_records)
+    assert len(result) == 12
+
+
+def test_recommend_best_days(benchmark, daily_summary):
+    result = benchmark(recommend_best_days, daily_summary)
+    assert any(day["recommended"] for day in result)
+
+
+def test_hazard_scan(benchmark, forecast_list):
+    """12 城市 × 40 時段全國風險掃描"""
+    forecasts = {city: forecast_list for city in config.TAIWAN_CITIES_COORDS}
+    result = benchmark(scan_forecasts, forecasts, forecast_list[0].datetime)
+    assert result
+
+
+def test_nationwide_pipeline(benchmark, forecast_raw, weather_raw):
+    """12 城市：解析 → 每日摘要 → 警報 → 旅遊推薦"""
+    def run():
+        for city in config.TAIWAN_CITIES_COORDS:
+            current = parse_current_weather(payload.loads(weather_raw), city)
+            daily = build_daily_summary(parse_forecast(payload.loads(forecast_raw)))
+            evaluate_alerts(current, daily)
+            recommend_best_days(daily)
+
+    benchmark(run)
+
+
+# ── 圖表建立 ──
+
+
+def _chart_args(name, forecast_list, daily_summary):
+    city_data = [
+        {"city": city, "daily_summary": daily_summary}
+        for city in list(config.TAIWAN_CITIES_COORDS)[:4]
+    ]
+    accuracy = [
+        {"lead_hours": h, "count": 10, "mae": 0.5 + h / 48, "bias": 0.1}
+        for h in range(3, 121, 3)
+    ]
+    return {
+        "create_temperature_chart": (forecast_list,),
+        "create_daily_summary_chart": (daily_summary,),
+        "create_humidity_rain_chart": (forecast_list,),
+        "create_daily_pop_chart": (daily_summary,),
+        "create_wind_speed_chart": (forecast_list,),
+        "create_comparison_temp_chart": (city_data,),
+        "create_comparison_rain_chart": (city_data,),
+        "create_travel_radar_chart": (recommend_best_days(daily_summary)[0]["scores"],),
+        "create_temp_heatmap": (forecast_list,),
+        "create_rain_heatmap": (forecast_list,),
+        "create_forecast_accuracy_chart": (accuracy,),
+    }[name]
+
+
+CHART_NAMES = sorted(name for name in vars(WeatherCharts) if name.startswith("create_"))
+
+
+@pytest.mark.parametrize("chart", CHART_NAMES)
+def test_create_chart(benchmark, chart, forecast_list, daily_summary):
+    args = _chart_args(chart, forecast_list, daily_summary)
+    fig = benchmark(getattr(WeatherCharts, chart), *args)
+    assert fig.data
@@ -1,18 +1,69 @@
 """
 AI智慧分析模組 - 使用OpenAI GPT進行天氣智慧分析，無Key時使用規則引擎
 """
-from openai import OpenAI
-from weather_analysis import config
+import time
+
+from openai import APITimeoutError, OpenAI
+from weather_analysis import cache, config, deadline, metrics, upstream
 from weather_analysis.i18n import t, weekday_name
 
 
+@cache.cached("ai", ttl=config.CACHE_EXPIRE_MINUTES * 60, ignore=("client",))
+def _cached_completion(client, model, system_msg, user_msg, temperature, max_tokens):
+    """
+    快取 GPT 回應（key 為模型 + 提示詞 + 參數，不含 client / API Key）
+
+    提示詞內含天氣摘要，資料更新後 key 隨之改變；失敗（含限流、斷路、時間預算用完）時拋出例外，不快取。
+    逾時已被時間預算縮短時，請求逾時視同預算用完（拋出 DeadlineExceeded，不計入斷路器失敗）。
+    """
+    timeout = deadline.clamp(config.AI_TIMEOUT_SECONDS)
+    breaker = upstream.check_circuit(upstream.OPENAI)
+    try:
+        upstream.throttle(upstream.OPENAI, config.OPENAI_BASE_URL or "https://api.openai.com/v1",
+                          getattr(client, "api_key", ""))
+    except upstream.RateLimited:
+        breaker.release()
+        raise
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg},
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout,
+        )
+        status = "200"
+        return response.choices[0].message.content
+    except APITimeoutError as e:
+        if timeout < config.AI_TIMEOUT_SECONDS:
+            status = "deadline"
+            raise deadline.DeadlineExceeded(f"rerun deadline exceeded ({timeout:.2f}s timeout)") from e
+        raise
+    except Exception as e:
+        status = str(getattr(e, "status_code", "error"))
+        raise
+    finally:
+        upstream.observe(upstream.OPENAI, time.perf_counter() - start, status)
+        if status == "deadline":
+            breaker.release()
+        elif status == "error" or status.startswith("5"):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+
 class WeatherAIAnalyzer:
     """天氣AI分析器類別"""
 
     def __init__(self, api_key=None):
         self.api_key = api_key or ""
         self.model = config.OPENAI_MODEL
-        self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+        self.client = OpenAI(api_key=self.api_key, base_url=config.OPENAI_BASE_URL) if self.api_key else None
 
     def _has_openai(self):
         """檢查是否有可用的 OpenAI client"""
@@ -51,18 +102,17 @@ class WeatherAIAnalyzer:
         return self._call_openai(system_msg, prompt)
 
     def _call_openai(self, system_msg, user_msg, temperature=0.7):
-        """統一的 OpenAI API 呼叫"""
+        """
+        統一的 OpenAI API 呼叫（相同提示詞的結果跨 session 共用快取）
+
+        時間預算用完時回傳 None（由 comprehensive_analysis 改用規則引擎）
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": user_msg},
-                ],
-                max_tokens=config.AI_MAX_TOKENS,
-                temperature=temperature,
+            return _cached_completion(
+                self.client, self.model, system_msg, user_msg, temperature, config.AI_MAX_TOKENS,
             )
-            return response.choices[0].message.content
+        except deadline.DeadlineExceeded:
+            return None
         except Exception as e:
             return t("ai.error", e=str(e))
 
@@ -335,11 +385,12 @@ class WeatherAIAnalyzer:
     #  綜合分析入口
     # ──────────────────────────────────────────────
 
+    @metrics.timed("ai_analysis")
     def comprehensive_analysis(self, current_weather, daily_summary):
         """
         綜合智慧分析（包含所有分析項目）
 
-        有 OpenAI Key → GPT 深度分析（失敗時 fallback）
+        有 OpenAI Key → GPT 深度分析（失敗時 fallback；超出時間預算的項目改用規則引擎）
         無 OpenAI Key → 規則引擎基礎分析
         """
         if not self._has_openai():
@@ -359,7 +410,8 @@ class WeatherAIAnalyzer:
             error_prefix_en = "AI analysis error"
             error_count = sum(
                 1 for v in result.values()
-                if isinstance(v, str) and (v.startswith(error_prefix_zh) or v.startswith(error_prefix_en))
+                if v is None
+                or isinstance(v, str) and (v.startswith(error_prefix_zh) or v.startswith(error_prefix_en))
             )
             if error_count >= 4:
                 fallback = self.get_fallback_analysis(current_weather, daily_summary)
@@ -368,6 +420,11 @@ class WeatherAIAnalyzer:
                     + fallback["weather_analysis"]
                 )
                 return fallback
+            missing = [k for k, v in result.items() if v is None]
+            if missing:
+                fallback = self.get_fallback_analysis(current_weather, daily_summary)
+                for k in missing:
+                    result[k] = fallback[k]
             return result
         except Exception:
             return self.get_fallback_analysis(current_weather, daily_summary)
@@ -1,12 +1,15 @@
 """
 天氣警報模組 - 規則引擎警報 + One Call API 3.0 官方警報
 """
+import threading
+from collections.abc import Collection, Sequence
 from dataclasses import dataclass
 from enum import Enum
 
-import requests
-from weather_analysis import config
-from weather_analysis.i18n import t
+import numpy as np
+
+from weather_analysis import config, metrics, payload
+from weather_analysis.i18n import set_extra_translations, t
 
 
 class AlertSeverity(Enum):
@@ -14,7 +17,7 @@ class AlertSeverity(Enum):
     DANGER = "danger"    # 紅色 st.error
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class WeatherAlert:
     severity: AlertSeverity
     title_key: str      # i18n key
@@ -22,174 +25,352 @@ class WeatherAlert:
     icon: str
     value: float
     threshold: float
+    event: str = ""        # 官方警報原文（不走 i18n）
+    description: str = ""
+
+
+# ── 規則表 ──
+#
+# 規則以資料描述（指標、比較運算、門檻、嚴重度、遲滯、i18n key），由 CompiledRules 編譯後
+# 一次評估所有規則：evaluate_alerts 評估單一城市目前值，hazards 以 numpy 評估全國 × 全部預報時段。
+# 營運端可用 ALERT_RULES_PATH 指向的 JSON 檔新增 / 取代規則，不需改程式（見 load_rules）。
 
+# 規則可用的指標（hazards 陣列第三維依此順序）
+ALERT_METRICS = ("temperature", "feels_like", "wind_speed", "humidity", "pop", "temp_swing")
 
-def evaluate_alerts(current_weather, daily_summary) -> list[WeatherAlert]:
+# 比較運算 → (方向, 是否嚴格)；方向 -1 的規則以負值比較，所有規則統一為「大於」
+_OPS = {">": (1, True), ">=": (1, False), "<": (-1, True), "<=": (-1, False)}
+
+
+@dataclass(frozen=True, slots=True)
+class AlertRule:
     """
-    規則引擎警報（免費 API 資料）
+    門檻規則。
 
-    根據即時天氣與每日摘要資料，判斷是否需要發出警報。
+    同一指標、同一方向的多條規則為分級：同時成立時只保留門檻最極端的一條。
+    hysteresis：觸發後數值需回到門檻另一側超過此幅度才解除（避免在門檻附近反覆觸發 / 解除）。
+    title_key 同時作為規則的識別名稱，不可重複。
     """
-    alerts = []
-    if not current_weather:
-        return alerts
+    metric: str
+    op: str
+    threshold: float
+    severity: AlertSeverity
+    title_key: str      # i18n key
+    message_key: str    # i18n key（format 參數 v=數值、t=門檻）
+    icon: str
+    hysteresis: float = 0.0
 
-    temp = current_weather["temperature"]
-    humidity = current_weather["humidity"]
-    wind = current_weather["wind_speed"]
+    def __post_init__(self):
+        if self.metric not in ALERT_METRICS:
+            raise ValueError(f"{self.title_key}: unknown metric {self.metric!r}")
+        if self.op not in _OPS:
+            raise ValueError(f"{self.title_key}: unknown operator {self.op!r}")
+        if self.hysteresis < 0:
+            raise ValueError(f"{self.title_key}: hysteresis must be >= 0")
 
-    # 取得今日降雨機率（從 daily_summary）
-    today_pop = 0
-    if daily_summary:
-        today_pop = daily_summary[0].get("pop_max", 0)
 
-    # ── 極端高溫 >36°C (DANGER) ──
-    if temp > 36:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.DANGER,
-            title_key="alert.extreme_heat_title",
-            message_key="alert.extreme_heat_msg",
-            icon="🔥",
-            value=temp,
-            threshold=36,
-        ))
-    # ── 高溫 >33°C (CAUTION) ──
-    elif temp > 33:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.CAUTION,
-            title_key="alert.high_temp_title",
-            message_key="alert.high_temp_msg",
-            icon="🌡️",
-            value=temp,
-            threshold=33,
-        ))
+_D, _C = AlertSeverity.DANGER, AlertSeverity.CAUTION
 
-    # ── 極端低溫 <5°C (DANGER) ──
-    if temp < 5:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.DANGER,
-            title_key="alert.extreme_cold_title",
-            message_key="alert.extreme_cold_msg",
-            icon="🥶",
-            value=temp,
-            threshold=5,
-        ))
-    # ── 低溫 <10°C (CAUTION) ──
-    elif temp < 10:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.CAUTION,
-            title_key="alert.low_temp_title",
-            message_key="alert.low_temp_msg",
-            icon="❄️",
-            value=temp,
-            threshold=10,
-        ))
+# 內建規則（依此順序輸出警報）
+ALERT_RULES = (
+    AlertRule("temperature", ">", 36, _D, "alert.extreme_heat_title", "alert.extreme_heat_msg", "🔥", 1),
+    AlertRule("temperature", ">", 33, _C, "alert.high_temp_title", "alert.high_temp_msg", "🌡️", 1),
+    AlertRule("temperature", "<", 5, _D, "alert.extreme_cold_title", "alert.extreme_cold_msg", "🥶", 1),
+    AlertRule("temperature", "<", 10, _C, "alert.low_temp_title", "alert.low_temp_msg", "❄️", 1),
+    AlertRule("wind_speed", ">", 15, _D, "alert.strong_wind_title", "alert.strong_wind_msg", "🌪️", 2),
+    AlertRule("wind_speed", ">", 10, _C, "alert.high_wind_title", "alert.high_wind_msg", "💨", 2),
+    AlertRule("humidity", ">", 90, _C, "alert.high_humidity_title", "alert.high_humidity_msg", "💧", 5),
+    AlertRule("pop", ">", 80, _D, "alert.heavy_rain_title", "alert.heavy_rain_msg", "⛈️", 10),
+    AlertRule("pop", ">", 60, _C, "alert.rain_title", "alert.rain_msg", "🌧️", 10),
+    AlertRule("temp_swing", ">", 10, _C, "alert.temp_swing_title", "alert.temp_swing_msg", "🌡️"),
+)
 
-    # ── 強風 >15 m/s (DANGER) ──
-    if wind > 15:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.DANGER,
-            title_key="alert.strong_wind_title",
-            message_key="alert.strong_wind_msg",
-            icon="🌪️",
-            value=wind,
-            threshold=15,
-        ))
-    # ── 大風 >10 m/s (CAUTION) ──
-    elif wind > 10:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.CAUTION,
-            title_key="alert.high_wind_title",
-            message_key="alert.high_wind_msg",
-            icon="💨",
-            value=wind,
-            threshold=10,
-        ))
 
-    # ── 高濕 >90% (CAUTION) ──
-    if humidity > 90:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.CAUTION,
-            title_key="alert.high_humidity_title",
-            message_key="alert.high_humidity_msg",
-            icon="💧",
-            value=humidity,
-            threshold=90,
-        ))
+class CompiledRules:
+    """
+    編譯後的規則表。
 
-    # ── 暴雨 pop>80% (DANGER) ──
-    if today_pop > 80:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.DANGER,
-            title_key="alert.heavy_rain_title",
-            message_key="alert.heavy_rain_msg",
-            icon="⛈️",
-            value=today_pop,
-            threshold=80,
-        ))
-    # ── 降雨 pop>60% (CAUTION) ──
-    elif today_pop > 60:
-        alerts.append(WeatherAlert(
-            severity=AlertSeverity.CAUTION,
-            title_key="alert.rain_title",
-            message_key="alert.rain_msg",
-            icon="🌧️",
-            value=today_pop,
-            threshold=60,
-        ))
+    規則欄位轉為 numpy 陣列：evaluate 以一次廣播比較所有規則 × 城市 × 時段，
+    遲滯與分級也都是整個陣列一次運算，不逐條規則迴圈（成本隨規則數線性增加，無 Python 逐條開銷）。
+    單一城市目前值（evaluate_alerts）的量太小，numpy 的固定開銷反而較慢，改用 evaluate_point。
+    """
 
-    # ── 日溫差 >10°C (CAUTION) ──
-    if daily_summary:
-        day = daily_summary[0]
-        temp_swing = day["temp_max"] - day["temp_min"]
-        if temp_swing > 10:
-            alerts.append(WeatherAlert(
-                severity=AlertSeverity.CAUTION,
-                title_key="alert.temp_swing_title",
-                message_key="alert.temp_swing_msg",
-                icon="🌡️",
-                value=round(temp_swing, 1),
-                threshold=10,
-            ))
+    def __init__(self, rules: Sequence[AlertRule]):
+        self.rules = tuple(rules)
+        keys = [rule.title_key for rule in self.rules]
+        duplicated = sorted({k for k in keys if keys.count(k) > 1})
+        if duplicated:
+            raise ValueError(f"duplicated rule title_key: {', '.join(duplicated)}")
+        self.index = {key: r for r, key in enumerate(keys)}
 
-    return alerts
+        signs = [_OPS[rule.op][0] for rule in self.rules]
+        self.columns = np.array([ALERT_METRICS.index(rule.metric) for rule in self.rules], dtype=np.intp)
+        self.signs = np.array(signs, dtype=float)
+        self.strict = np.array([_OPS[rule.op][1] for rule in self.rules], dtype=bool)
+        self.enter = np.array([s * rule.threshold for s, rule in zip(signs, self.rules)], dtype=float)
+        self.exit = self.enter - np.array([rule.hysteresis for rule in self.rules], dtype=float)
+        # stricter[r, o]：規則 o 與 r 同指標同方向、門檻更極端（o 成立時 r 不輸出）
+        self.stricter = np.array([
+            [o != r and other.metric == rule.metric and so == sr and so * other.threshold > sr * rule.threshold
+             for o, (other, so) in enumerate(zip(self.rules, signs))]
+            for r, (rule, sr) in enumerate(zip(self.rules, signs))
+        ], dtype=bool).reshape(len(self.rules), len(self.rules))
 
+        # evaluate_point 用的純 Python 版本：規則依 (指標, 方向) 分級，每級由門檻最極端者往下比較，
+        # 第一條成立後只再看同門檻的規則（等同原本的 if / elif）
+        self.metric_index = self.columns.tolist()
+        tiers = {}
+        for r, sign in enumerate(signs):
+            tiers.setdefault((self.metric_index[r], sign), []).append(r)
+        self._tiers = []
+        for (col, sign), members in tiers.items():
+            members.sort(key=lambda r: -self.enter[r])
+            self._tiers.append((col, sign, [
+                (r, bool(self.strict[r]), float(self.enter[r]), float(self.exit[r]),
+                 # 上次成立的是本規則或同分級更嚴重的規則時，以解除門檻判斷（由暴雨回落時直接降為降雨注意）
+                 frozenset(self.rules[o].title_key for o in members if o == r or self.stricter[r, o]))
+                for r in members
+            ]))
 
-def evaluate_onecall_alerts(api_key, lat, lon) -> list[WeatherAlert]:
-    """
-    One Call API 3.0 官方警報（付費 API）
+        # evaluate 的分級排除：規則依 (分級, 門檻由嚴至寬) 排序後，各規則所屬分級與同門檻群組的起點
+        self._order = np.array([r for _, _, members in self._tiers for r, *_ in members], dtype=np.intp)
+        self._rank = np.argsort(self._order)
+        tier_start, level_start = [], []
+        for _, _, members in self._tiers:
+            start = len(tier_start)
+            for k, (_, _, enter, _, _) in enumerate(members):
+                tier_start.append(start)
+                level_start.append(level_start[-1] if k and enter == members[k - 1][2] else start + k)
+        self._tier_start = np.array(tier_start, dtype=np.intp)
+        self._level_start = np.array(level_start, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate_point(self, row: Sequence[float | None], active: Collection[str] = ()) -> list[int]:
+        """
+        評估單一時間點。
+
+        Args:
+            row: 依 ALERT_METRICS 順序的數值（None 不觸發）
+            active: 上次評估成立的規則 title_key（套用遲滯；同分級更嚴重的規則成立也視為成立）
+
+        Returns:
+            成立的規則索引（依規則順序，已套用分級）
+        """
+        result = []
+        for col, sign, members in self._tiers:
+            value = row[col]
+            if value is None:
+                continue
+            signed = sign * value
+            level = None
+            for r, strict, enter, exit_, held_by in members:
+                if level is not None and enter < level:
+                    break
+                if active and any(key in active for key in held_by):
+                    if signed > exit_ if strict else signed >= exit_:
+                        result.append(r)
+                        level = enter
+                elif signed > enter if strict else signed >= enter:
+                    result.append(r)
+                    level = enter
+        result.sort()
+        return result
+
+    def evaluate(self, values: np.ndarray, active: np.ndarray | None = None) -> np.ndarray:
+        """
+        一次評估所有規則。
 
-    呼叫 /data/3.0/onecall 取得 alerts 欄位。
+        Args:
+            values: 形狀 (城市, 時段, len(ALERT_METRICS)) 的陣列，時段依時間排序（NaN 不觸發）
+            active: 形狀 (規則, 城市) 的布林陣列，第一個時段之前成立的規則（套用遲滯；
+                同 evaluate_point，同分級更嚴重的規則成立也視為成立）
+
+        Returns:
+            形狀 (規則, 城市, 時段) 的布林陣列（已套用遲滯與分級）
+        """
+        n_rules = len(self.rules)
+        signed = values[:, :, self.columns].transpose(2, 0, 1) * self.signs[:, None, None]
+        enter_at = self.enter[:, None, None]
+        entered = np.where(self.strict[:, None, None], signed > enter_at, signed >= enter_at)
+        exit_at = self.exit[:, None, None]
+        stay = np.where(self.strict[:, None, None], signed > exit_at, signed >= exit_at)
+
+        # 遲滯：某時段成立 ⇔ 仍在解除門檻內，且自上次跌出解除門檻後曾越過觸發門檻。
+        # 以觸發次數累計值比較「上次跌出時的累計值」判斷，整個時間軸一次完成
+        count = np.cumsum(entered, axis=2, dtype=np.int32)
+        if active is not None:
+            active = np.asarray(active, dtype=bool)
+            held = active | (self.stricter.astype(np.int32) @ active.astype(np.int32) > 0)
+            count += held.astype(np.int32)[:, :, None]
+        base = np.maximum.accumulate(np.where(stay, 0, count), axis=2)
+        hits = stay & (count > base)
+
+        # 分級：依 (分級, 門檻由嚴至寬) 排序後沿規則軸累計，本規則之前、同分級且門檻更嚴的成立數 > 0 即排除
+        count = np.zeros((n_rules + 1,) + hits.shape[1:], dtype=np.int32)
+        np.cumsum(hits[self._order], axis=0, out=count[1:])
+        suppressed = count[self._level_start] > count[self._tier_start]
+        hits &= ~suppressed[self._rank]
+        return hits
+
+
+def load_rules(path: str) -> tuple[tuple[AlertRule, ...], dict]:
     """
-    if not api_key:
-        return []
+    讀取規則檔（JSON），回傳 (規則, 檔案內的翻譯)；不修改任何全域狀態。
 
-    try:
-        url = f"{config.ONECALL_BASE_URL}/onecall"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "appid": api_key,
-            "exclude": "minutely,hourly,daily",
+    格式：
+        {
+          "replace": false,                 // true：取代內建規則；false（預設）：附加於內建規則之後
+          "rules": [
+            {"metric": "feels_like", "op": ">", "threshold": 40, "severity": "danger",
+             "title_key": "alert.heat_index_title", "message_key": "alert.heat_index_msg",
+             "icon": "🥵", "hysteresis": 1}
+          ],
+          "translations": {"alert.heat_index_title": {"zh_tw": "...", "en": "..."}, ...}
         }
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-
-        alerts = []
-        for item in data.get("alerts", []):
-            alerts.append(WeatherAlert(
-                severity=AlertSeverity.DANGER,
-                title_key="alert.official_title",
-                message_key="",  # 使用 raw message
-                icon="⚠️",
-                value=0,
-                threshold=0,
+
+    Raises:
+        ValueError: 檔案格式錯誤或規則不合法
+    """
+    with open(path, "rb") as f:
+        try:
+            spec = payload.loads(f.read())
+        except ValueError as e:
+            raise ValueError(f"{path}: invalid JSON ({e})") from e
+    if not isinstance(spec, dict) or not isinstance(spec.get("rules", []), list):
+        raise ValueError(f"{path}: expected an object with a 'rules' list")
+
+    rules = []
+    for i, item in enumerate(spec.get("rules", [])):
+        try:
+            rules.append(AlertRule(
+                metric=item["metric"],
+                op=item["op"],
+                threshold=float(item["threshold"]),
+                severity=AlertSeverity(item["severity"]),
+                title_key=item["title_key"],
+                message_key=item["message_key"],
+                icon=item.get("icon", "⚠️"),
+                hysteresis=float(item.get("hysteresis", 0)),
             ))
-            # 覆寫 message_key 為實際文字（官方警報不走 i18n）
-            alerts[-1]._raw_event = item.get("event", "")
-            alerts[-1]._raw_description = item.get("description", "")
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: rule #{i}: {e}") from e
+
+    translations = spec.get("translations", {})
+    if not isinstance(translations, dict):
+        raise ValueError(f"{path}: 'translations' must be an object")
+
+    if spec.get("replace", False):
+        return tuple(rules), translations
+    return ALERT_RULES + tuple(rules), translations
+
 
-        return alerts
-    except Exception:
+_compiled: CompiledRules | None = None
+_compiled_lock = threading.Lock()
+
+
+def _build_rules() -> tuple[CompiledRules, dict]:
+    """編譯內建 + ALERT_RULES_PATH 規則檔（尚未生效）"""
+    if not config.ALERT_RULES_PATH:
+        return CompiledRules(ALERT_RULES), {}
+    rules, translations = load_rules(config.ALERT_RULES_PATH)
+    return CompiledRules(rules), translations
+
+
+def _publish(compiled: CompiledRules, translations: dict) -> None:
+    """在 _compiled_lock 內呼叫：規則檔的翻譯與編譯結果各以單一指派生效"""
+    global _compiled
+    set_extra_translations(translations)
+    _compiled = compiled
+
+
+def compiled_rules() -> CompiledRules:
+    """目前生效的規則（內建 + ALERT_RULES_PATH 規則檔，首次使用時編譯）"""
+    compiled = _compiled
+    if compiled is not None:
+        return compiled
+    with _compiled_lock:
+        if _compiled is None:
+            _publish(*_build_rules())
+        return _compiled
+
+
+def reload_rules() -> CompiledRules:
+    """
+    重新讀取規則檔（規則檔變更後呼叫）。
+
+    先完整編譯新規則與翻譯再一次替換，評估中的請求不會看到半套規則；
+    規則檔有誤時拋出 ValueError，原規則繼續生效。
+    """
+    compiled, translations = _build_rules()
+    with _compiled_lock:
+        _publish(compiled, translations)
+    return compiled
+
+
+def alert_metrics(current_weather, daily_summary) -> tuple[float | None, ...]:
+    """即時天氣 + 今日摘要 → 依 ALERT_METRICS 順序的數值（缺少的指標為 None）"""
+    today = daily_summary[0] if daily_summary else None
+    temp_swing = None
+    if today is not None:
+        temp_swing = today["temp_max"] - today["temp_min"]
+    return (
+        current_weather["temperature"],
+        current_weather.get("feels_like"),
+        current_weather["wind_speed"],
+        current_weather["humidity"],
+        today.get("pop_max", 0) if today is not None else 0,  # 無每日摘要時視為 0
+        temp_swing,
+    )
+
+
+@metrics.timed("alerts")
+def evaluate_alerts(current_weather, daily_summary, active: Collection[str] = ()) -> list[WeatherAlert]:
+    """
+    規則引擎警報（免費 API 資料）
+
+    根據即時天氣與每日摘要資料，依規則表判斷是否需要發出警報。
+
+    Args:
+        active: 上次評估成立的警報 title_key（套用遲滯；預設不套用）
+    """
+    if not current_weather:
         return []
+
+    compiled = compiled_rules()
+    row = alert_metrics(current_weather, daily_summary)
+    alerts = []
+    for r in compiled.evaluate_point(row, active):
+        rule = compiled.rules[r]
+        alerts.append(WeatherAlert(
+            severity=rule.severity,
+            title_key=rule.title_key,
+            message_key=rule.message_key,
+            icon=rule.icon,
+            value=round(row[compiled.metric_index[r]], 1),
+            threshold=rule.threshold,
+        ))
+    return alerts
+
+
+def evaluate_onecall_alerts(items) -> list[WeatherAlert]:
+    """
+    One Call API 3.0 官方警報（付費 API）
+
+    items 為快取的 One Call 回應中的 alerts（weather_api.parse_onecall_alerts），
+    與 UV 指數共用同一次請求，不另外呼叫上游。
+    """
+    return [
+        WeatherAlert(
+            severity=AlertSeverity.DANGER,
+            title_key="alert.official_title",
+            message_key="",  # 使用 event / description 原文
+            icon="⚠️",
+            value=0,
+            threshold=0,
+            event=item["event"],
+            description=item["description"],
+        )
+        for item in items
+    ]
@@ -0,0 +1,273 @@
+"""
+異常偵測模組 - 以串流統計判斷「對此城市、此時段而言不尋常」的天氣
+
+每個 (城市, 指標, 小時) 維護：
+- Welford 線上平均 / 變異數
+- P² 串流分位數（估計常態範圍 p05 ~ p95）
+
+每筆新觀測 O(1) 更新，不需重新掃描歷史資料。
+"""
+import math
+import threading
+from datetime import datetime, timedelta
+
+from weather_analysis import config
+from weather_analysis.alerts import AlertSeverity, WeatherAlert
+
+# 監控指標 → (高於常態的 i18n 前綴, 低於常態的 i18n 前綴, icon)
+ANOMALY_METRICS = {
+    "temperature": ("alert.anomaly_temp_high", "alert.anomaly_temp_low", "🌡️"),
+    "humidity": ("alert.anomaly_humidity_high", "alert.anomaly_humidity_low", "💧"),
+    "wind_speed": ("alert.anomaly_wind_high", None, "💨"),
+}
+
+
+class RunningStats:
+    """Welford 線上平均 / 變異數"""
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """樣本變異數（n - 1）"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def zscore(self, x: float) -> float:
+        std = self.std
+        return (x - self.mean) / std if std > 0 else 0.0
+
+
+class P2Quantile:
+    """
+    P² 串流分位數估計（Jain & Chlamtac, 1985）
+
+    僅保存 5 個標記點，O(1) 記憶體與更新成本。
+    """
+
+    __slots__ = ("p", "_heights", "_pos", "_desired", "_incr")
+
+    def __init__(self, p: float):
+        self.p = p
+        self._heights: list[float] = []
+        self._pos = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._incr = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x: float) -> None:
+        h = self._heights
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return
+
+        # 找出 x 所在區間並調整極值
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            self._pos[i] += 1
+        for i in range(5):
+            self._desired[i] += self._incr[i]
+
+        # 調整中間 3 個標記
+        for i in (1, 2, 3):
+            d = self._desired[i] - self._pos[i]
+            if (d >= 1 and self._pos[i + 1] - self._pos[i] > 1) or (
+                d <= -1 and self._pos[i - 1] - self._pos[i] < -1
+            ):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = self._linear(i, step)
+                h[i] = candidate
+                self._pos[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self._heights, self._pos
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, d: int) -> float:
+        h, n = self._heights, self._pos
+        return h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+
+    @property
+    def value(self) -> float | None:
+        h = self._heights
+        if not h:
+            return None
+        if len(h) < 5:
+            return h[min(len(h) - 1, int(round(self.p * (len(h) - 1))))]
+        return h[2]
+
+
+class _SlotStats:
+    """單一 (城市, 指標, 小時) 的統計狀態"""
+
+    __slots__ = ("stats", "low", "high")
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.low = P2Quantile(0.05)
+        self.high = P2Quantile(0.95)
+
+    def update(self, x: float) -> None:
+        self.stats.update(x)
+        self.low.update(x)
+        self.high.update(x)
+
+
+class AnomalyDetector:
+    """
+    串流異常偵測器（執行緒安全）
+
+    observe() 以「更新前」的統計判斷新觀測是否異常，再將觀測納入統計；
+    同一城市同一觀測時間只計入一次（不同語言的快取 miss 會重複抓到同一筆）。
+    """
+
+    def __init__(self, z_threshold: float | None = None, min_samples: int | None = None):
+        self.z_threshold = z_threshold or config.ANOMALY_Z_THRESHOLD
+        self.min_samples = min_samples or config.ANOMALY_MIN_SAMPLES
+        self._slots: dict[tuple[str, str, int], _SlotStats] = {}
+        self._latest: dict[str, tuple[datetime, list[WeatherAlert]]] = {}
+        self._lock = threading.Lock()
+
+    def _check(self, slot: _SlotStats, metric: str, value: float) -> WeatherAlert | None:
+        stats = slot.stats
+        if stats.count < self.min_samples:
+            return None
+        z = stats.zscore(value)
+        if abs(z) < self.z_threshold:
+            return None
+        high_key, low_key, icon = ANOMALY_METRICS[metric]
+        prefix = high_key if z > 0 else low_key
+        if prefix is None:
+            return None
+        # 常態範圍邊界：高於常態對 p95，低於常態對 p05
+        bound = slot.high.value if z > 0 else slot.low.value
+        return WeatherAlert(
+            severity=AlertSeverity.DANGER if abs(z) >= self.z_threshold + 1 else AlertSeverity.CAUTION,
+            title_key=f"{prefix}_title",
+            message_key=f"{prefix}_msg",
+            icon=icon,
+            value=value,
+            threshold=round(bound if bound is not None else stats.mean, 1),
+        )
+
+    def observe(self, city: str, weather: dict) -> list[WeatherAlert]:
+        """納入一筆即時觀測，回傳此觀測觸發的異常警報"""
+        ts = weather["timestamp"]
+        with self._lock:
+            latest = self._latest.get(city)
+            if latest is not None and latest[0] >= ts:
+                return latest[1] if latest[0] == ts else []
+
+            alerts = []
+            for metric in ANOMALY_METRICS:
+                value = weather.get(metric)
+                if value is None:
+                    continue
+                key = (city, metric, ts.hour)
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._slots[key] = _SlotStats()
+                alert = self._check(slot, metric, value)
+                if alert is not None:
+                    alerts.append(alert)
+                slot.update(value)
+
+            self._latest[city] = (ts, alerts)
+            return alerts
+
+    def current_alerts(self, city: str) -> list[WeatherAlert]:
+        """該城市最新一筆觀測的異常警報"""
+        with self._lock:
+            latest = self._latest.get(city)
+        return list(latest[1]) if latest else []
+
+    def stats_for(self, city: str, metric: str, hour: int) -> dict | None:
+        """查詢某城市 / 指標 / 小時的統計摘要"""
+        with self._lock:
+            slot = self._slots.get((city, metric, hour))
+            if slot is None:
+                return None
+            return {
+                "count": slot.stats.count,
+                "mean": slot.stats.mean,
+                "std": slot.stats.std,
+                "p05": slot.low.value,
+                "p95": slot.high.value,
+            }
+
+
+# ── 全域偵測器 ──
+
+_detector: AnomalyDetector | None = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> AnomalyDetector:
+    """取得全域偵測器（首次建立時以歷史資料庫的近期觀測暖機）"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                detector = AnomalyDetector()
+                _seed_from_history(detector)
+                _detector = detector
+    return _detector
+
+
+def _seed_from_history(detector: AnomalyDetector) -> None:
+    from weather_analysis import history
+
+    try:
+        store = history.get_store()
+        if store is None:
+            return
+        end = datetime.now()
+        start = end - timedelta(days=config.HISTORY_RAW_RETENTION_DAYS)
+        for city in config.TAIWAN_CITIES_COORDS:
+            for row in store.query_observations(city, start, end):
+                row["timestamp"] = row.pop("ts")
+                detector.observe(city, row)
+    except Exception:
+        pass
+
+
+def observe(city: str, weather: dict) -> None:
+    """納入新觀測（失敗不影響主流程）"""
+    try:
+        get_detector().observe(city, weather)
+    except Exception:
+        pass
+
+
+def current_alerts(city: str) -> list[WeatherAlert]:
+    """該城市最新觀測的異常警報"""
+    return get_detector().current_alerts(city)
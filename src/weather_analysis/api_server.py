@@ -0,0 +1,352 @@
+"""
+唯讀 JSON HTTP API - 提供非 UI 服務查詢天氣 / 預報 / 警報 / AQI / 旅遊推薦
+
+與 Streamlit UI 共用同一組快取（_cached_current_weather、_cached_forecast、
+fetch_aqi_data），快取命中時不需重跑整個 Streamlit script。
+
+會查詢上游或 SQLite 的路由以一般 def 定義，由 Starlette 在執行緒池執行，不佔住 event loop；
+Cache-Control max-age 取自所用快取項目的剩餘 TTL（各資料來源依發布時間推算）。
+
+啟動方式：
+    uv run uvicorn weather_analysis.api_server:app --port 8600
+"""
+import contextlib
+import dataclasses
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from enum import Enum
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from weather_analysis import anomaly, cache, config, forecast_accuracy, history, metrics
+from weather_analysis.alerts import WeatherAlert, evaluate_alerts
+from weather_analysis.aqi_api import (
+    CITY_COUNTY_MAP, fetch_aqi_data, get_all_cities_aqi, get_city_aqi,
+)
+from weather_analysis.hazards import scan_forecasts
+from weather_analysis.records import Record
+from weather_analysis.travel import recommend_best_days
+from weather_analysis.weather_api import WeatherAPI
+
+
+# ── 序列化 ──
+
+def _to_jsonable(obj):
+    """將 datetime / date / Enum / WeatherAlert / Record 轉為可 JSON 序列化的值"""
+    if isinstance(obj, datetime):
+        return obj.isoformat(timespec="seconds")
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, Record):
+        return obj.as_dict()
+    if isinstance(obj, WeatherAlert):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_response(request: Request, payload, max_age: int) -> Response:
+    """回傳帶 ETag / Cache-Control 的 JSON，If-None-Match 命中時回 304"""
+    body = json.dumps(
+        payload, default=_to_jsonable, ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+# ── 請求參數 ──
+
+def _lang(request: Request) -> str:
+    lang = request.query_params.get("lang", "zh_tw")
+    return lang if lang in ("zh_tw", "en") else "zh_tw"
+
+
+def _weather_api(request: Request) -> WeatherAPI:
+    return WeatherAPI(api_key=config.OPENWEATHER_API_KEY, lang=_lang(request))
+
+
+def _city(request: Request) -> str | None:
+    """路徑中的城市（英文名，不分大小寫）→ 標準英文城市名"""
+    raw = request.path_params["city"].replace("-", " ").replace("_", " ").lower()
+    for city_en in config.TAIWAN_CITIES_COORDS:
+        if city_en.lower() == raw:
+            return city_en
+    return None
+
+
+def _aqi_data():
+    if not config.AQI_API_KEY:
+        return None
+    return fetch_aqi_data(config.AQI_API_KEY)
+
+
+# ── Cache-Control max-age（所用快取項目中最早到期者的剩餘 TTL） ──
+
+def _weather_max_age(api: WeatherAPI, cities, sources) -> int:
+    return int(min((api.cache_remaining(city, source) for city in cities for source in sources), default=0))
+
+
+def _aqi_max_age() -> int:
+    return int(fetch_aqi_data.remaining(config.AQI_API_KEY))
+
+
+# ── 單城市資料組裝 ──
+
+def _city_current(api: WeatherAPI, city: str):
+    return api.get_current_weather(city)
+
+
+def _city_forecast(api: WeatherAPI, city: str):
+    return api.get_forecast(city)
+
+
+def _city_daily(api: WeatherAPI, city: str):
+    return api.get_daily_forecast_summary(city)
+
+
+def _city_alerts(api: WeatherAPI, city: str):
+    rule_alerts = evaluate_alerts(api.get_current_weather(city), api.get_daily_forecast_summary(city))
+    return rule_alerts + anomaly.current_alerts(city)
+
+
+def _city_travel(api: WeatherAPI, city: str):
+    return recommend_best_days(api.get_daily_forecast_summary(city))
+
+
+_CITY_RESOURCES = {
+    "current": _city_current,
+    "forecast": _city_forecast,
+    "daily": _city_daily,
+    "alerts": _city_alerts,
+    "travel": _city_travel,
+}
+
+# 各資源依賴的快取（WeatherAPI.cache_remaining 的 source）
+_RESOURCE_SOURCES = {
+    "current": ("current_weather",),
+    "forecast": ("forecast",),
+    "daily": ("forecast",),
+    "alerts": ("current_weather", "forecast"),
+    "travel": ("forecast",),
+}
+
+
+# ── 路由處理 ──
+
+async def health(request: Request) -> Response:
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus 指標"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def cache_stats(request: Request) -> Response:
+    """各資料快取的項目數、位元組、命中率與淘汰數"""
+    return JSONResponse({"caches": cache.all_stats()})
+
+
+async def list_cities(request: Request) -> Response:
+    cities = [
+        {"city": city_en, **config.TAIWAN_CITIES_I18N[city_en], **coords}
+        for city_en, coords in config.TAIWAN_CITIES_COORDS.items()
+    ]
+    return _json_response(request, cities, 24 * 60 * 60)
+
+
+def _make_city_endpoint(resource: str):
+    builder = _CITY_RESOURCES[resource]
+    sources = _RESOURCE_SOURCES[resource]
+
+    def endpoint(request: Request) -> Response:
+        if not config.OPENWEATHER_API_KEY:
+            return _error(503, "OPENWEATHER_API_KEY is not configured")
+        city = _city(request)
+        if city is None:
+            return _error(404, "unknown city")
+        api = _weather_api(request)
+        data = builder(api, city)
+        if data is None:
+            return _error(502, "upstream data unavailable")
+        max_age = _weather_max_age(api, [city], sources)
+        return _json_response(request, {"city": city, resource: data}, max_age)
+
+    return endpoint
+
+
+def _make_all_cities_endpoint(resource: str):
+    builder = _CITY_RESOURCES[resource]
+    sources = _RESOURCE_SOURCES[resource]
+
+    def endpoint(request: Request) -> Response:
+        if not config.OPENWEATHER_API_KEY:
+            return _error(503, "OPENWEATHER_API_KEY is not configured")
+        api = _weather_api(request)
+        payload = {city: builder(api, city) for city in config.TAIWAN_CITIES_COORDS}
+        max_age = _weather_max_age(api, config.TAIWAN_CITIES_COORDS, sources)
+        return _json_response(request, payload, max_age)
+
+    return endpoint
+
+
+def hazards_timeline(request: Request) -> Response:
+    """全國預報風險時間軸（各城市 40 個預報時段）"""
+    if not config.OPENWEATHER_API_KEY:
+        return _error(503, "OPENWEATHER_API_KEY is not configured")
+    api = _weather_api(request)
+    forecasts = {city: api.get_forecast(city) for city in config.TAIWAN_CITIES_COORDS}
+    max_age = _weather_max_age(api, config.TAIWAN_CITIES_COORDS, ("forecast",))
+    return _json_response(request, {"hazards": scan_forecasts(forecasts)}, max_age)
+
+
+def city_aqi(request: Request) -> Response:
+    city = _city(request)
+    if city is None:
+        return _error(404, "unknown city")
+    if not config.AQI_API_KEY:
+        return _error(503, "AQI_API_KEY is not configured")
+    info = get_city_aqi(_aqi_data(), city)
+    if info is None:
+        return _error(502, "upstream data unavailable")
+    return _json_response(request, {"city": city, "aqi": info}, _aqi_max_age())
+
+
+def all_cities_aqi(request: Request) -> Response:
+    if not config.AQI_API_KEY:
+        return _error(503, "AQI_API_KEY is not configured")
+    all_data = _aqi_data()
+    if not all_data:
+        return _error(502, "upstream data unavailable")
+    return _json_response(request, get_all_cities_aqi(all_data), _aqi_max_age())
+
+
+def city_history(request: Request) -> Response:
+    """
+    歷史資料查詢：?kind=observations|forecasts|aqi&start=ISO&end=ISO
+    （預設查詢最近 24 小時的即時天氣觀測）
+
+    加上 resolution=hour|day&metric=temperature 改查彙整統計（長區間查詢用）。
+    """
+    city = _city(request)
+    if city is None:
+        return _error(404, "unknown city")
+    store = history.get_store()
+    if store is None:
+        return _error(503, "history store is disabled")
+
+    params = request.query_params
+    try:
+        end = datetime.fromisoformat(params["end"]) if "end" in params else datetime.now()
+        start = (
+            datetime.fromisoformat(params["start"]) if "start" in params
+            else end - timedelta(hours=24)
+        )
+    except ValueError:
+        return _error(400, "start/end must be ISO 8601 datetimes")
+
+    kind = params.get("kind", "observations")
+    resolution = params.get("resolution")
+    if resolution:
+        if resolution not in ("hour", "day") or kind not in history.ROLLUP_SOURCES:
+            return _error(400, "resolution must be hour or day, kind observations or aqi")
+        metric = params.get("metric", "temperature" if kind == "observations" else "aqi")
+        if metric not in history.ROLLUP_SOURCES[kind][2]:
+            return _error(400, f"unknown metric {metric}")
+        if kind == "observations":
+            keys = [city]
+        else:
+            keys = sorted({row["site"] for row in store.query_aqi(CITY_COUNTY_MAP[city], start, end)})
+        rows = {
+            key: store.query_rollups(kind, key, metric, resolution, start, end) for key in keys
+        }
+        return _json_response(
+            request, {"city": city, "kind": kind, "metric": metric, "rollups": rows}, 60,
+        )
+
+    if kind == "observations":
+        rows = store.query_observations(city, start, end)
+    elif kind == "forecasts":
+        rows = store.query_forecasts(city, start, end)
+    elif kind == "aqi":
+        rows = store.query_aqi(CITY_COUNTY_MAP[city], start, end)
+    else:
+        return _error(400, "kind must be observations, forecasts or aqi")
+    return _json_response(request, {"city": city, "kind": kind, "rows": rows}, 60)
+
+
+def _accuracy_metric(request: Request) -> str | None:
+    metric = request.query_params.get("metric", "temperature")
+    return metric if metric in forecast_accuracy.ACCURACY_METRICS else None
+
+
+def city_forecast_accuracy(request: Request) -> Response:
+    """預報準確度：?metric=temperature|humidity|wind_speed"""
+    city = _city(request)
+    if city is None:
+        return _error(404, "unknown city")
+    metric = _accuracy_metric(request)
+    if metric is None:
+        return _error(400, "unknown metric")
+    rows = forecast_accuracy.summary(city, metric)
+    return _json_response(request, {"city": city, "metric": metric, "accuracy": rows}, 60)
+
+
+def all_forecast_accuracy(request: Request) -> Response:
+    metric = _accuracy_metric(request)
+    if metric is None:
+        return _error(400, "unknown metric")
+    payload = {
+        city: forecast_accuracy.summary(city, metric) for city in config.TAIWAN_CITIES_COORDS
+    }
+    return _json_response(request, payload, 60)
+
+
+def _build_routes():
+    routes = [
+        Route("/health", health),
+        Route("/metrics", metrics_endpoint),
+        Route("/cache/stats", cache_stats),
+        Route("/v1/cities", list_cities),
+        Route("/v1/aqi", all_cities_aqi),
+        Route("/v1/hazards", hazards_timeline),
+        Route("/v1/cities/{city}/aqi", city_aqi),
+        Route("/v1/cities/{city}/history", city_history),
+        Route("/v1/forecast-accuracy", all_forecast_accuracy),
+        Route("/v1/cities/{city}/forecast-accuracy", city_forecast_accuracy),
+    ]
+    for resource in _CITY_RESOURCES:
+        routes.append(Route(f"/v1/{resource}", _make_all_cities_endpoint(resource)))
+        routes.append(Route(f"/v1/cities/{{city}}/{resource}", _make_city_endpoint(resource)))
+    return routes
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(app):
+    # 快取暖啟動：與 Streamlit 行程相同，啟動時載回快取檔並定期寫出
+    cache.start_checkpointing(config.CACHE_CHECKPOINT_PATH, config.CACHE_CHECKPOINT_INTERVAL_SECONDS)
+    yield
+
+
+app = Starlette(routes=_build_routes(), lifespan=_lifespan)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=8600)
@@ -3,20 +3,14 @@
 """
 import streamlit as st
 from datetime import datetime
-from weather_analysis import config
+from weather_analysis import cache, config, deadline, forecast_accuracy, metrics, profiling, snapshot, upstream
 from weather_analysis.weather_api import WeatherAPI
 from weather_analysis.visualization import WeatherCharts
 from weather_analysis.ai_analyzer import WeatherAIAnalyzer
 from weather_analysis.i18n import t, get_lang, weekday_name, SUPPORTED_LANGS
-from weather_analysis.alerts import (
-    evaluate_alerts, evaluate_onecall_alerts,
-    AlertSeverity,
-)
-from weather_analysis.travel import recommend_best_days
-from weather_analysis.aqi_api import (
-    fetch_aqi_data, get_city_aqi, get_aqi_level, get_all_cities_aqi,
-)
-from weather_analysis.weather_api import _cached_onecall_uvi, get_uv_level
+from weather_analysis.alerts import AlertSeverity
+from weather_analysis.aqi_api import get_aqi_level
+from weather_analysis.weather_api import get_uv_level
 
 # 頁面設定
 st.set_page_config(
@@ -26,6 +20,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Prometheus /metrics 端點（每個行程只啟動一次）
+if config.METRICS_PORT:
+    metrics.start_http_server(config.METRICS_PORT, host=config.METRICS_HOST)
+
+# 快取暖啟動：載回快取檔並定期寫出（每個行程只啟動一次）
+cache.start_checkpointing(config.CACHE_CHECKPOINT_PATH, config.CACHE_CHECKPOINT_INTERVAL_SECONDS)
+
 
 # ── CSS 注入（深色模式 + RWD + 骨架屏） ──
 
@@ -265,8 +266,7 @@ def display_sidebar():
     selected_lang = lang_options[lang_labels.index(selected_label)]
     if selected_lang != st.session_state.ui_lang:
         st.session_state.ui_lang = selected_lang
-        # 清除快取以重新取得對應語言的天氣描述
-        st.cache_data.clear()
+        # 快取 key 含語言，不需清除；重設 session 資料以取得對應語言的天氣描述
         st.session_state.current_weather = None
         st.session_state.forecast_data = None
         st.session_state.daily_summary = None
@@ -429,7 +429,9 @@ def display_sidebar():
         if not active_owm:
             st.sidebar.error(f"❌ {t('sidebar.no_owm_key')}")
         else:
-            st.cache_data.clear()
+            # 只讓目前城市的天氣資料過期；其他 session 的過期備援與 AI 快取保留
+            WeatherAPI(api_key=active_owm).invalidate_city(city_en)
+            snapshot.invalidate()
             with st.spinner(t("app.loading_weather")):
                 fetch_weather_data(city_en)
                 st.success(f"✅ {t('app.data_updated')}")
@@ -457,7 +459,7 @@ def _validate_openai_key(api_key):
     """輕量驗證 OpenAI API Key"""
     try:
         from openai import OpenAI
-        client = OpenAI(api_key=api_key)
+        client = OpenAI(api_key=api_key, base_url=config.OPENAI_BASE_URL)
         client.models.list()
         return True
     except Exception:
@@ -467,13 +469,12 @@ def _validate_openai_key(api_key):
 def _validate_onecall_key(api_key):
     """輕量驗證 One Call API Key（用台北座標測試）"""
     try:
-        import requests
         url = f"{config.ONECALL_BASE_URL}/onecall"
         params = {
             "lat": 25.033, "lon": 121.565,
             "appid": api_key, "exclude": "minutely,hourly,daily,alerts",
         }
-        resp = requests.get(url, params=params, timeout=8)
+        resp = upstream.get(upstream.ONECALL, url, params=params, timeout=8)
         return resp.status_code == 200
     except Exception:
         return False
@@ -493,12 +494,8 @@ def _validate_aqi_key(api_key):
         None  = 無法判斷（逾時 / 網路問題）
     """
     try:
-        import requests as _req
         params = {"api_key": api_key, "limit": 1, "format": "JSON"}
-        resp = _req.get(
-            "https://data.moenv.gov.tw/api/v2/aqx_p_432",
-            params=params, timeout=15,
-        )
+        resp = upstream.get(upstream.MOENV_AQI, config.AQI_API_URL, params=params, timeout=15)
         if resp.status_code != 200:
             return None
         try:
@@ -507,39 +504,48 @@ def _validate_aqi_key(api_key):
         except ValueError:
             # JSON 解析失敗 → 純文字錯誤訊息 → key 無效
             return False
-    except _req.exceptions.Timeout:
-        return None
-    except Exception:
+    except upstream.UpstreamError:
+        # 逾時、網路錯誤、限流、斷路或時間預算用完
         return None
 
 
 # ── 資料載入 ──
 
-def fetch_weather_data(city):
-    """取得天氣資料"""
-    active_owm = _get_active_api_key("sidebar_owm_key", config.OPENWEATHER_API_KEY)
-    api = WeatherAPI(api_key=active_owm)
-
-    st.session_state.current_weather = api.get_current_weather(city)
-    st.session_state.forecast_data = api.get_forecast(city)
-    st.session_state.daily_summary = api.get_daily_forecast_summary(city)
-    st.session_state.ai_analysis = None
-    st.session_state.last_city = city
+def load_snapshot(city=None):
+    """
+    取得目前語言的全國快照（資料來源依使用者擁有的 API Key）
 
-    # 計算天氣警報
-    rule_alerts = evaluate_alerts(
-        st.session_state.current_weather,
-        st.session_state.daily_summary,
+    需重建時 city（使用者目前城市）優先查詢，其餘城市為背景預取。
+    """
+    return snapshot.current(
+        get_lang(),
+        owm_key=_get_active_api_key("sidebar_owm_key", config.OPENWEATHER_API_KEY),
+        onecall_key=_get_active_api_key("sidebar_onecall_key", config.ONECALL_API_KEY),
+        aqi_key=_get_active_api_key("sidebar_aqi_key", config.AQI_API_KEY),
+        focus=city,
     )
 
-    # One Call 官方警報
-    active_onecall = _get_active_api_key("sidebar_onecall_key", config.ONECALL_API_KEY)
-    onecall_alerts = []
-    if active_onecall and city in config.TAIWAN_CITIES_COORDS:
-        coords = config.TAIWAN_CITIES_COORDS[city]
-        onecall_alerts = evaluate_onecall_alerts(active_onecall, coords["lat"], coords["lon"])
 
-    st.session_state.weather_alerts = rule_alerts + onecall_alerts
+def fetch_weather_data(city):
+    """
+    從全國快照取出城市資料放入 session（只保存參照，不複製）
+
+    Returns:
+        NationalSnapshot: 本次 rerun 使用的快照
+    """
+    snap = load_snapshot(city)
+    view = snap.city(city)
+
+    if st.session_state.last_city != city:
+        st.session_state.ai_analysis = None
+    st.session_state.current_weather = view.current
+    st.session_state.forecast_data = view.forecast
+    st.session_state.daily_summary = view.daily_summary
+    st.session_state.last_city = city
+
+    # 規則引擎 + 串流統計異常 + One Call 官方警報（快照建立時已評估）
+    st.session_state.weather_alerts = list(view.alerts)
+    return snap
 
 
 # ── 天氣警報顯示 ──
@@ -553,9 +559,9 @@ def display_weather_alerts():
     st.subheader(f"⚠️ {t('alert.section_title')}")
     for alert in alerts:
         title = t(alert.title_key)
-        # 官方警報使用 raw 文字
-        if hasattr(alert, "_raw_event") and alert._raw_event:
-            msg = f"**{alert._raw_event}**: {getattr(alert, '_raw_description', '')}"
+        # 官方警報使用原文
+        if alert.event:
+            msg = f"**{alert.event}**: {alert.description}"
         else:
             msg = t(alert.message_key, v=alert.value, t=alert.threshold)
 
@@ -565,9 +571,49 @@ def display_weather_alerts():
             st.warning(f"{alert.icon} **{title}** — {msg}")
 
 
+# ── 全國風險橫幅 ──
+
+_HAZARD_UNITS = {"temperature": "°C", "wind_speed": " m/s", "humidity": "%", "pop": "%"}
+
+
+def _hazard_when(hazard):
+    return f"{hazard.start:%m/%d %H:%M}–{hazard.end:%H:%M}"
+
+
+def display_hazard_banner(snap):
+    """全國預報風險（tabs 上方，各分頁皆可見；快照建立時已掃描）"""
+    now = datetime.now()
+    hazards = [h for h in snap.hazards if h.end > now]
+    if not hazards:
+        return
+
+    # 橫幅：DANGER 優先、再依時間；其餘見時間軸
+    shown = sorted(hazards, key=lambda h: (h.severity != AlertSeverity.DANGER, h.start))[:config.HAZARD_BANNER_ITEMS]
+    items = [
+        f"{h.icon} {WeatherAPI.get_city_display_name(h.city)} {t(h.title_key)} {_hazard_when(h)}"
+        for h in shown
+    ]
+    if len(hazards) > len(shown):
+        items.append(t("hazard.more", n=len(hazards) - len(shown)))
+    summary = t("hazard.banner_summary", n=len(hazards), cities=len({h.city for h in hazards}))
+    banner = st.error if shown[0].severity == AlertSeverity.DANGER else st.warning
+    banner(f"⏱️ **{t('hazard.banner_title')}**（{summary}）— " + "　".join(items))
+
+    with st.expander(t("hazard.timeline_title")):
+        rows = [{
+            t("hazard.col_time"): _hazard_when(h),
+            t("hazard.col_city"): WeatherAPI.get_city_display_name(h.city),
+            t("hazard.col_hazard"): f"{h.icon} {t(h.title_key)}",
+            t("hazard.col_peak"): f"{h.peak}{_HAZARD_UNITS.get(h.metric, '')}",
+        } for h in hazards]
+
+        import pandas as pd
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
 # ── 頁面顯示 ──
 
-def display_current_weather():
+def display_current_weather(snap):
     """顯示即時天氣"""
     weather = st.session_state.current_weather
 
@@ -631,9 +677,8 @@ def display_current_weather():
     # ── UV 指數（需 One Call API Key） ──
     active_onecall = _get_active_api_key("sidebar_onecall_key", config.ONECALL_API_KEY)
     city_en = weather.get("city", "Taipei")
-    if active_onecall and city_en in config.TAIWAN_CITIES_COORDS:
-        coords = config.TAIWAN_CITIES_COORDS[city_en]
-        uv_data = _cached_onecall_uvi(active_onecall, coords["lat"], coords["lon"])
+    if active_onecall:
+        uv_data = snap.city(city_en).uv
         if uv_data:
             uvi = uv_data["uvi"]
             level_key, color = get_uv_level(uvi)
@@ -715,6 +760,18 @@ def display_forecast_charts():
             use_container_width=True,
         )
 
+    # 預報準確度（過去預報 vs 實際觀測）
+    city_en = st.session_state.get("last_city")
+    with st.expander(f"🎯 {t('forecast.accuracy_title')}"):
+        accuracy = forecast_accuracy.summary(city_en) if city_en else []
+        if accuracy:
+            st.plotly_chart(
+                WeatherCharts.create_forecast_accuracy_chart(accuracy),
+                use_container_width=True,
+            )
+        else:
+            st.caption(t("forecast.accuracy_empty"))
+
 
 def display_daily_forecast_table():
     """顯示每日預報表格"""
@@ -800,9 +857,11 @@ def display_ai_analysis():
         with skeleton.container():
             st.markdown('<div class="skeleton skeleton-card"></div>', unsafe_allow_html=True)
             st.markdown('<div class="skeleton skeleton-chart"></div>', unsafe_allow_html=True)
-        st.session_state.ai_analysis = ai_analyzer.comprehensive_analysis(
-            current_weather, daily_summary
-        )
+        # 明確觸發的 GPT 分析使用獨立預算，不受本次 rerun 的預算限制
+        with deadline.budget(config.AI_ANALYSIS_DEADLINE_SECONDS, replace=True):
+            st.session_state.ai_analysis = ai_analyzer.comprehensive_analysis(
+                current_weather, daily_summary
+            )
         skeleton.empty()
 
     if st.session_state.ai_analysis:
@@ -873,7 +932,7 @@ def display_ai_analysis():
 
 # ── 旅遊推薦 ──
 
-def display_travel_recommendation():
+def display_travel_recommendation(snap):
     """顯示旅遊最佳日推薦"""
     daily_summary = st.session_state.daily_summary
 
@@ -884,7 +943,7 @@ def display_travel_recommendation():
     st.subheader(f"✈️ {t('travel.title')}")
     st.caption(t('travel.subtitle'))
 
-    results = recommend_best_days(daily_summary)
+    results = snap.city(st.session_state.last_city).travel
     if not results:
         return
 
@@ -945,6 +1004,7 @@ def display_travel_recommendation():
 # ── 多城市比較 ──
 
 @st.fragment
+@deadline.budget(config.RERUN_DEADLINE_SECONDS)
 def display_city_comparison():
     """顯示多城市天氣比較"""
     active_owm = _get_active_api_key("sidebar_owm_key", config.OPENWEATHER_API_KEY)
@@ -983,11 +1043,11 @@ def display_city_comparison():
                     selected_en.append(en_key)
                     break
 
-    # 取得各城市資料
-    api = WeatherAPI(api_key=active_owm)
+    # 取得各城市資料（全國快照）
+    snap = load_snapshot(st.session_state.get("last_city"))
     city_data_list = []
     for city_en in selected_en:
-        daily = api.get_daily_forecast_summary(city_en)
+        daily = snap.city(city_en).daily_summary
         if daily:
             display_name = WeatherAPI.get_city_display_name(city_en)
             city_data_list.append({
@@ -1011,7 +1071,7 @@ def display_city_comparison():
 
 # ── 空氣品質 ──
 
-def display_aqi():
+def display_aqi(snap):
     """顯示空氣品質 AQI"""
     active_aqi = _get_active_api_key("sidebar_aqi_key", config.AQI_API_KEY)
     if not active_aqi:
@@ -1020,14 +1080,13 @@ def display_aqi():
 
     st.subheader(f"🌬️ {t('aqi.title')}")
 
-    all_data = fetch_aqi_data(active_aqi)
-    if not all_data:
+    if not snap.aqi_available:
         st.warning(f"⚠️ {t('aqi.no_data')}")
         return
 
     # 當前城市 AQI
-    city_en = st.session_state.get("last_city", "Taipei")
-    city_info = get_city_aqi(all_data, city_en)
+    city_en = st.session_state.get("last_city") or "Taipei"
+    city_info = snap.city(city_en).aqi
     city_display = WeatherAPI.get_city_display_name(city_en)
 
     if city_info:
@@ -1067,7 +1126,7 @@ def display_aqi():
     st.markdown("---")
     st.subheader(f"📊 {t('aqi.ranking_title')}")
 
-    all_cities = get_all_cities_aqi(all_data)
+    all_cities = snap.aqi_ranking
     if all_cities:
         rows = []
         for info in all_cities:
@@ -1087,7 +1146,7 @@ def display_aqi():
 
 # ── 天氣地圖 ──
 
-def display_weather_map():
+def display_weather_map(snap):
     """顯示互動式天氣地圖"""
     active_owm = _get_active_api_key("sidebar_owm_key", config.OPENWEATHER_API_KEY)
     if not active_owm:
@@ -1096,24 +1155,34 @@ def display_weather_map():
 
     st.subheader(f"🗺️ {t('map.title')}")
 
-    import folium
+    m, has_data = _build_weather_map(snap)
+    if not has_data:
+        st.info(f"ℹ️ {t('map.no_data')}")
+        return
+
     from streamlit_folium import st_folium
 
-    # 建立台灣中心地圖
-    m = folium.Map(location=[23.5, 121], zoom_start=7, tiles="OpenStreetMap")
+    with metrics.timed("map_render"):
+        st_folium(m, width=None, height=500, returned_objects=[])
 
-    # 收集各城市天氣資料
-    api = WeatherAPI(api_key=active_owm)
 
-    # AQI 資料（如有 key）
-    active_aqi = _get_active_api_key("sidebar_aqi_key", config.AQI_API_KEY)
-    aqi_data = None
-    if active_aqi:
-        aqi_data = fetch_aqi_data(active_aqi)
+@metrics.timed("map_build")
+def _build_weather_map(snap):
+    """
+    以全國快照建立各城市天氣標記的 folium 地圖
+
+    Returns:
+        (folium.Map, bool): 地圖與是否有任何城市資料
+    """
+    import folium
+
+    # 建立台灣中心地圖
+    m = folium.Map(location=[23.5, 121], zoom_start=7, tiles="OpenStreetMap")
 
     has_data = False
     for city_en, coords in config.TAIWAN_CITIES_COORDS.items():
-        weather = api.get_current_weather(city_en)
+        view = snap.city(city_en)
+        weather = view.current
         if not weather:
             continue
         has_data = True
@@ -1149,12 +1218,11 @@ def display_weather_map():
         """
 
         # 加入 AQI（如有）
-        if aqi_data:
-            city_aqi = get_city_aqi(aqi_data, city_en)
-            if city_aqi:
-                aqi_level_key, aqi_color = get_aqi_level(city_aqi["aqi"])
-                popup_html += f"""<br><b>{t('map.popup_aqi')}</b>:
-                    <span style="color:{aqi_color}; font-weight:bold;">{city_aqi['aqi']} ({t(aqi_level_key)})</span>"""
+        city_aqi = view.aqi
+        if city_aqi:
+            aqi_level_key, aqi_color = get_aqi_level(city_aqi["aqi"])
+            popup_html += f"""<br><b>{t('map.popup_aqi')}</b>:
+                <span style="color:{aqi_color}; font-weight:bold;">{city_aqi['aqi']} ({t(aqi_level_key)})</span>"""
 
         popup_html += "</div>"
 
@@ -1169,15 +1237,13 @@ def display_weather_map():
             tooltip=f"{city_name} {temp}°C",
         ).add_to(m)
 
-    if not has_data:
-        st.info(f"ℹ️ {t('map.no_data')}")
-        return
-
-    st_folium(m, width=None, height=500, returned_objects=[])
+    return m, has_data
 
 
 # ── 主程式 ──
 
+@metrics.timed("rerun")
+@deadline.budget(config.RERUN_DEADLINE_SECONDS)
 def main():
     """主程式"""
     initialize_session_state()
@@ -1191,16 +1257,17 @@ def main():
     city_changed = st.session_state.last_city is not None and st.session_state.last_city != city_en
     first_load = st.session_state.current_weather is None
 
+    # 骨架屏載入（快照過期時由本次 rerun 重建，其餘 rerun 直接讀取）
+    skeleton = st.empty()
     if active_owm and (first_load or city_changed):
-        # 骨架屏載入
-        skeleton = st.empty()
         with skeleton.container():
             display_skeleton_loading()
-        fetch_weather_data(city_en)
-        skeleton.empty()
+    snap = fetch_weather_data(city_en)
+    skeleton.empty()
 
-    # 天氣警報（在 tabs 上方）
+    # 天氣警報與全國風險橫幅（在 tabs 上方，各分頁皆可見）
     display_weather_alerts()
+    display_hazard_banner(snap)
 
     # 主要內容區域
     tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
@@ -1215,7 +1282,7 @@ def main():
     ])
 
     with tab1:
-        display_current_weather()
+        display_current_weather(snap)
     with tab2:
         display_forecast_charts()
     with tab3:
@@ -1223,13 +1290,13 @@ def main():
     with tab4:
         display_ai_analysis()
     with tab5:
-        display_travel_recommendation()
+        display_travel_recommendation(snap)
     with tab6:
         display_city_comparison()
     with tab7:
-        display_aqi()
+        display_aqi(snap)
     with tab8:
-        display_weather_map()
+        display_weather_map(snap)
 
     # 頁尾
     st.markdown("---")
@@ -1241,4 +1308,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if profiling.session_enabled():
+        profiling.run(main)
+    else:
+        main()
@@ -1,10 +1,16 @@
 """
 空氣品質 AQI 模組 - 整合環境部開放資料 API
+
+只向上游要求用得到的欄位（AQI_FIELDS），並依測站 publishtime 增量匯入：
+同一測站發布時間未變的資料沿用上次的唯讀紀錄，不重新整理、不重複寫入歷史資料庫。
 """
-import requests
-import streamlit as st
+import sys
+import threading
+
+from weather_analysis import cache, config, history, metrics, payload, upstream
+from weather_analysis.records import AqiStation
 
-AQI_API_URL = "https://data.moenv.gov.tw/api/v2/aqx_p_432"
+AQI_API_URL = config.AQI_API_URL
 
 # 英文城市名 → 環境部 County 欄位值
 CITY_COUNTY_MAP = {
@@ -23,43 +29,147 @@ CITY_COUNTY_MAP = {
 }
 
 
-@st.cache_data(ttl=30 * 60, show_spinner=False)
-def fetch_aqi_data(api_key: str) -> list[dict] | None:
+# 使用到的測站欄位（請求時以 fields 參數投影，回應中的其他欄位亦捨棄）
+AQI_FIELDS = ("sitename", "county", "aqi", "pm2.5", "pm10", "o3", "pollutant", "status", "publishtime")
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _intern(value) -> str:
+    return sys.intern(value) if isinstance(value, str) else ""
+
+
+def project_record(record: dict) -> AqiStation:
+    """只保留 AQI_FIELDS 的唯讀紀錄（數值欄位轉型；字串值 intern，縣市 / 狀態等重複值共用同一物件）"""
+    get = record.get
+    return AqiStation(
+        sitename=_intern(get("sitename")),
+        county=_intern(get("county")),
+        aqi=_to_int(get("aqi")),
+        pm25=_to_float(get("pm2.5", get("pm25"))),
+        pm10=_to_float(get("pm10")),
+        o3=_to_float(get("o3")),
+        pollutant=_intern(get("pollutant")),
+        status=_intern(get("status")),
+        publishtime=str(get("publishtime") or ""),
+    )
+
+
+class StationIndex:
+    """各測站最新一筆紀錄（依 publishtime 判斷是否為新資料）"""
+
+    def __init__(self):
+        self._stations: dict[str, AqiStation] = {}
+        self._lock = threading.Lock()
+
+    def ingest(self, records: list[dict]) -> tuple[list[AqiStation], list[AqiStation]]:
+        """
+        匯入一次查詢結果。
+
+        Returns:
+            (本次回應中所有測站的紀錄, 其中發布時間較新的紀錄)
+        """
+        current, new = [], []
+        with self._lock:
+            for rec in records:
+                site = rec.get("sitename")
+                known = self._stations.get(site)
+                if known is not None and str(rec.get("publishtime", "")) <= known.publishtime:
+                    current.append(known)
+                    continue
+                projected = project_record(rec)
+                if site:
+                    self._stations[site] = projected
+                current.append(projected)
+                new.append(projected)
+        return current, new
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stations.clear()
+
+
+_stations = StationIndex()
+
+
+# 環境部 publishtime 為台灣時間
+def latest_publish_time(records) -> float | None:
+    """測站資料中最新的 publishtime（epoch 秒）；皆無法解析時回傳 None"""
+    times = [history.parse_publish_time(rec.get("publishtime")) for rec in records or ()]
+    times = [ts for ts in times if ts is not None]
+    if not times:
+        return None
+    return max(times).timestamp()
+
+
+def aqi_ttl(records) -> float:
+    """每小時整點資料：下一個整點資料預期上架時到期"""
+    interval, lag = config.CACHE_PUBLISH_SCHEDULES["aqi"]
+    return cache.publication_ttl(latest_publish_time(records), interval, lag, fallback=30 * 60)
+
+
+@cache.cached("aqi", ttl=aqi_ttl, ignore=("api_key",))
+def fetch_aqi_data(api_key: str) -> list[AqiStation] | None:
     """
-    取得全台 AQI 資料（快取 30 分鐘）。
+    取得全台 AQI 資料（快取至下一個整點資料預期上架）。
 
     Returns:
-        list[dict] | None: 測站資料列表，失敗時回傳 None
+        list[AqiStation] | None: 測站資料列表，失敗時回傳 None
     """
     try:
         params = {
             "api_key": api_key,
             "limit": 1000,
             "sort": "ImportDate desc",
+            "fields": ",".join(AQI_FIELDS),
             "format": "JSON",
         }
-        resp = requests.get(AQI_API_URL, params=params, timeout=15)
+        resp = upstream.get(upstream.MOENV_AQI, AQI_API_URL, params=params, timeout=15)
         resp.raise_for_status()
-        data = resp.json()
-        # API 回傳格式不固定：list | {"records": [...]} | {"result": {"records": [...]}}
-        records = []
-        if isinstance(data, list):
-            records = data
-        elif isinstance(data, dict):
-            records = (
-                data.get("records")
-                or data.get("result", {}).get("records")
-                or []
-            )
-        if not isinstance(records, list):
-            return None
-        if not records:
-            return None
+        with metrics.timed("parse_aqi"):
+            records = payload.decode(resp, parse_aqi_payload)
+            if not records:
+                return None
+            records, new = _stations.ingest(records)
+        if new:
+            history.record_aqi(new)
         return records
     except Exception:
         return None
 
 
+def parse_aqi_payload(data) -> list[dict] | None:
+    """
+    取出環境部回應中的測站列表。
+
+    API 回傳格式不固定：list | {"records": [...]} | {"result": {"records": [...]}}
+    """
+    records = []
+    if isinstance(data, list):
+        records = data
+    elif isinstance(data, dict):
+        records = (
+            data.get("records")
+            or data.get("result", {}).get("records")
+            or []
+        )
+    if not isinstance(records, list):
+        return None
+    return records
+
+
 def get_city_aqi(all_data: list[dict], city_en: str) -> dict | None:
     """
     從全台資料中取得指定城市的代表測站 AQI。
@@ -76,28 +186,19 @@ def get_city_aqi(all_data: list[dict], city_en: str) -> dict | None:
     if not city_stations:
         return None
 
-    # 取 AQI 最高的測站
+    # 取 AQI 最高的測站（接受 AqiStation 或上游原始 dict）
     def _parse_aqi(record):
-        try:
-            return int(record.get("aqi", 0))
-        except (ValueError, TypeError):
-            return 0
+        return _to_int(record.get("aqi", 0)) or 0
 
     best = max(city_stations, key=_parse_aqi)
     aqi_val = _parse_aqi(best)
 
-    def _safe_float(val):
-        try:
-            return float(val)
-        except (ValueError, TypeError):
-            return None
-
     return {
         "station": best.get("sitename", ""),
         "aqi": aqi_val,
-        "pm25": _safe_float(best.get("pm2.5", best.get("pm25"))),
-        "pm10": _safe_float(best.get("pm10")),
-        "o3": _safe_float(best.get("o3")),
+        "pm25": _to_float(best.get("pm2.5", best.get("pm25"))),
+        "pm10": _to_float(best.get("pm10")),
+        "o3": _to_float(best.get("o3")),
         "county": county,
         "pollutant": best.get("pollutant", ""),
         "status": best.get("status", ""),
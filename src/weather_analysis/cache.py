@@ -0,0 +1,509 @@
+"""
+資料快取模組 - 有上限、可觀測的 LRU / TTL 快取（取代 st.cache_data）
+
+每個快取各自限制：
+- 最多項目數（max_entries）
+- 位元組預算（max_bytes，以 pickle 長度估算，寫入時計算一次）
+超過任一上限時依 LRU 淘汰；過期項目於讀取時移除。
+
+同一 key 同時 miss 時只會有一個執行緒呼叫上游（其餘等待結果）。
+天氣 / AQI 快取的 key 不含 API Key（ignore=("api_key",)）：Key 只用於 miss 時向上游授權，
+自備 Key 的使用者共用同一份快取資料。
+回傳 None 的結果（上游失敗）不快取，下次請求會重試。
+TTL 可為函式（依值計算，如 publication_ttl 依資料發布時間推算到下一次發布為止）。
+過期項目再保留 stale_ttl 秒（CACHE_STALE_SECONDS）：上游失敗或斷路器開路時改回傳這份過期資料。
+
+快取值在寫入時凍結（dict → FrozenDict、list → tuple），命中時直接回傳同一個物件，
+各 session 共用、可安全並行讀取，不需像 st.cache_data 每次命中都 unpickle 複製一份。
+
+暖啟動：start_checkpointing() 於啟動時載回快取檔（只載入仍在 TTL 內的項目、保留剩餘 TTL），
+之後定期與行程結束時寫出，重新部署 / 重啟後不需重新向上游查詢。
+"""
+import atexit
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from weather_analysis import config, deadline, metrics
+
+_MISSING = object()
+
+
+def estimate_size(value) -> int:
+    """估算值的記憶體占用（pickle 長度；無法序列化時以 0 計）"""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class FrozenDict(dict):
+    """
+    唯讀 dict：讀取行為與 dict 相同（json / pandas / pickle 相容），任何修改都拋出 TypeError。
+
+    需要修改時以 dict(frozen) 或 frozen.copy() 取得可變副本。
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("cached snapshot is read-only; use dict(value) for a mutable copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self) -> dict:
+        return dict(self)
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """遞迴凍結：dict → FrozenDict、list / tuple → tuple、set → frozenset"""
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size")
+
+    def __init__(self, value, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+def publication_ttl(published_at: float | None, interval: float, lag: float,
+                    floor: float | None = None, fallback: float | None = None) -> float:
+    """
+    依資料發布時間推算 TTL：到下一次預期發布（published_at + interval + lag）為止。
+
+    預期發布時間已過（上游資料時間落後）時，TTL 為已逾期的時間（至少 floor、至多 interval + lag）：
+    重查仍拿到同一份資料時逾期時間變長，重查間隔隨之約倍增，不會每 floor 秒重抓一次相同內容。
+
+    Args:
+        published_at: 資料時間（epoch 秒）；None 時回傳 fallback
+        interval / lag: 發布間隔與上架延遲（秒）
+        floor: 最短 TTL，預設 CACHE_MIN_TTL_SECONDS
+        fallback: 無資料時間時的 TTL，預設 CACHE_EXPIRE_MINUTES
+    """
+    floor = config.CACHE_MIN_TTL_SECONDS if floor is None else floor
+    if published_at is None:
+        return config.CACHE_EXPIRE_MINUTES * 60 if fallback is None else fallback
+    remaining = published_at + interval + lag - time.time()
+    if remaining <= 0:
+        remaining = -remaining  # 逾期：依逾期時間退避
+    return min(max(remaining, floor), interval + lag)
+
+
+class BoundedCache:
+    """執行緒安全的 LRU + TTL 快取（ttl 可為 float 或 value → 秒數 的函式）"""
+
+    def __init__(self, name: str, ttl, max_entries: int = 256, max_bytes: int = 0,
+                 stale_ttl: float = 0, clock=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl  # 過期後仍保留、供上游失敗時使用的秒數
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # 0 = 不限
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_served = 0
+
+    # ── 內部操作（呼叫端須持有 self._lock） ──
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        now = self._clock()
+        if entry.expires_at <= now:
+            if entry.expires_at + self.stale_ttl <= now:
+                self._remove(key)
+                self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def _stale(self, key):
+        """過期但仍在 stale_ttl 內的值"""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at + self.stale_ttl <= self._clock():
+            return _MISSING
+        return entry.value
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    # ── 公開介面 ──
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def remaining(self, key) -> float:
+        """key 的剩餘 TTL（秒；不存在或已過期為 0）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0.0
+            return max(entry.expires_at - self._clock(), 0.0)
+
+    def expire(self, key) -> bool:
+        """
+        將 key 標記為過期（下次讀取時重新載入；載入失敗時仍可回傳此過期資料）
+
+        Returns:
+            bool: key 是否存在
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry.expires_at = min(entry.expires_at, self._clock())
+            return True
+
+    def set(self, key, value, ttl: float | None = None):
+        """寫入（凍結後）並回傳實際保存的物件"""
+        value = freeze(value)
+        size = estimate_size(value)
+        if self.max_bytes and size > self.max_bytes:
+            return value  # 單一值超過整體預算，不快取
+        if ttl is None:
+            ttl = self.ttl(value) if callable(self.ttl) else self.ttl
+        expires_at = self._clock() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, expires_at, size)
+            self._bytes += size
+            self._evict()
+        return value
+
+    def get_or_load(self, key, loader):
+        """
+        取得快取值；miss 時呼叫 loader()。
+
+        同一 key 的並行 miss 只執行一次 loader，其餘執行緒等待後直接讀取結果
+        （等待不超過本次 rerun 的剩餘時間預算，逾時則比照失敗處理）。
+        loader 回傳 None 或拋出例外時，若有過期（stale）資料則回傳之。
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                metrics.CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                return value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        if not key_lock.acquire(timeout=deadline.wait_timeout()):
+            stale = self._serve_stale(key)
+            return None if stale is _MISSING else stale
+        try:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    metrics.CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                    return value
+                self.misses += 1
+            metrics.CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            try:
+                try:
+                    value = loader()
+                except Exception:
+                    stale = self._serve_stale(key)
+                    if stale is _MISSING:
+                        raise
+                    return stale
+                if value is not None:
+                    return self.set(key, value)
+                stale = self._serve_stale(key)
+                return None if stale is _MISSING else stale
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        finally:
+            key_lock.release()
+
+    def _serve_stale(self, key):
+        with self._lock:
+            value = self._stale(key)
+            if value is not _MISSING:
+                self.stale_served += 1
+        if value is not _MISSING:
+            metrics.CACHE_REQUESTS.inc(cache=self.name, result="stale")
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def export(self) -> list[tuple]:
+        """未過期項目的 (key, value, 剩餘秒數)，依 LRU 順序（最舊在前）"""
+        with self._lock:
+            now = self._clock()
+            return [
+                (key, entry.value, entry.expires_at - now)
+                for key, entry in self._entries.items()
+                if entry.expires_at > now
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_served": self.stale_served,
+            }
+
+
+# ── 全域快取登記 ──
+
+_caches: dict[str, BoundedCache] = {}
+_pending: dict[str, list] = {}  # 快取檔中、尚未登記（模組未匯入）的快取項目
+_registry_lock = threading.Lock()
+
+
+def get_cache(name: str, ttl) -> BoundedCache:
+    """取得（或建立）具名快取；上限取自 config.CACHE_LIMITS"""
+    pending = None
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            max_entries, max_bytes = config.CACHE_LIMITS.get(name, config.CACHE_LIMITS["default"])
+            cache = _caches[name] = BoundedCache(
+                name, ttl, max_entries, max_bytes, stale_ttl=config.CACHE_STALE_SECONDS,
+            )
+            pending = _pending.pop(name, None)  # 快取檔中先前載入的項目
+    if pending:
+        _load_entries(cache, pending)
+    return cache
+
+
+def all_stats() -> list[dict]:
+    with _registry_lock:
+        caches = list(_caches.values())
+    return [c.stats() for c in caches]
+
+
+def clear_all() -> None:
+    with _registry_lock:
+        caches = list(_caches.values())
+    for c in caches:
+        c.clear()
+
+
+def cached(name: str, ttl, ignore: tuple[str, ...] = ()):
+    """
+    函式結果快取 decorator（以參數值為 key；ttl 為秒數或 結果 → 秒數 的函式）。
+
+    ignore 列出不納入 key 的參數（如 api_key：只用於 miss 時向上游授權，
+    不同使用者的 Key 查同一城市共用同一筆快取）。
+
+    被裝飾的函式多出 .cache（BoundedCache）、.clear()、
+    .key(*args, **kwargs)（該組參數的快取 key）、.remaining(*args, **kwargs)（該組參數的剩餘 TTL）
+    與 .expire(*args, **kwargs)（將該組參數的項目標記為過期）。
+    """
+    def decorator(fn):
+        cache = get_cache(name, ttl)
+        signature = inspect.signature(fn)
+
+        def make_key(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(
+                (param, value) for param, value in bound.arguments.items()
+                if param not in ignore
+            )
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return cache.get_or_load(make_key(*args, **kwargs), lambda: fn(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        wrapper.key = make_key
+        wrapper.remaining = lambda *args, **kwargs: cache.remaining(make_key(*args, **kwargs))
+        wrapper.expire = lambda *args, **kwargs: cache.expire(make_key(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+# ── 暖啟動（快取檔） ──
+
+_CHECKPOINT_VERSION = 3  # 2：預報 / AQI 改存 records 型別；3：One Call 改存 UVI + 官方警報
+_checkpointing = False
+
+
+def _load_entries(cache: BoundedCache, items: list) -> int:
+    """載入 (key, value, 到期時間 time.time()) 項目，略過已過期者"""
+    now = time.time()
+    loaded = 0
+    for key, value, expires_at in items:
+        if expires_at > now:
+            cache.set(key, value, ttl=expires_at - now)
+            loaded += 1
+    return loaded
+
+
+def checkpoint(path: str) -> int:
+    """
+    將所有快取的未過期項目寫入 path（先寫暫存檔再原子替換）。
+
+    Returns:
+        int: 寫出的項目數
+    """
+    now = time.time()
+    with _registry_lock:
+        caches = list(_caches.values())
+        payload = {name: list(items) for name, items in _pending.items()}
+    for c in caches:
+        payload[c.name] = [(key, value, now + remaining) for key, value, remaining in c.export()]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".cache-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"version": _CHECKPOINT_VERSION, "saved_at": now, "caches": payload},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return sum(len(items) for items in payload.values())
+
+
+def restore(path: str) -> int:
+    """
+    從快取檔載回仍在 TTL 內的項目（剩餘 TTL 以寫出時的到期時間計算）。
+    檔案不存在、損毀或版本不符時略過。
+
+    path 為受信任輸入：pickle 載入時可執行任意程式碼，只能指向本服務帳號獨占寫入的檔案。
+
+    Returns:
+        int: 載入現有快取的項目數（尚未登記的快取於建立時載入）
+    """
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception:
+        return 0
+    if not isinstance(payload, dict) or payload.get("version") != _CHECKPOINT_VERSION:
+        return 0
+
+    loaded = 0
+    for name, items in payload.get("caches", {}).items():
+        with _registry_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                _pending[name] = items
+                continue
+        loaded += _load_entries(cache, items)
+    return loaded
+
+
+def _safe_checkpoint(path: str) -> None:
+    try:
+        checkpoint(path)
+    except Exception:
+        pass
+
+
+def start_checkpointing(path: str, interval: float) -> bool:
+    """
+    載回快取檔，並在背景每 interval 秒與行程結束時寫出（每個行程只啟動一次）。
+
+    Returns:
+        bool: 本次是否啟動（已啟動或 path 為空時回傳 False）
+    """
+    global _checkpointing
+    with _registry_lock:
+        if _checkpointing or not path:
+            return False
+        _checkpointing = True
+
+    restore(path)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            _safe_checkpoint(path)
+
+    if interval > 0:
+        threading.Thread(target=loop, name="cache-checkpoint", daemon=True).start()
+    atexit.register(_safe_checkpoint, path)
+    return True
+
+
+def _stat_collector(field: str):
+    return lambda: {(s["name"],): s[field] for s in all_stats()}
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "weather_cache_entries", "gauge", "Entries currently held per data cache.",
+    ("cache",), _stat_collector("entries"),
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "weather_cache_bytes", "gauge", "Estimated bytes held per data cache.",
+    ("cache",), _stat_collector("bytes"),
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "weather_cache_evictions_total", "counter", "Entries evicted by LRU / byte budget.",
+    ("cache",), _stat_collector("evictions"),
+))
@@ -48,9 +48,57 @@ ONECALL_BASE_URL = "https://api.openweathermap.org/data/3.0"
 # 環境部 AQI API 設定（可選）
 AQI_API_KEY = get_env_api_key("AQI_API_KEY", "")
 
+# 環境部 AQI API 端點
+AQI_API_URL = "https://data.moenv.gov.tw/api/v2/aqx_p_432"
+
 # OpenAI API設定
 OPENAI_API_KEY = get_env_api_key("OPENAI_API_KEY", "your_openai_api_key_here")
 OPENAI_MODEL = "gpt-4o-mini"
+OPENAI_BASE_URL = None  # None = OpenAI 官方端點
+
+# 上游模擬器（設定後所有上游 API 改連本地模擬器，見 weather_analysis.emulator）
+UPSTREAM_EMULATOR_URL = os.getenv("UPSTREAM_EMULATOR_URL", "").rstrip("/")
+if UPSTREAM_EMULATOR_URL:
+    OPENWEATHER_BASE_URL = f"{UPSTREAM_EMULATOR_URL}/data/2.5"
+    ONECALL_BASE_URL = f"{UPSTREAM_EMULATOR_URL}/data/3.0"
+    AQI_API_URL = f"{UPSTREAM_EMULATOR_URL}/api/v2/aqx_p_432"
+    OPENAI_BASE_URL = f"{UPSTREAM_EMULATOR_URL}/v1"
+
+# 上游限流（token bucket，依主機 + API Key）：主機 → (每分鐘次數, 突發上限)；次數 0 = 不限速
+UPSTREAM_RATE_LIMITS = {
+    "api.openweathermap.org": (60, 10),  # OWM 免費方案 60 calls/min（天氣、預報、One Call 同一主機）
+    "data.moenv.gov.tw": (30, 5),
+}
+UPSTREAM_DEFAULT_RATE_LIMIT = (
+    int(os.getenv("UPSTREAM_RATE_LIMIT_PER_MINUTE", "0")),
+    int(os.getenv("UPSTREAM_RATE_LIMIT_BURST", "10")),
+)
+UPSTREAM_MAX_WAIT_SECONDS = 10.0             # 使用者請求最多等待額度的時間
+UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS = 0.0   # 背景預取最多等待的時間（0 = 額度不足時直接跳過，下次重建再補）
+UPSTREAM_BACKGROUND_RESERVE = 0.3            # 保留給使用者請求的額度比例（背景請求不可動用）
+UPSTREAM_MAX_RETRY_AFTER_SECONDS = 5.0       # 429 的 Retry-After 不超過此值時等待後重試一次
+
+# 斷路器（每個上游服務）：連續失敗達門檻即開路，開路期間直接使用快取（含過期）資料
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_SECONDS = 30  # 開路多久後放行一個探測請求（half-open）
+
+# 對沖請求（hedged request）：請求超過近期 p95 延遲仍未回應時送出一份重複請求，取先完成者
+UPSTREAM_HEDGE_SERVICES = (
+    ("owm_weather", "owm_forecast") if os.getenv("UPSTREAM_HEDGING", "1") != "0" else ()
+)
+HEDGE_PERCENTILE = 0.95
+HEDGE_WINDOW = 200              # 計算延遲百分位的最近樣本數
+HEDGE_MIN_SAMPLES = 20          # 樣本不足時不對沖
+HEDGE_MIN_DELAY_SECONDS = 0.05
+HEDGE_MAX_DELAY_SECONDS = 3.0
+HEDGE_MAX_RATIO = 0.05          # 對沖請求最多佔一般請求的比例（額外負載上限）
+HEDGE_BURST = 5                 # 累積未用的對沖額度上限
+HEDGE_WORKERS = 32              # 對沖請求執行緒池大小
+HEDGE_PRIMARY_WORKERS = 64      # 可對沖請求的原請求執行緒池大小（與對沖請求分開）
+
+# 每次 rerun 的時間預算（秒，0 = 不限制）：上游呼叫逾時縮短為剩餘預算，用完即改用快取 / 過期資料或規則引擎
+RERUN_DEADLINE_SECONDS = float(os.getenv("RERUN_DEADLINE_SECONDS", "8"))
+DEADLINE_MIN_REQUEST_SECONDS = 0.3  # 剩餘預算低於此值時不再送出上游請求
 
 # 台灣主要城市列表（使用OpenWeatherMap的城市名稱）
 TAIWAN_CITIES = {
@@ -101,13 +149,80 @@ TAIWAN_CITIES_COORDS = {
 }
 
 # 系統設定
-CACHE_EXPIRE_MINUTES = 15  # 快取過期時間
+CACHE_EXPIRE_MINUTES = 15  # 快取過期時間（資料沒有發布時間可推算 TTL 時使用）
+
+# 依資料發布時程推算 TTL：快取 → (發布間隔秒數, 發布後到上游可取得的延遲秒數)
+# 項目在下一次預期發布（資料時間 + 間隔 + 延遲）後到期；逾期仍未更新時依逾期時間退避重查（至少 CACHE_MIN_TTL_SECONDS）
+CACHE_PUBLISH_SCHEDULES = {
+    "current_weather": (10 * 60, 2 * 60),  # OWM 測站觀測約每 10 分鐘
+    "onecall": (10 * 60, 2 * 60),          # One Call（UV 指數與官方警報共用同一次請求）
+    "forecast": (3 * 3600, 10 * 60),       # OWM 3 小時預報：第一個時段過後換下一批
+    "aqi": (3600, 20 * 60),                # 環境部每小時整點資料，約 20 分鐘後上架
+}
+CACHE_MIN_TTL_SECONDS = 2 * 60
+
+# 資料快取上限：名稱 → (最多項目數, 位元組預算；0 = 不限)，超過時依 LRU 淘汰
+_MB = 1024 * 1024
+CACHE_LIMITS = {
+    "current_weather": (512, 4 * _MB),
+    "forecast": (256, 32 * _MB),
+    "onecall": (128, 1 * _MB),
+    "aqi": (4, 8 * _MB),
+    "ai": (256, 4 * _MB),
+    "default": (256, 16 * _MB),
+}
+
+# 全國快照（各分頁共用，每個更新週期建立一次）
+SNAPSHOT_MAX_AGE_SECONDS = 5 * 60  # 超過即於下次 rerun 重建（未到發布時間的來源皆為快取命中）
+SNAPSHOT_RETRY_SECONDS = 30  # 有城市未取得資料（限流 / 上游錯誤）時，提早重建的間隔
+SNAPSHOT_WORKERS = 6  # 建立快照時並行查詢的城市數
+
+# 過期資料保留時間（秒）：上游失敗或斷路時改用這份資料
+CACHE_STALE_SECONDS = 6 * 3600
+
+# 快取暖啟動（預設停用，設定路徑才啟用）：定期寫出快取檔、重新啟動時載回。
+# 檔案為 pickle，載入時可執行任意程式碼，視為受信任輸入：請使用絕對路徑，放在只有本服務帳號可寫入的目錄
+CACHE_CHECKPOINT_PATH = os.getenv("CACHE_CHECKPOINT_PATH", "")
+CACHE_CHECKPOINT_INTERVAL_SECONDS = 60
+
 DEFAULT_CITY = "台北"
 FORECAST_DAYS = 5
 
+# 歷史觀測資料庫（SQLite 路徑，設為空字串可停用）
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "weather_history.sqlite3")
+HISTORY_RAW_RETENTION_DAYS = int(os.getenv("HISTORY_RAW_RETENTION_DAYS", "7"))         # 原始資料保留天數
+HISTORY_HOURLY_RETENTION_DAYS = int(os.getenv("HISTORY_HOURLY_RETENTION_DAYS", "90"))  # 每小時彙整 / 封存保留天數
+HISTORY_DAILY_RETENTION_DAYS = int(os.getenv("HISTORY_DAILY_RETENTION_DAYS", "0"))     # 每日彙整保留天數（0 = 永久）
+HISTORY_COMPACT_INTERVAL_HOURS = 6  # 自動壓縮間隔（0 = 僅手動執行）
+
+# 異常偵測（同城市同時段的串流統計）
+ANOMALY_Z_THRESHOLD = 3.0   # |z| 達此值視為異常，再 +1 升級為 DANGER
+ANOMALY_MIN_SAMPLES = 20    # 同時段樣本數不足時不判斷
+
+# 自訂警報規則檔（JSON，格式見 alerts.load_rules；空字串 = 僅使用內建規則）
+ALERT_RULES_PATH = os.getenv("ALERT_RULES_PATH", "")
+
+# 全國預報風險橫幅（各分頁上方）顯示的項目數，其餘列於時間軸
+HAZARD_BANNER_ITEMS = 3
+
+# Prometheus 指標端點（Streamlit 行程另開的埠號，0 = 停用）
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# 指標端點綁定的位址（預設只接受本機連線；含管理者剖析的耗時序列，對外開放時請自行設定防火牆）
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# 效能剖析模式（PROFILE_MODE=1 全部 session 剖析；或以 ?profile=<token> 限管理者啟用）
+PROFILE_MODE = os.getenv("PROFILE_MODE", "").lower() in ("1", "true", "yes")
+PROFILE_ADMIN_TOKEN = get_env_api_key("PROFILE_ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # pstats 輸出目錄
+PROFILE_KEEP = 200   # 最多保留的剖析檔數
+PROFILE_TOP_N = 15   # 側邊欄顯示的熱點函式數
+
 # 單位設定
 UNITS = "metric"  # metric = 攝氏度, imperial = 華氏度
 LANG = "zh_tw"    # 語言設定（OWM API 預設值，實際會依 i18n 動態切換）
 
 # AI分析設定
 AI_MAX_TOKENS = 1000  # AI回應的最大token數
+AI_TIMEOUT_SECONDS = 30.0  # 單次 GPT 請求逾時（另受時間預算限制）
+# 按下 AI 分析按鈕時的獨立時間預算（秒，取代 RERUN_DEADLINE_SECONDS；四個項目依序請求，用完的項目改用規則引擎）
+AI_ANALYSIS_DEADLINE_SECONDS = float(os.getenv("AI_ANALYSIS_DEADLINE_SECONDS", "60"))
@@ -0,0 +1,77 @@
+"""
+時間預算模組 - 每次 rerun 的截止時間，經 contextvar 傳到所有上游呼叫
+
+    @deadline.budget(config.RERUN_DEADLINE_SECONDS)
+    def main(): ...
+
+- upstream.get / OpenAI 呼叫的逾時縮短為剩餘預算；剩餘不足 DEADLINE_MIN_REQUEST_SECONDS 時
+  不送出請求，直接拋出 DeadlineExceeded（requests.RequestException 子類，呼叫端照一般網路錯誤處理，
+  資料快取改回傳過期資料，AI 分析改用規則引擎）
+- 等待其他執行緒的快取載入 / 快照重建也不超過剩餘預算
+- 巢狀 budget 取較早的截止時間；未設定預算時不限制
+- budget(..., replace=True) 改用獨立預算、不受外層限制（使用者明確觸發的長動作，如 AI 分析按鈕）
+- 執行緒池中的工作需以 contextvars.copy_context().run 執行才會帶上預算
+"""
+import contextlib
+import time
+from contextvars import ContextVar
+
+import requests
+
+from weather_analysis import config
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.RequestException):
+    """本次 rerun 的時間預算已用完"""
+
+
+@contextlib.contextmanager
+def budget(seconds: float | None, replace: bool = False):
+    """
+    設定此區塊的時間預算（秒）；None 或 0 表示不限制（replace=True 時為整個區塊不限制）
+
+    replace=True 時不與外層預算取較早者，離開區塊後恢復外層預算。
+    """
+    if not seconds and not replace:
+        yield
+        return
+    at = time.monotonic() + seconds if seconds else None
+    current = _deadline.get()
+    if not replace and current is not None:
+        at = min(at, current)
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """剩餘秒數（不小於 0）；未設定預算時回傳 None"""
+    at = _deadline.get()
+    if at is None:
+        return None
+    return max(at - time.monotonic(), 0.0)
+
+
+def clamp(timeout: float | None) -> float | None:
+    """
+    將請求逾時縮短為剩餘預算。
+
+    Raises:
+        DeadlineExceeded: 剩餘預算不足以送出請求
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left < config.DEADLINE_MIN_REQUEST_SECONDS:
+        raise DeadlineExceeded(f"rerun deadline exceeded ({left:.2f}s left)")
+    return left if timeout is None else min(timeout, left)
+
+
+def wait_timeout() -> float:
+    """等待鎖 / Future 的逾時（threading 慣例：-1 表示不限）"""
+    left = remaining()
+    return -1 if left is None else left
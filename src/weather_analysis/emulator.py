@@ -0,0 +1,470 @@
+"""
+上游 API 模擬器 - 本地模擬 OpenWeatherMap / 環境部 AQI / OpenAI 端點
+
+供離線壓力測試與端對端效能基準使用，可設定延遲、錯誤率與 429 限流。
+資料依城市座標與時間決定性產生（同一時段重複查詢結果相同）。
+
+啟動方式：
+    uv run python -m weather_analysis.emulator --port 8700 --latency-ms 80 --error-rate 0.02
+
+應用程式端設定環境變數 UPSTREAM_EMULATOR_URL=http://127.0.0.1:8700 即改連模擬器。
+"""
+import argparse
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from weather_analysis import config
+from weather_analysis.aqi_api import CITY_COUNTY_MAP
+
+# 模擬器視為無效的 API Key（用來測試 401 流程）
+INVALID_KEY = "invalid"
+
+# 每縣市模擬測站數
+_STATIONS_PER_COUNTY = 4
+
+_WEATHER_KINDS = [
+    (800, "Clear", "晴", "clear sky", "01"),
+    (801, "Clouds", "晴，少雲", "few clouds", "02"),
+    (803, "Clouds", "多雲", "broken clouds", "04"),
+    (500, "Rain", "小雨", "light rain", "10"),
+    (501, "Rain", "中雨", "moderate rain", "10"),
+]
+
+
+@dataclass
+class EmulatorSettings:
+    """模擬器行為設定"""
+    latency_ms: float = 50.0        # 平均延遲
+    jitter_ms: float = 20.0         # 延遲隨機範圍（±）
+    error_rate: float = 0.0         # 回傳 500 的機率
+    rate_limit_rate: float = 0.0    # 隨機回傳 429 的機率
+    quota_per_minute: int = 0       # 每個 API Key 每分鐘配額（0 = 不限）
+    retry_after: int = 1            # 429 的 Retry-After 秒數
+
+
+class _Quota:
+    """每個 API Key 每分鐘的固定視窗計數"""
+
+    def __init__(self):
+        self._windows: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: int) -> bool:
+        if not limit:
+            return True
+        minute = int(time.time() // 60)
+        with self._lock:
+            window, count = self._windows.get(key, (minute, 0))
+            if window != minute:
+                window, count = minute, 0
+            if count >= limit:
+                return False
+            self._windows[key] = (window, count + 1)
+            return True
+
+
+# ── 決定性資料產生 ──
+
+def _rng(*parts) -> random.Random:
+    return random.Random("|".join(str(p) for p in parts))
+
+
+def _find_city(query: str) -> str | None:
+    name = query.split(",")[0].strip().lower()
+    for city_en in config.TAIWAN_CITIES_COORDS:
+        if city_en.lower() == name:
+            return city_en
+    return None
+
+
+def _nearest_city(lat: float, lon: float) -> str:
+    return min(
+        config.TAIWAN_CITIES_COORDS,
+        key=lambda c: (config.TAIWAN_CITIES_COORDS[c]["lat"] - lat) ** 2
+        + (config.TAIWAN_CITIES_COORDS[c]["lon"] - lon) ** 2,
+    )
+
+
+def _temp_at(city: str, ts: int) -> float:
+    """日夜變化 + 緯度修正 + 決定性雜訊"""
+    lat = config.TAIWAN_CITIES_COORDS[city]["lat"]
+    hour = datetime.fromtimestamp(ts).hour
+    base = 27 - (lat - 22.5) * 1.5
+    diurnal = 4 * math.sin((hour - 9) / 24 * 2 * math.pi)
+    return round(base + diurnal + _rng(city, ts // 3600).uniform(-1, 1), 2)
+
+
+def _weather_block(city: str, ts: int, lang: str) -> list[dict]:
+    code, main, zh, en, icon = _rng(city, "sky", ts // 10800).choice(_WEATHER_KINDS)
+    pod = "d" if 6 <= datetime.fromtimestamp(ts).hour < 18 else "n"
+    return [{
+        "id": code, "main": main,
+        "description": zh if lang == "zh_tw" else en,
+        "icon": icon + pod,
+    }]
+
+
+def _main_block(city: str, ts: int) -> dict:
+    rng = _rng(city, "main", ts // 3600)
+    temp = _temp_at(city, ts)
+    return {
+        "temp": temp,
+        "feels_like": round(temp + rng.uniform(-0.5, 1.5), 2),
+        "temp_min": round(temp - rng.uniform(0, 1.5), 2),
+        "temp_max": round(temp + rng.uniform(0, 1.5), 2),
+        "pressure": 1013 + rng.randint(-4, 4),
+        "humidity": rng.randint(55, 95),
+        "sea_level": 1013,
+        "grnd_level": 1008,
+    }
+
+
+def _wind_block(city: str, ts: int) -> dict:
+    rng = _rng(city, "wind", ts // 3600)
+    return {
+        "speed": round(rng.uniform(0.5, 9), 2),
+        "deg": rng.randint(0, 359),
+        "gust": round(rng.uniform(1, 14), 2),
+    }
+
+
+def _sun_times(ts: int) -> tuple[int, int]:
+    day = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+    midnight = int(day.timestamp())
+    return midnight + 5 * 3600 + 50 * 60, midnight + 17 * 3600 + 45 * 60
+
+
+def build_current_weather(city: str, now: int, lang: str) -> dict:
+    """模擬 /data/2.5/weather 回應（觀測時間每 10 分鐘更新）"""
+    ts = now - now % 600
+    coords = config.TAIWAN_CITIES_COORDS[city]
+    sunrise, sunset = _sun_times(ts)
+    return {
+        "coord": {"lon": coords["lon"], "lat": coords["lat"]},
+        "weather": _weather_block(city, ts, lang),
+        "base": "stations",
+        "main": _main_block(city, ts),
+        "visibility": 10000,
+        "wind": _wind_block(city, ts),
+        "clouds": {"all": _rng(city, "clouds", ts // 3600).randint(0, 100)},
+        "dt": ts,
+        "sys": {"type": 1, "id": 7949, "country": "TW", "sunrise": sunrise, "sunset": sunset},
+        "timezone": 28800,
+        "id": 1668341,
+        "name": city,
+        "cod": 200,
+    }
+
+
+def build_forecast(city: str, now: int, lang: str) -> dict:
+    """模擬 /data/2.5/forecast 回應（40 筆 3 小時預報）"""
+    start = now - now % 10800 + 10800
+    items = []
+    for i in range(40):
+        ts = start + i * 10800
+        items.append({
+            "dt": ts,
+            "main": _main_block(city, ts),
+            "weather": _weather_block(city, ts, lang),
+            "clouds": {"all": _rng(city, "clouds", ts // 3600).randint(0, 100)},
+            "wind": _wind_block(city, ts),
+            "visibility": 10000,
+            "pop": round(_rng(city, "pop", ts // 10800).choice([0, 0, 0.1, 0.3, 0.55, 0.8, 0.95]), 2),
+            "sys": {"pod": "d" if 6 <= datetime.fromtimestamp(ts).hour < 18 else "n"},
+            "dt_txt": datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+        })
+    coords = config.TAIWAN_CITIES_COORDS[city]
+    sunrise, sunset = _sun_times(now)
+    return {
+        "cod": "200", "message": 0, "cnt": len(items), "list": items,
+        "city": {
+            "id": 1668341, "name": city, "coord": coords, "country": "TW",
+            "timezone": 28800, "sunrise": sunrise, "sunset": sunset,
+        },
+    }
+
+
+def _uvi_at(ts: int) -> float:
+    hour = datetime.fromtimestamp(ts).hour
+    return round(max(0.0, 10 * math.sin((hour - 6) / 12 * math.pi)), 2)
+
+
+def build_onecall(lat: float, lon: float, now: int, exclude: str) -> dict:
+    """模擬 /data/3.0/onecall 回應"""
+    city = _nearest_city(lat, lon)
+    excluded = set(filter(None, exclude.split(",")))
+    sunrise, sunset = _sun_times(now)
+
+    def point(ts):
+        main = _main_block(city, ts)
+        wind = _wind_block(city, ts)
+        return {
+            "dt": ts, "temp": main["temp"], "feels_like": main["feels_like"],
+            "pressure": main["pressure"], "humidity": main["humidity"],
+            "uvi": _uvi_at(ts), "clouds": _rng(city, "clouds", ts // 3600).randint(0, 100),
+            "visibility": 10000, "wind_speed": wind["speed"], "wind_deg": wind["deg"],
+            "weather": _weather_block(city, ts, "en"),
+        }
+
+    data = {"lat": lat, "lon": lon, "timezone": "Asia/Taipei", "timezone_offset": 28800}
+    if "current" not in excluded:
+        data["current"] = {**point(now), "sunrise": sunrise, "sunset": sunset}
+    if "hourly" not in excluded:
+        hour_start = now - now % 3600
+        data["hourly"] = [point(hour_start + h * 3600) for h in range(48)]
+    if "daily" not in excluded:
+        day_start = now - now % 86400 + 4 * 3600
+        data["daily"] = [
+            {**point(day_start + d * 86400), "sunrise": sunrise + d * 86400, "sunset": sunset + d * 86400}
+            for d in range(8)
+        ]
+    if "alerts" not in excluded:
+        data["alerts"] = []
+    return data
+
+
+def build_aqi_records(now: int) -> list[dict]:
+    """模擬環境部 aqx_p_432 測站資料（每小時發布一次）"""
+    published = now - now % 3600
+    # 環境部 publishtime 為台灣時間
+    publish_str = datetime.fromtimestamp(published, timezone(timedelta(hours=8))).strftime("%Y/%m/%d %H:%M:%S")
+    records = []
+    site_id = 1
+    for city_en, county in CITY_COUNTY_MAP.items():
+        coords = config.TAIWAN_CITIES_COORDS[city_en]
+        for n in range(_STATIONS_PER_COUNTY):
+            rng = _rng(county, n, published)
+            aqi = rng.randint(15, 160)
+            pm25 = rng.randint(3, 65)
+            records.append({
+                "sitename": f"{county[:2]}{n + 1}",
+                "county": county,
+                "aqi": str(aqi),
+                "pollutant": "" if aqi <= 50 else rng.choice(["細懸浮微粒", "臭氧八小時", "懸浮微粒"]),
+                "status": "良好" if aqi <= 50 else "普通" if aqi <= 100 else "對敏感族群不健康",
+                "so2": str(round(rng.uniform(0.5, 4), 1)),
+                "co": str(round(rng.uniform(0.1, 0.8), 2)),
+                "o3": str(rng.randint(10, 80)),
+                "o3_8hr": str(rng.randint(10, 70)),
+                "pm10": str(rng.randint(10, 90)),
+                "pm2.5": str(pm25),
+                "no2": str(round(rng.uniform(2, 25), 1)),
+                "wind_speed": str(round(rng.uniform(0.5, 6), 1)),
+                "wind_direc": str(rng.randint(0, 359)),
+                "publishtime": publish_str,
+                "pm2.5_avg": str(pm25 + rng.randint(-3, 3)),
+                "pm10_avg": str(rng.randint(10, 80)),
+                "longitude": str(round(coords["lon"] + rng.uniform(-0.1, 0.1), 6)),
+                "latitude": str(round(coords["lat"] + rng.uniform(-0.1, 0.1), 6)),
+                "siteid": str(site_id),
+            })
+            site_id += 1
+    return records
+
+
+# ── 端點 ──
+
+def create_app(settings: EmulatorSettings | None = None) -> Starlette:
+    """建立模擬器 ASGI app"""
+    settings = settings or EmulatorSettings()
+    quota = _Quota()
+    rng = random.Random()
+
+    async def _simulate(key: str) -> Response | None:
+        """延遲 + 錯誤 / 限流注入；回傳非 None 時直接作為回應"""
+        delay = settings.latency_ms + rng.uniform(-settings.jitter_ms, settings.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if not quota.take(key, settings.quota_per_minute) or rng.random() < settings.rate_limit_rate:
+            return JSONResponse(
+                {"cod": 429, "message": "Too many requests"}, status_code=429,
+                headers={"Retry-After": str(settings.retry_after)},
+            )
+        if rng.random() < settings.error_rate:
+            return JSONResponse({"cod": 500, "message": "Internal error"}, status_code=500)
+        return None
+
+    def _owm_unauthorized():
+        return JSONResponse(
+            {"cod": 401, "message": "Invalid API key. Please see https://openweathermap.org/faq#error401"},
+            status_code=401,
+        )
+
+    async def weather(request: Request) -> Response:
+        params = request.query_params
+        key = params.get("appid", "")
+        if (fault := await _simulate(key)) is not None:
+            return fault
+        if key == INVALID_KEY:
+            return _owm_unauthorized()
+        city = _find_city(params.get("q", ""))
+        if city is None:
+            return JSONResponse({"cod": "404", "message": "city not found"}, status_code=404)
+        return JSONResponse(build_current_weather(city, int(time.time()), params.get("lang", "en")))
+
+    async def forecast(request: Request) -> Response:
+        params = request.query_params
+        key = params.get("appid", "")
+        if (fault := await _simulate(key)) is not None:
+            return fault
+        if key == INVALID_KEY:
+            return _owm_unauthorized()
+        city = _find_city(params.get("q", ""))
+        if city is None:
+            return JSONResponse({"cod": "404", "message": "city not found"}, status_code=404)
+        return JSONResponse(build_forecast(city, int(time.time()), params.get("lang", "en")))
+
+    async def onecall(request: Request) -> Response:
+        params = request.query_params
+        key = params.get("appid", "")
+        if (fault := await _simulate(key)) is not None:
+            return fault
+        if key == INVALID_KEY:
+            return _owm_unauthorized()
+        try:
+            lat, lon = float(params["lat"]), float(params["lon"])
+        except (KeyError, ValueError):
+            return JSONResponse({"cod": "400", "message": "wrong latitude"}, status_code=400)
+        return JSONResponse(build_onecall(lat, lon, int(time.time()), params.get("exclude", "")))
+
+    async def aqi(request: Request) -> Response:
+        params = request.query_params
+        key = params.get("api_key", "")
+        if (fault := await _simulate(key)) is not None:
+            return fault
+        if key == INVALID_KEY:
+            # 環境部 API：無效 key 仍回 200，內容為純文字
+            return PlainTextResponse("該 API KEY 不存在或是已經到期。")
+        records = build_aqi_records(int(time.time()))
+        limit = int(params.get("limit", 1000))
+        if fields := [f for f in params.get("fields", "").split(",") if f]:
+            records = [{k: rec[k] for k in fields if k in rec} for rec in records]
+        return JSONResponse({
+            "fields": [{"id": k, "type": "text"} for k in records[0]],
+            "resource_id": "aqx_p_432",
+            "total": str(len(records)),
+            "limit": str(limit),
+            "records": records[:limit],
+        })
+
+    def _bearer(request: Request) -> str:
+        return request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+
+    def _openai_unauthorized():
+        return JSONResponse(
+            {"error": {"message": "Incorrect API key provided", "type": "invalid_request_error",
+                       "code": "invalid_api_key"}},
+            status_code=401,
+        )
+
+    async def chat_completions(request: Request) -> Response:
+        key = _bearer(request)
+        if (fault := await _simulate(key)) is not None:
+            return fault
+        if key == INVALID_KEY:
+            return _openai_unauthorized()
+        body = await request.json()
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        content = (
+            "（模擬器回應）根據提供的天氣資料，今日天氣大致穩定，"
+            "外出請留意溫差與降雨機率。\n\n"
+            f"- 參考資料長度：{len(prompt)} 字"
+        )
+        now = int(time.time())
+        return JSONResponse({
+            "id": f"chatcmpl-emu-{now}",
+            "object": "chat.completion",
+            "created": now,
+            "model": body.get("model", config.OPENAI_MODEL),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 2, "completion_tokens": 60,
+                      "total_tokens": len(prompt) // 2 + 60},
+        })
+
+    async def models(request: Request) -> Response:
+        key = _bearer(request)
+        if (fault := await _simulate(key)) is not None:
+            return fault
+        if key == INVALID_KEY:
+            return _openai_unauthorized()
+        return JSONResponse({
+            "object": "list",
+            "data": [{"id": config.OPENAI_MODEL, "object": "model", "created": 0, "owned_by": "emulator"}],
+        })
+
+    calls: Counter = Counter()
+    calls_lock = threading.Lock()
+
+    def _counted(endpoint):
+        """統計各端點呼叫次數與狀態碼"""
+        async def wrapper(request: Request) -> Response:
+            response = await endpoint(request)
+            with calls_lock:
+                calls[(request.url.path, response.status_code)] += 1
+            return response
+        return wrapper
+
+    async def stats(request: Request) -> Response:
+        with calls_lock:
+            rows = [
+                {"path": path, "status": status, "count": count}
+                for (path, status), count in sorted(calls.items())
+            ]
+        return JSONResponse({"calls": rows})
+
+    app = Starlette(routes=[
+        Route("/data/2.5/weather", _counted(weather)),
+        Route("/data/2.5/forecast", _counted(forecast)),
+        Route("/data/3.0/onecall", _counted(onecall)),
+        Route("/api/v2/aqx_p_432", _counted(aqi)),
+        Route("/v1/chat/completions", _counted(chat_completions), methods=["POST"]),
+        Route("/v1/models", _counted(models)),
+        Route("/_emulator/stats", stats),
+    ])
+    # (path, status) → 次數；同行程使用時可直接讀取
+    app.state.calls = calls
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local upstream emulator (OWM / MOENV AQI / OpenAI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--quota-per-minute", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    settings = EmulatorSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        quota_per_minute=args.quota_per_minute,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+預報準確度追蹤模組 - 比較過去的 5 天預報與之後的實際觀測
+
+每次預報發布的各時段存為待驗證項目；之後的即時天氣觀測到達時，
+以目標時間前後 MATCH_WINDOW 內最接近的一筆觀測配對，累加誤差統計（MAE / bias），
+依 (城市, 指標, 預報提前時數) 分組，不需重新計算全部歷史。
+
+目標時間之前的觀測只暫存為候選（之後可能有更接近的觀測）；
+收到目標時間當下或之後的觀測、或配對範圍已過時，才以最接近的候選計分。
+"""
+import threading
+from datetime import datetime, timedelta
+
+from weather_analysis import config
+
+ACCURACY_METRICS = ("temperature", "humidity", "wind_speed")
+
+# 觀測與預報目標時間相差在此範圍內才可配對（取最接近的一筆）
+MATCH_WINDOW = timedelta(minutes=15)
+# OWM 預報每 3 小時更新一次；同一週期內重複抓到的預報視為同一次發布
+ISSUE_CYCLE_SECONDS = 3 * 3600
+LEAD_BUCKET_HOURS = 3
+
+
+class ErrorStats:
+    """累加誤差統計（O(1) 更新）"""
+
+    __slots__ = ("count", "sum_abs", "sum_err")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_abs = 0.0
+        self.sum_err = 0.0
+
+    def update(self, error: float) -> None:
+        self.count += 1
+        self.sum_abs += abs(error)
+        self.sum_err += error
+
+    @property
+    def mae(self) -> float:
+        return self.sum_abs / self.count if self.count else 0.0
+
+    @property
+    def bias(self) -> float:
+        """平均誤差（預報 - 觀測，正值 = 預報偏高）"""
+        return self.sum_err / self.count if self.count else 0.0
+
+
+def _issue_cycle(issued_at: datetime) -> int:
+    ts = int(issued_at.timestamp())
+    return ts - ts % ISSUE_CYCLE_SECONDS
+
+
+def _lead_bucket(lead: timedelta) -> int:
+    hours = lead.total_seconds() / 3600
+    return max(0, int(round(hours / LEAD_BUCKET_HOURS)) * LEAD_BUCKET_HOURS)
+
+
+class ForecastAccuracyTracker:
+    """預報準確度追蹤器（執行緒安全）"""
+
+    def __init__(self):
+        # city → {target_dt: {issue_cycle: (issued_at, {metric: value})}}
+        self._pending: dict[str, dict[datetime, dict[int, tuple[datetime, dict]]]] = {}
+        # city → {target_dt: (與目標時間的差距, 觀測)}：目標時間前、尚未計分的最接近觀測
+        self._candidates: dict[str, dict[datetime, tuple[timedelta, dict]]] = {}
+        # (city, metric, lead_hours) → ErrorStats
+        self._errors: dict[tuple[str, str, int], ErrorStats] = {}
+        self._lock = threading.Lock()
+
+    def record_forecast(self, city: str, forecast_list: list[dict], issued_at: datetime) -> None:
+        """登記一次預報發布的所有時段（同一更新週期只登記第一次）"""
+        cycle = _issue_cycle(issued_at)
+        with self._lock:
+            pending = self._pending.setdefault(city, {})
+            for item in forecast_list:
+                target = item["datetime"]
+                if target <= issued_at:
+                    continue
+                issues = pending.setdefault(target, {})
+                if cycle not in issues:
+                    values = {m: item[m] for m in ACCURACY_METRICS if item.get(m) is not None}
+                    issues[cycle] = (issued_at, values)
+
+    def record_observation(self, city: str, weather: dict) -> int:
+        """
+        以一筆實際觀測驗證待驗證的預報時段。
+
+        待驗證項目以目標時間為 key，每筆觀測只需檢查約 40 個目標時段。
+
+        Returns:
+            int: 本次計分的預報時段數
+        """
+        observed_at = weather["timestamp"]
+        matched = 0
+        with self._lock:
+            pending = self._pending.get(city)
+            if not pending:
+                return 0
+            candidates = self._candidates.setdefault(city, {})
+            for target in list(pending):
+                distance = abs(target - observed_at)
+                best = candidates.get(target)
+                if distance <= MATCH_WINDOW and (best is None or distance < best[0]):
+                    best = candidates[target] = (distance, weather)
+                if observed_at < target:
+                    continue  # 目標時間前：之後可能還有更接近的觀測
+                # 已到目標時間：之後的觀測只會更遠，以最接近的觀測計分（範圍內都沒有觀測則捨棄）
+                issues = pending.pop(target)
+                candidates.pop(target, None)
+                if best is not None:
+                    matched += self._score(city, target, issues, best[1])
+        return matched
+
+    def _score(self, city: str, target: datetime, issues: dict, weather: dict) -> int:
+        """累加一個目標時段各次發布的誤差（呼叫端須持有 self._lock）"""
+        for issued_at, values in issues.values():
+            lead = _lead_bucket(target - issued_at)
+            for metric, forecast_value in values.items():
+                observed = weather.get(metric)
+                if observed is None:
+                    continue
+                stats = self._errors.get((city, metric, lead))
+                if stats is None:
+                    stats = self._errors[(city, metric, lead)] = ErrorStats()
+                stats.update(forecast_value - observed)
+        return len(issues)
+
+    def summary(self, city: str, metric: str = "temperature") -> list[dict]:
+        """城市某指標依預報提前時數排列的誤差統計"""
+        with self._lock:
+            rows = [
+                {"lead_hours": lead, "count": s.count,
+                 "mae": round(s.mae, 2), "bias": round(s.bias, 2)}
+                for (c, m, lead), s in self._errors.items()
+                if c == city and m == metric
+            ]
+        return sorted(rows, key=lambda r: r["lead_hours"])
+
+
+# ── 全域追蹤器 ──
+
+_tracker: ForecastAccuracyTracker | None = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker() -> ForecastAccuracyTracker:
+    """取得全域追蹤器（首次建立時以歷史資料庫重播近期預報與觀測）"""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                tracker = ForecastAccuracyTracker()
+                _seed_from_history(tracker)
+                _tracker = tracker
+    return _tracker
+
+
+def _seed_from_history(tracker: ForecastAccuracyTracker) -> None:
+    from weather_analysis import history
+
+    try:
+        store = history.get_store()
+        if store is None:
+            return
+        end = datetime.now()
+        start = end - timedelta(days=config.HISTORY_RAW_RETENTION_DAYS)
+        for city in config.TAIWAN_CITIES_COORDS:
+            # 依時間順序重播：預報發布與觀測交錯
+            events = []
+            issuances: dict[datetime, list[dict]] = {}
+            for row in store.query_forecasts(city, start, end + timedelta(days=6)):
+                issuances.setdefault(row["issued_ts"], []).append(
+                    {"datetime": row["target_ts"], **{m: row[m] for m in ACCURACY_METRICS}}
+                )
+            for issued_at, items in issuances.items():
+                events.append((issued_at, 0, items))
+            for row in store.query_observations(city, start, end):
+                row["timestamp"] = row["ts"]
+                events.append((row["ts"], 1, row))
+            for when, kind, payload in sorted(events, key=lambda e: (e[0], e[1])):
+                if kind == 0:
+                    tracker.record_forecast(city, payload, when)
+                else:
+                    tracker.record_observation(city, payload)
+    except Exception:
+        pass
+
+
+def record_forecast(city: str, forecast_list: list[dict], issued_at: datetime) -> None:
+    """登記新預報（issued_at 為發布時間；失敗不影響主流程）"""
+    try:
+        get_tracker().record_forecast(city, forecast_list, issued_at)
+    except Exception:
+        pass
+
+
+def record_observation(city: str, weather: dict) -> None:
+    """以新觀測驗證預報（失敗不影響主流程）"""
+    try:
+        get_tracker().record_observation(city, weather)
+    except Exception:
+        pass
+
+
+def summary(city: str, metric: str = "temperature") -> list[dict]:
+    """城市預報誤差統計（MAE / bias 依提前時數）"""
+    return get_tracker().summary(city, metric)
@@ -0,0 +1,137 @@
+"""
+全國預報風險掃描 - 一次評估所有城市、所有 3 小時預報時段
+
+    timeline = scan_forecasts({city: forecast, ...})
+
+將各城市預報排成 (城市, 時段, 指標) 的 numpy 陣列，以 alerts 的規則表（CompiledRules）
+一次評估所有規則；分級與遲滯與 evaluate_alerts 相同（門檻附近的短暫回落不會拆成兩個事件），
+連續觸發的時段合併為一個事件，輸出依開始時間排序的「即將發生的風險」時間軸。
+
+12 城市 × 40 時段約 1 ms，全國快照每次重建時一併計算，各 session 共用。
+"""
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+import numpy as np
+
+from weather_analysis import metrics
+from weather_analysis.alerts import ALERT_METRICS, AlertSeverity, CompiledRules, compiled_rules
+from weather_analysis.records import ForecastSlot, Record
+
+SLOT_LENGTH = timedelta(hours=3)  # OWM 預報時段長度
+
+# 逐時段的指標取自 ForecastSlot 同名欄位；每日指標（日溫差）在時段層級為 NaN，不觸發
+_SLOT_FIELDS = tuple(m for m in ALERT_METRICS if m in ForecastSlot.__match_args__)
+_SLOT_COLUMNS = [ALERT_METRICS.index(m) for m in _SLOT_FIELDS]
+_slot_values = attrgetter(*_SLOT_FIELDS)
+
+
+@dataclass(frozen=True, slots=True)
+class Hazard(Record):
+    """時間軸上的一個風險事件（同城市、同規則的連續時段）"""
+    city: str
+    severity: AlertSeverity
+    title_key: str
+    message_key: str
+    icon: str
+    metric: str
+    threshold: float
+    peak: float                 # 事件期間最極端的值
+    start: datetime
+    end: datetime               # 最後一個時段結束時間
+    slots: int
+
+
+def forecast_matrix(forecasts: Mapping[str, Sequence[ForecastSlot]], since: datetime | None = None):
+    """
+    將各城市預報排成陣列。
+
+    Returns:
+        (cities, times, values)：values 形狀為 (城市, 時段, len(ALERT_METRICS))，
+        時段為所有城市預報時間的聯集，該城市缺少的時段為 NaN
+    """
+    cities = tuple(city for city, slots in forecasts.items() if slots)
+    times = sorted({
+        slot.datetime for city in cities for slot in forecasts[city]
+        if since is None or slot.datetime >= since
+    })
+    values = np.full((len(cities), len(times), len(ALERT_METRICS)), np.nan)
+    if not times:
+        return cities, tuple(times), values
+
+    index = {dt: i for i, dt in enumerate(times)}
+    ci, ti, rows = [], [], []
+    for c, city in enumerate(cities):
+        slots = [(index.get(slot.datetime), slot) for slot in forecasts[city]]
+        slots = [(t, slot) for t, slot in slots if t is not None]
+        ci.extend([c] * len(slots))
+        ti.extend([t for t, _ in slots])
+        rows.extend([_slot_values(slot) for _, slot in slots])
+    slot_values = np.full((len(cities), len(times), len(_SLOT_FIELDS)), np.nan)
+    slot_values[ci, ti] = rows
+    values[:, :, _SLOT_COLUMNS] = slot_values
+    return cities, tuple(times), values
+
+
+def _peaks(values, compiled: CompiledRules, rs, cs, starts, ends) -> np.ndarray:
+    """各事件期間最極端的值（> 規則取最大、< 規則取最小；事件期間皆已觸發，不含 NaN）"""
+    n_cities, n_times = values.shape[:2]
+    # 依 (規則, 城市, 時段) 攤平、< 規則取負值後，一次以 reduceat 求各區段最大值
+    signed = (values[:, :, compiled.columns].transpose(2, 0, 1) * compiled.signs[:, None, None]).ravel()
+    row = (rs * n_cities + cs) * n_times
+    bounds = np.empty(2 * len(rs), dtype=np.intp)
+    bounds[0::2] = row + starts
+    bounds[1::2] = row + ends
+    peaks = np.maximum.reduceat(np.append(signed, -np.inf), bounds)[0::2]
+    return peaks * compiled.signs[rs]
+
+
+@metrics.timed("hazard_scan")
+def scan_forecasts(forecasts: Mapping[str, Sequence[ForecastSlot]], now: datetime | None = None,
+                   rules: CompiledRules | None = None) -> tuple[Hazard, ...]:
+    """
+    全國預報風險時間軸。
+
+    Args:
+        forecasts: 城市 → parse_forecast 產生的預報
+        now: 目前時間（已結束的時段不列入），預設 datetime.now()
+        rules: 規則表，預設為 alerts.compiled_rules()（與 evaluate_alerts 相同）
+
+    Returns:
+        tuple[Hazard, ...]: 依開始時間排序，同時開始者 DANGER 優先
+    """
+    now = datetime.now() if now is None else now
+    compiled = compiled_rules() if rules is None else rules
+    cities, times, values = forecast_matrix(forecasts, since=now - SLOT_LENGTH)
+    if not times:
+        return ()
+    hits = compiled.evaluate(values)
+
+    # 連續觸發的時段：前後補 False 後差分，+1 為開始、-1 為結束（np.nonzero 依 (規則, 城市, 時段) 排序，兩者一一對應）
+    edges = np.diff(np.pad(hits, ((0, 0), (0, 0), (1, 1))).view(np.int8), axis=2)
+    rs, cs, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[2]
+    if not len(rs):
+        return ()
+    peaks = _peaks(values, compiled, rs, cs, starts, ends)
+
+    hazards = []
+    for r, c, s, e, peak in zip(rs.tolist(), cs.tolist(), starts.tolist(), ends.tolist(), peaks.tolist()):
+        rule = compiled.rules[r]
+        hazards.append(Hazard(
+            city=cities[c],
+            severity=rule.severity,
+            title_key=rule.title_key,
+            message_key=rule.message_key,
+            icon=rule.icon,
+            metric=rule.metric,
+            threshold=rule.threshold,
+            peak=round(peak, 1),
+            start=times[s],
+            end=times[e - 1] + SLOT_LENGTH,
+            slots=e - s,
+        ))
+    hazards.sort(key=lambda h: (h.start, h.severity is not AlertSeverity.DANGER))
+    return tuple(hazards)
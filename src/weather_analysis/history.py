@@ -0,0 +1,559 @@
+"""
+歷史觀測資料庫 - 將每次成功抓取的即時天氣 / 預報 / AQI 寫入本地 SQLite
+
+資料表以 (城市, 日期, 時間) 建立索引，提供依城市與時間區間查詢，
+讓趨勢圖與分析不需再次呼叫上游 API。
+
+壓縮（compact）：超過保留期的原始資料彙整為每小時 / 每日統計
+（min / max / mean / count），原始序列以 delta 編碼封存後刪除。
+"""
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from weather_analysis import config
+
+# 環境部 publishtime 為台灣時間（不帶時區）
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    city         TEXT    NOT NULL,
+    day          TEXT    NOT NULL,
+    ts           INTEGER NOT NULL,
+    temperature  REAL,
+    feels_like   REAL,
+    humidity     REAL,
+    pressure     REAL,
+    wind_speed   REAL,
+    clouds       REAL,
+    weather_main TEXT,
+    PRIMARY KEY (city, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_observations_city_day ON observations (city, day);
+
+CREATE TABLE IF NOT EXISTS forecasts (
+    city        TEXT    NOT NULL,
+    issued_ts   INTEGER NOT NULL,
+    target_ts   INTEGER NOT NULL,
+    day         TEXT    NOT NULL,
+    temperature REAL,
+    humidity    REAL,
+    wind_speed  REAL,
+    pop         REAL,
+    PRIMARY KEY (city, issued_ts, target_ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_forecasts_city_day ON forecasts (city, day);
+
+CREATE TABLE IF NOT EXISTS aqi (
+    site   TEXT    NOT NULL,
+    county TEXT    NOT NULL,
+    day    TEXT    NOT NULL,
+    ts     INTEGER NOT NULL,
+    aqi    REAL,
+    pm25   REAL,
+    pm10   REAL,
+    o3     REAL,
+    PRIMARY KEY (site, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_aqi_county_day ON aqi (county, day);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    source     TEXT    NOT NULL,
+    key        TEXT    NOT NULL,
+    metric     TEXT    NOT NULL,
+    resolution TEXT    NOT NULL,
+    bucket_ts  INTEGER NOT NULL,
+    min        REAL,
+    max        REAL,
+    mean       REAL,
+    count      INTEGER,
+    PRIMARY KEY (source, key, metric, resolution, bucket_ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS archives (
+    source  TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    metric  TEXT NOT NULL,
+    day     TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (source, key, metric, day)
+) WITHOUT ROWID;
+"""
+
+OBSERVATION_FIELDS = (
+    "temperature", "feels_like", "humidity", "pressure", "wind_speed", "clouds", "weather_main",
+)
+FORECAST_FIELDS = ("temperature", "humidity", "wind_speed", "pop")
+AQI_FIELDS = ("aqi", "pm25", "pm10", "o3")
+
+# 可彙整的數值欄位：source → (原始資料表, 分組欄位, 數值欄位)
+ROLLUP_SOURCES = {
+    "observations": ("observations", "city", OBSERVATION_FIELDS[:-1]),
+    "aqi": ("aqi", "site", AQI_FIELDS),
+}
+RESOLUTION_SECONDS = {"hour": 3600}
+
+# delta 編碼的數值精度（保留小數 1 位）
+_ENCODE_SCALE = 10
+
+
+def _epoch(dt: datetime) -> int:
+    return int(dt.timestamp())
+
+
+def _day(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d")
+
+
+def _safe_float(val):
+    try:
+        return float(val)
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_publish_time(value) -> datetime | None:
+    """解析環境部 publishtime（如 "2026/03/01 14:00:00"），回傳帶 UTC+8 時區的 datetime（與主機時區無關）"""
+    if not value:
+        return None
+    for fmt in ("%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(str(value), fmt).replace(tzinfo=TAIPEI_TZ)
+        except ValueError:
+            continue
+    return None
+
+
+# ── delta 編碼 ──
+
+def _write_varint(out: bytearray, value: int) -> None:
+    value = (value << 1) ^ (value >> 63)  # zigzag：讓負數也能短編碼
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varints(data: bytes):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield (value >> 1) ^ -(value & 1)
+        value = shift = 0
+
+
+def encode_series(timestamps: list[int], values: list[float]) -> bytes:
+    """
+    將 (時間, 數值) 序列做 delta + zigzag varint 編碼後 zlib 壓縮。
+
+    數值以 0.1 精度儲存；時間需遞增排列。
+    """
+    out = bytearray()
+    _write_varint(out, len(timestamps))
+    prev_ts = prev_val = 0
+    for ts, val in zip(timestamps, values):
+        scaled = round(val * _ENCODE_SCALE)
+        _write_varint(out, ts - prev_ts)
+        _write_varint(out, scaled - prev_val)
+        prev_ts, prev_val = ts, scaled
+    return zlib.compress(bytes(out))
+
+
+def decode_series(payload: bytes) -> tuple[list[int], list[float]]:
+    """encode_series 的反向操作"""
+    numbers = _read_varints(zlib.decompress(payload))
+    n = next(numbers, 0)
+    timestamps, values = [], []
+    ts = val = 0
+    for _ in range(n):
+        ts += next(numbers)
+        val += next(numbers)
+        timestamps.append(ts)
+        values.append(val / _ENCODE_SCALE)
+    return timestamps, values
+
+
+def _aggregate(points) -> dict:
+    """points: [(ts, value)] → {min, max, mean, count}"""
+    vals = [v for _, v in points]
+    return {
+        "min": min(vals),
+        "max": max(vals),
+        "mean": round(sum(vals) / len(vals), 2),
+        "count": len(vals),
+    }
+
+
+def _bucket_start(ts: int, resolution: str) -> int:
+    """時間 → 所屬 bucket 起點（hour：整點；day：當地午夜）"""
+    if resolution == "day":
+        dt = datetime.fromtimestamp(ts)
+        return _epoch(datetime(dt.year, dt.month, dt.day))
+    step = RESOLUTION_SECONDS[resolution]
+    return ts - ts % step
+
+
+def _rollup_points(points, resolution: str) -> dict[int, dict]:
+    buckets = defaultdict(list)
+    for ts, val in points:
+        buckets[_bucket_start(ts, resolution)].append((ts, val))
+    return {bucket: _aggregate(pts) for bucket, pts in buckets.items()}
+
+
+class ObservationStore:
+    """本地 SQLite 時序資料庫（執行緒安全）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── 寫入 ──
+
+    def record_current(self, city: str, weather: dict) -> None:
+        """寫入一筆即時天氣觀測（同城市同時間重複寫入時忽略）"""
+        ts = weather["timestamp"]
+        row = (city, _day(ts), _epoch(ts)) + tuple(weather.get(f) for f in OBSERVATION_FIELDS)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row,
+            )
+
+    def record_forecast(self, city: str, forecast_list: list[dict], issued_at: datetime) -> None:
+        """寫入一次預報發布（同城市、同發布時間、同目標時段重複寫入時忽略）"""
+        issued_ts = _epoch(issued_at)
+        rows = [
+            (city, issued_ts, _epoch(item["datetime"]), _day(item["datetime"]))
+            + tuple(item.get(f) for f in FORECAST_FIELDS)
+            for item in forecast_list
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+
+    def record_aqi(self, records: list[dict]) -> None:
+        """寫入環境部測站資料（以 sitename + publishtime 去重）"""
+        rows = []
+        for rec in records:
+            published = parse_publish_time(rec.get("publishtime"))
+            if published is None or not rec.get("sitename"):
+                continue
+            ts = _epoch(published)
+            # day 與查詢端一致取主機時區的日期（published 本身帶 UTC+8 時區）
+            rows.append((
+                rec["sitename"], rec.get("county", ""), _day(datetime.fromtimestamp(ts)), ts,
+                _safe_float(rec.get("aqi")),
+                _safe_float(rec.get("pm2.5", rec.get("pm25"))),
+                _safe_float(rec.get("pm10")),
+                _safe_float(rec.get("o3")),
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO aqi VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+
+    # ── 查詢 ──
+
+    def _select(self, sql: str, params: tuple, time_keys: tuple[str, ...]) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            item = dict(row)
+            item.pop("day", None)
+            for key in time_keys:
+                item[key] = datetime.fromtimestamp(item[key])
+            results.append(item)
+        return results
+
+    def query_observations(self, city: str, start: datetime, end: datetime) -> list[dict]:
+        """查詢城市在 [start, end) 區間的即時天氣觀測（依時間排序）"""
+        return self._select(
+            "SELECT * FROM observations WHERE city = ? AND day BETWEEN ? AND ? "
+            "AND ts >= ? AND ts < ? ORDER BY ts",
+            (city, _day(start), _day(end), _epoch(start), _epoch(end)),
+            ("ts",),
+        )
+
+    def query_forecasts(self, city: str, start: datetime, end: datetime) -> list[dict]:
+        """查詢目標時間落在 [start, end) 的所有預報發布"""
+        return self._select(
+            "SELECT * FROM forecasts WHERE city = ? AND day BETWEEN ? AND ? "
+            "AND target_ts >= ? AND target_ts < ? ORDER BY target_ts, issued_ts",
+            (city, _day(start), _day(end), _epoch(start), _epoch(end)),
+            ("issued_ts", "target_ts"),
+        )
+
+    def query_aqi(self, county: str, start: datetime, end: datetime) -> list[dict]:
+        """查詢縣市所有測站在 [start, end) 的 AQI 紀錄"""
+        return self._select(
+            "SELECT * FROM aqi WHERE county = ? AND day BETWEEN ? AND ? "
+            "AND ts >= ? AND ts < ? ORDER BY ts, site",
+            (county, _day(start), _day(end), _epoch(start), _epoch(end)),
+            ("ts",),
+        )
+
+    # ── 彙整 / 壓縮 ──
+
+    def _raw_points(self, source: str, key: str, metric: str, where: str, params: tuple):
+        table, key_col, metrics = ROLLUP_SOURCES[source]
+        if metric not in metrics:
+            raise ValueError(f"unknown metric {metric!r} for {source}")
+        rows = self._conn.execute(
+            f"SELECT ts, {metric} FROM {table} WHERE {key_col} = ? AND {metric} IS NOT NULL "
+            f"AND {where} ORDER BY ts",
+            (key,) + params,
+        ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def query_rollups(
+        self, source: str, key: str, metric: str, resolution: str,
+        start: datetime, end: datetime,
+    ) -> list[dict]:
+        """
+        查詢彙整統計（resolution = "hour" | "day"）。
+
+        已壓縮的區段讀 rollups 表，尚未壓縮的近期原始資料即時彙整後合併。
+        """
+        start_ts, end_ts = _epoch(start), _epoch(end)
+        with self._lock:
+            stored = self._conn.execute(
+                "SELECT bucket_ts, min, max, mean, count FROM rollups "
+                "WHERE source = ? AND key = ? AND metric = ? AND resolution = ? "
+                "AND bucket_ts >= ? AND bucket_ts < ? ORDER BY bucket_ts",
+                (source, key, metric, resolution, _bucket_start(start_ts, resolution), end_ts),
+            ).fetchall()
+            live = self._raw_points(source, key, metric, "ts >= ? AND ts < ?", (start_ts, end_ts))
+
+        buckets = {row[0]: dict(zip(("min", "max", "mean", "count"), row[1:])) for row in stored}
+        buckets.update(_rollup_points(live, resolution))
+        return [
+            {"bucket": datetime.fromtimestamp(bucket), **buckets[bucket]}
+            for bucket in sorted(buckets)
+        ]
+
+    def query_archive(self, source: str, key: str, metric: str, day: str) -> list[tuple]:
+        """讀回已封存（delta 編碼）的原始序列：[(datetime, value)]"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM archives WHERE source = ? AND key = ? AND metric = ? AND day = ?",
+                (source, key, metric, day),
+            ).fetchone()
+        if row is None:
+            return []
+        timestamps, values = decode_series(row[0])
+        return [(datetime.fromtimestamp(ts), val) for ts, val in zip(timestamps, values)]
+
+    def _compact_chunk(self, source: str, key: str, day: str, stats: dict) -> None:
+        """彙整並封存一個 (key, 日期) 的原始資料後刪除（呼叫端持有鎖與交易）"""
+        table, key_col, metrics = ROLLUP_SOURCES[source]
+        rows = self._conn.execute(
+            f"SELECT ts, {', '.join(metrics)} FROM {table} WHERE {key_col} = ? AND day = ? ORDER BY ts",
+            (key, day),
+        ).fetchall()
+        stats["raw_rows"] += len(rows)
+        for i, metric in enumerate(metrics, start=1):
+            points = [(row[0], row[i]) for row in rows if row[i] is not None]
+            if not points:
+                continue
+            for resolution in ("hour", "day"):
+                for bucket, agg in _rollup_points(points, resolution).items():
+                    self._merge_rollup(source, key, metric, resolution, bucket, agg)
+                    stats["rollups"] += 1
+            self._merge_archive(source, key, metric, day, points)
+            stats["archives"] += 1
+        self._conn.execute(f"DELETE FROM {table} WHERE {key_col} = ? AND day = ?", (key, day))
+
+    def _merge_rollup(self, source: str, key: str, metric: str, resolution: str,
+                      bucket: int, agg: dict) -> None:
+        """寫入彙整；同一 bucket 已有彙整（如其他日期分組或較晚補進的資料）時合併統計而非覆寫"""
+        row = self._conn.execute(
+            "SELECT min, max, mean, count FROM rollups "
+            "WHERE source = ? AND key = ? AND metric = ? AND resolution = ? AND bucket_ts = ?",
+            (source, key, metric, resolution, bucket),
+        ).fetchone()
+        if row is not None:
+            count = row[3] + agg["count"]
+            agg = {
+                "min": min(row[0], agg["min"]),
+                "max": max(row[1], agg["max"]),
+                "mean": round((row[2] * row[3] + agg["mean"] * agg["count"]) / count, 2),
+                "count": count,
+            }
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (source, key, metric, resolution, bucket,
+             agg["min"], agg["max"], agg["mean"], agg["count"]),
+        )
+
+    def _merge_archive(self, source: str, key: str, metric: str, day: str, points) -> None:
+        """寫入封存序列；已有封存時依時間合併"""
+        row = self._conn.execute(
+            "SELECT payload FROM archives WHERE source = ? AND key = ? AND metric = ? AND day = ?",
+            (source, key, metric, day),
+        ).fetchone()
+        if row is not None:
+            merged = dict(zip(*decode_series(row[0])))
+            merged.update(points)
+            points = sorted(merged.items())
+        self._conn.execute(
+            "INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?)",
+            (source, key, metric, day,
+             encode_series([p[0] for p in points], [p[1] for p in points])),
+        )
+
+    def compact(
+        self, now: datetime | None = None,
+        raw_days: int | None = None,
+        hourly_days: int | None = None,
+        daily_days: int | None = None,
+    ) -> dict:
+        """
+        壓縮歷史資料：
+
+        1. 早於 raw_days 的原始觀測 → 每小時 / 每日彙整 + delta 編碼封存，刪除原始列
+        2. 早於 hourly_days 的每小時彙整與封存序列 → 刪除
+        3. 早於 daily_days 的每日彙整 → 刪除（0 = 永久保留）
+        4. 早於 raw_days 的預報發布 → 刪除
+
+        原始資料依 (key, 日期) 分批處理，批次之間釋放鎖；彙整依計算出的 bucket 合併既有統計。
+
+        Returns:
+            dict: 各步驟處理的列數
+        """
+        now = now or datetime.now()
+        raw_days = config.HISTORY_RAW_RETENTION_DAYS if raw_days is None else raw_days
+        hourly_days = config.HISTORY_HOURLY_RETENTION_DAYS if hourly_days is None else hourly_days
+        daily_days = config.HISTORY_DAILY_RETENTION_DAYS if daily_days is None else daily_days
+
+        raw_cutoff = _day(now - timedelta(days=raw_days))
+        hourly_cutoff = now - timedelta(days=hourly_days)
+        stats = {"raw_rows": 0, "rollups": 0, "archives": 0}
+
+        for source, (table, key_col, _) in ROLLUP_SOURCES.items():
+            with self._lock:
+                chunks = self._conn.execute(
+                    f"SELECT DISTINCT {key_col}, day FROM {table} WHERE day < ?", (raw_cutoff,),
+                ).fetchall()
+            # 每個 (key, 日期) 一個交易，之間釋放鎖，抓取端的 record_* 不需等整次壓縮完成
+            for key, day in chunks:
+                with self._lock, self._conn:
+                    self._compact_chunk(source, key, day, stats)
+                time.sleep(0)  # 讓等待中的寫入端先取得鎖
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM forecasts WHERE day < ?", (raw_cutoff,),
+            )
+            self._conn.execute(
+                "DELETE FROM rollups WHERE resolution = 'hour' AND bucket_ts < ?",
+                (_epoch(hourly_cutoff),),
+            )
+            self._conn.execute("DELETE FROM archives WHERE day < ?", (_day(hourly_cutoff),))
+            if daily_days:
+                self._conn.execute(
+                    "DELETE FROM rollups WHERE resolution = 'day' AND bucket_ts < ?",
+                    (_epoch(now - timedelta(days=daily_days)),),
+                )
+        return stats
+
+
+# ── 預設資料庫（依 config.HISTORY_DB_PATH，空字串 = 停用） ──
+
+_store: ObservationStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ObservationStore | None:
+    """取得全域資料庫實例（延遲建立；建立時一併啟動背景壓縮）"""
+    global _store
+    if not config.HISTORY_DB_PATH:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = ObservationStore(config.HISTORY_DB_PATH)
+                _start_compaction(store, config.HISTORY_COMPACT_INTERVAL_HOURS * 3600)
+                _store = store
+    return _store
+
+
+def _start_compaction(store: ObservationStore, interval: float) -> bool:
+    """
+    背景執行緒：啟動後壓縮一次，之後每 interval 秒一次（不在抓取 / 快取 miss 的請求路徑上執行）
+
+    Returns:
+        bool: 是否啟動（interval 為 0 時僅手動執行）
+    """
+    if not interval:
+        return False
+
+    def loop():
+        while True:
+            try:
+                store.compact()
+            except Exception:
+                pass
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="history-compact", daemon=True).start()
+    return True
+
+
+def record_current(city: str, weather: dict) -> None:
+    """寫入即時天氣（寫入失敗不影響主流程）"""
+    try:
+        store = get_store()
+        if store is not None:
+            store.record_current(city, weather)
+    except Exception:
+        pass
+
+
+def record_forecast(city: str, forecast_list: list[dict], issued_at: datetime) -> None:
+    """
+    寫入預報發布（寫入失敗不影響主流程）
+
+    issued_at 須由預報內容推算（weather_api.forecast_issued_at），
+    不同語言 / 重複抓到同一次發布時才會寫入同一組主鍵而被忽略。
+    """
+    try:
+        store = get_store()
+        if store is not None:
+            store.record_forecast(city, forecast_list, issued_at)
+    except Exception:
+        pass
+
+
+def record_aqi(records: list[dict]) -> None:
+    """寫入 AQI 測站資料（寫入失敗不影響主流程）"""
+    try:
+        store = get_store()
+        if store is not None:
+            store.record_aqi(records)
+    except Exception:
+        pass
+
+
+if __name__ == "__main__":
+    # 手動執行壓縮：python -m weather_analysis.history
+    _store_instance = get_store()
+    if _store_instance is None:
+        print("HISTORY_DB_PATH is empty, history store is disabled")
+    else:
+        print(_store_instance.compact())
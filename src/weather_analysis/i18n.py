@@ -608,6 +608,43 @@ TRANSLATIONS = {
     },
     "alert.official_title": {"zh_tw": "官方天氣警報", "en": "Official Weather Alert"},
 
+    # ── anomaly alerts (anomaly.py) ──
+    "alert.anomaly_temp_high_title": {"zh_tw": "氣溫異常偏高", "en": "Unusually Warm"},
+    "alert.anomaly_temp_high_msg": {
+        "zh_tw": "氣溫 {v}°C，明顯高於此城市同時段的常態（通常不超過 {t}°C）。",
+        "en": "Temperature {v}°C is well above normal for this city and hour (usually up to {t}°C).",
+    },
+    "alert.anomaly_temp_low_title": {"zh_tw": "氣溫異常偏低", "en": "Unusually Cold"},
+    "alert.anomaly_temp_low_msg": {
+        "zh_tw": "氣溫 {v}°C，明顯低於此城市同時段的常態（通常不低於 {t}°C）。",
+        "en": "Temperature {v}°C is well below normal for this city and hour (usually at least {t}°C).",
+    },
+    "alert.anomaly_humidity_high_title": {"zh_tw": "濕度異常偏高", "en": "Unusually Humid"},
+    "alert.anomaly_humidity_high_msg": {
+        "zh_tw": "濕度 {v}%，明顯高於此城市同時段的常態（通常不超過 {t}%）。",
+        "en": "Humidity {v}% is well above normal for this city and hour (usually up to {t}%).",
+    },
+    "alert.anomaly_humidity_low_title": {"zh_tw": "濕度異常偏低", "en": "Unusually Dry"},
+    "alert.anomaly_humidity_low_msg": {
+        "zh_tw": "濕度 {v}%，明顯低於此城市同時段的常態（通常不低於 {t}%）。",
+        "en": "Humidity {v}% is well below normal for this city and hour (usually at least {t}%).",
+    },
+    "alert.anomaly_wind_high_title": {"zh_tw": "風速異常偏強", "en": "Unusually Windy"},
+    "alert.anomaly_wind_high_msg": {
+        "zh_tw": "風速 {v} m/s，明顯高於此城市同時段的常態（通常不超過 {t} m/s）。",
+        "en": "Wind speed {v} m/s is well above normal for this city and hour (usually up to {t} m/s).",
+    },
+
+    # ── hazard timeline (hazards.py) ──
+    "hazard.banner_title": {"zh_tw": "全國天氣風險", "en": "Upcoming Hazards"},
+    "hazard.banner_summary": {"zh_tw": "{cities} 個城市、{n} 項", "en": "{n} in {cities} cities"},
+    "hazard.more": {"zh_tw": "另有 {n} 項", "en": "+{n} more"},
+    "hazard.timeline_title": {"zh_tw": "未來 5 天風險時間軸", "en": "5-Day Hazard Timeline"},
+    "hazard.col_time": {"zh_tw": "時間", "en": "Time"},
+    "hazard.col_city": {"zh_tw": "城市", "en": "City"},
+    "hazard.col_hazard": {"zh_tw": "風險", "en": "Hazard"},
+    "hazard.col_peak": {"zh_tw": "峰值", "en": "Peak"},
+
     # ── tabs (new v1.2) ──
     "tab.travel": {"zh_tw": "旅遊推薦", "en": "Travel Picks"},
     "tab.compare": {"zh_tw": "城市比較", "en": "City Compare"},
@@ -762,6 +799,20 @@ TRANSLATIONS = {
     "chart.heatmap_rain_title": {"zh_tw": "降雨機率熱力圖（5天 x 24小時）", "en": "Rain Probability Heatmap (5 Days x 24h)"},
     "chart.heatmap_hour": {"zh_tw": "時段", "en": "Hour"},
     "chart.heatmap_date": {"zh_tw": "日期", "en": "Date"},
+    "chart.accuracy_title": {"zh_tw": "溫度預報準確度（依提前時數）", "en": "Temperature Forecast Accuracy by Lead Time"},
+    "chart.accuracy_lead": {"zh_tw": "預報提前時數 (小時)", "en": "Lead Time (hours)"},
+    "chart.accuracy_mae": {"zh_tw": "平均絕對誤差 (MAE)", "en": "Mean Absolute Error"},
+    "chart.accuracy_bias": {"zh_tw": "偏差 (預報 - 實際)", "en": "Bias (forecast - observed)"},
+    "forecast.accuracy_title": {"zh_tw": "預報準確度", "en": "Forecast Accuracy"},
+    "forecast.accuracy_empty": {
+        "zh_tw": "尚無足夠的歷史預報可比對，系統會在之後的觀測到達時自動累積。",
+        "en": "Not enough past forecasts to compare yet — statistics accumulate as new observations arrive.",
+    },
+
+    # ── profiling ──
+    "profile.title": {"zh_tw": "效能剖析（管理者）", "en": "Profiling (admin)"},
+    "profile.elapsed": {"zh_tw": "本次 rerun 耗時 {ms} ms", "en": "This rerun took {ms} ms"},
+    "profile.saved": {"zh_tw": "剖析檔：{path}", "en": "Profile saved: {path}"},
 
     # ── share ──
     "share.title": {"zh_tw": "分享天氣資訊", "en": "Share Weather Info"},
@@ -784,6 +835,16 @@ TRANSLATIONS = {
 }
 
 
+# 外部來源（如警報規則檔）附加的翻譯；以 set_extra_translations 整份替換，不修改內建 TRANSLATIONS
+_extra_translations: dict = {}
+
+
+def set_extra_translations(translations: dict) -> None:
+    """以單一指派替換附加翻譯（優先於內建翻譯；讀取中的 t() 看到的是替換前或替換後的完整內容）"""
+    global _extra_translations
+    _extra_translations = dict(translations)
+
+
 def get_lang() -> str:
     """取得當前語言設定（從 session_state）"""
     try:
@@ -804,7 +865,9 @@ def t(key: str, **kwargs) -> str:
         翻譯後的字串，找不到時回傳 key 本身
     """
     lang = get_lang()
-    entry = TRANSLATIONS.get(key)
+    entry = _extra_translations.get(key)
+    if entry is None:
+        entry = TRANSLATIONS.get(key)
     if entry is None:
         return key
     text = entry.get(lang, entry.get("zh_tw", key))
@@ -0,0 +1,277 @@
+"""
+效能指標模組 - Prometheus 文字格式的計數器 / 直方圖
+
+記錄熱點路徑的耗時與次數：
+- weather_stage_seconds{stage}：各階段耗時（解析、每日摘要、警報評估、AI、圖表、地圖、整次 rerun）
+- weather_upstream_request_seconds{service} / weather_upstream_requests_total{service,status}
+- weather_upstream_throttle_seconds{service}：等待限流額度的時間
+- weather_upstream_hedges_total{service,result}：對沖請求送出 / 勝出 / 因額度不足略過
+- weather_cache_requests_total{cache,result}：快取命中 / 未命中 / 改用過期資料（由 weather_analysis.cache 記錄）
+
+Streamlit 行程可設定 METRICS_PORT（與 METRICS_HOST）啟動獨立的 /metrics 端點；
+JSON API（api_server）則直接提供 /metrics 路由。
+"""
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """單調遞增計數器（依 label 分組）"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in items
+        ]
+
+
+class _HistogramState:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """累積分桶直方圖（依 label 分組）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._states: dict[tuple[str, ...], _HistogramState] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _HistogramState(len(self.buckets) + 1)
+            state.counts[idx] += 1
+            state.sum += value
+            state.count += 1
+
+    def snapshot(self, **labels) -> dict | None:
+        """查詢某組 label 的統計（count / sum）"""
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return None
+            return {"count": state.count, "sum": state.sum}
+
+    def series(self) -> list[tuple[dict, int, float]]:
+        """所有 label 組合的 (labels, count, sum)"""
+        with self._lock:
+            return [
+                (dict(zip(self.labelnames, key)), s.count, s.sum)
+                for key, s in sorted(self._states.items())
+            ]
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(s.counts), s.sum, s.count) for k, s in sorted(self._states.items())]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """抓取時才計算數值的指標（如快取目前的項目數）"""
+
+    def __init__(self, name: str, kind: str, documentation: str,
+                 labelnames: tuple[str, ...], callback):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._callback = callback
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(self._callback().items())
+        ]
+
+
+class Registry:
+    """指標註冊表"""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | CallbackMetric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """輸出 Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "weather_stage_seconds", "Time spent in each pipeline stage.", ("stage",),
+))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "weather_upstream_request_seconds", "Upstream HTTP request latency.", ("service",),
+))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    "weather_upstream_requests_total", "Upstream HTTP requests by status code.", ("service", "status"),
+))
+UPSTREAM_THROTTLE_SECONDS = REGISTRY.register(Histogram(
+    "weather_upstream_throttle_seconds", "Time spent waiting for upstream rate-limit tokens.", ("service",),
+))
+UPSTREAM_HEDGES = REGISTRY.register(Counter(
+    "weather_upstream_hedges_total", "Hedged upstream requests by result.", ("service", "result"),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "weather_cache_requests_total", "Data cache lookups by result.", ("cache", "result"),
+))
+
+
+class timed(ContextDecorator):
+    """
+    記錄階段耗時（可作為 context manager 或 decorator）
+
+        with metrics.timed("daily_summary"):
+            ...
+
+        @metrics.timed("alerts")
+        def evaluate_alerts(...): ...
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._local = threading.local()
+
+    def __enter__(self):
+        starts = getattr(self._local, "starts", None)
+        if starts is None:
+            starts = self._local.starts = []
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._local.starts.pop()
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        return False
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ── 獨立 /metrics 端點（Streamlit 行程用） ──
+
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> bool:
+    """
+    在背景執行緒啟動 /metrics 端點（每個行程只啟動一次；預設只綁定本機）。
+
+    Returns:
+        bool: 本次是否成功啟動（已啟動或埠號被占用時回傳 False）
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return False
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError:
+            return False
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return True
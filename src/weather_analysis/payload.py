@@ -0,0 +1,46 @@
+"""
+上游回應解碼模組 - 原始 bytes 直接解碼並轉為型別化結構
+
+    forecast = payload.decode(response, parse_forecast)
+
+- 有安裝 orjson（`uv sync --extra fast`）時以 orjson 解碼，否則退回標準庫 json；
+  直接解碼 response.content，不經 requests 的編碼偵測與 str 轉換
+- parser（parse_forecast 等）即 schema：只讀取用到的欄位並轉型為 records 型別，
+  其餘欄位不複製；缺欄位 / 型別不符 / JSON 格式錯誤一律拋出 PayloadError
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # 選用相依
+    orjson = None
+
+
+class PayloadError(ValueError):
+    """上游回應不是預期格式（JSON 錯誤、缺欄位或型別不符）"""
+
+
+def loads(raw: bytes | str):
+    """解碼 JSON（orjson 優先）"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def decode(response, parser, *args):
+    """
+    解碼回應並交給 parser 轉換。
+
+    Args:
+        response: requests.Response（或任何有 .content 的物件）
+        parser: parser(data, *args) → 結構化結果
+
+    Raises:
+        PayloadError: 回應格式不符
+    """
+    try:
+        return parser(loads(response.content), *args)
+    except PayloadError:
+        raise
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise PayloadError(f"{getattr(parser, '__name__', parser)}: {e!r}") from e
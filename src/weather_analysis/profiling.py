@@ -0,0 +1,133 @@
+"""
+效能剖析模式 - 以 cProfile 執行單次 rerun，寫出 pstats 檔並在側邊欄顯示熱點函式
+
+啟用方式（二擇一）：
+- 環境變數 PROFILE_MODE=1：所有 session 都剖析（僅限開發 / 測試環境）
+- 管理者網址參數 ?profile=<PROFILE_ADMIN_TOKEN>：僅該 session 剖析
+
+pstats 檔可用 snakeviz / flameprof 轉為火焰圖：
+    uvx snakeviz profiles/20260301-120000-123456-abcd1234.prof
+"""
+import cProfile
+import hmac
+import os
+import pstats
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from weather_analysis import config
+from weather_analysis.i18n import t
+
+_SESSION_FLAG = "_profiling"
+_LAST_PROFILE = "_profile_last"
+
+
+def is_admin_token(value: str, token: str) -> bool:
+    """比對管理者 token（未設定 token 時一律拒絕）"""
+    return bool(token) and bool(value) and hmac.compare_digest(value, token)
+
+
+def session_enabled() -> bool:
+    """目前 session 是否啟用剖析（網址參數通過驗證後於 session 內保持）"""
+    if config.PROFILE_MODE:
+        return True
+    try:
+        if st.session_state.get(_SESSION_FLAG):
+            return True
+        if is_admin_token(st.query_params.get("profile", ""), config.PROFILE_ADMIN_TOKEN):
+            st.session_state[_SESSION_FLAG] = True
+            return True
+    except Exception:
+        pass
+    return False
+
+
+def summarize(stats: pstats.Stats, top_n: int = 15) -> list[dict]:
+    """依自身耗時（tottime）排序的前 N 個函式"""
+    rows = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        location = "~" if filename == "~" else f"{os.path.basename(filename)}:{line}"
+        rows.append({
+            "function": f"{func} ({location})",
+            "ncalls": ncalls,
+            "tottime_ms": round(tottime * 1000, 2),
+            "cumtime_ms": round(cumtime * 1000, 2),
+        })
+    rows.sort(key=lambda r: r["tottime_ms"], reverse=True)
+    return rows[:top_n]
+
+
+def write_profile(profiler: cProfile.Profile, directory: str, label: str, keep: int = 200) -> str:
+    """
+    寫出 pstats 檔，並只保留最新的 keep 個檔案。
+
+    Returns:
+        str: 檔案路徑
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(directory, f"{stamp}-{label}.prof")
+    profiler.dump_stats(path)
+
+    if keep > 0:
+        files = sorted(f for f in os.listdir(directory) if f.endswith(".prof"))
+        for old in files[:-keep]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass
+    return path
+
+
+def _session_label() -> str:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            return "".join(c for c in ctx.session_id if c.isalnum())[:8] or "session"
+    except Exception:
+        pass
+    return "session"
+
+
+def run(main) -> None:
+    """以 cProfile 執行 main()，完成後顯示剖析面板"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同行程已有其他剖析器啟用（Python 3.12+ 同時只允許一個）
+        main()
+        return
+
+    start = time.perf_counter()
+    try:
+        main()
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        try:
+            path = write_profile(profiler, config.PROFILE_DIR, _session_label(), config.PROFILE_KEEP)
+        except OSError:
+            path = None
+        st.session_state[_LAST_PROFILE] = {
+            "path": path,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows": summarize(pstats.Stats(profiler), config.PROFILE_TOP_N),
+        }
+    display_profile_panel()
+
+
+def display_profile_panel() -> None:
+    """側邊欄：最近一次 rerun 的熱點函式"""
+    last = st.session_state.get(_LAST_PROFILE)
+    if not last:
+        return
+    with st.sidebar.expander(f"🔬 {t('profile.title')}", expanded=False):
+        st.caption(t("profile.elapsed", ms=last["elapsed_ms"]))
+        if last["path"]:
+            st.caption(t("profile.saved", path=last["path"]))
+        st.dataframe(last["rows"], hide_index=True, use_container_width=True)
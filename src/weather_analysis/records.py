@@ -0,0 +1,99 @@
+"""
+資料紀錄型別 - 預報時段、每日摘要、AQI 測站的唯讀 __slots__ 紀錄
+
+取代以字串為 key 的 dict：每個城市 40 筆預報、每次 AQI 查詢約 85 個測站，
+slots 紀錄不需每筆一個 dict（記憶體約為 dict 的一半、pickle 也較小），
+圖表與彙整迴圈直接以屬性存取（item.temperature）。
+
+為相容既有以 dict 讀取的程式（item["temperature"]、item.get(...)、dict(item)、json），
+Record 另提供 __getitem__ / get / keys / items；熱點迴圈請用屬性存取（dict 式讀取較慢）。
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+
+
+class Record:
+    """唯讀紀錄基底（子類別以 @dataclass(frozen=True, slots=True) 定義欄位）"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self) -> tuple[str, ...]:
+        return self.__match_args__
+
+    def __iter__(self):
+        return iter(self.__match_args__)
+
+    def __len__(self) -> int:
+        return len(self.__match_args__)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__match_args__
+
+    def values(self) -> list:
+        return [getattr(self, k) for k in self.__match_args__]
+
+    def items(self) -> list[tuple]:
+        return [(k, getattr(self, k)) for k in self.__match_args__]
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__match_args__}
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+@dataclass(frozen=True, slots=True)
+class ForecastSlot(Record):
+    """OWM 3 小時預報的一個時段"""
+    datetime: datetime
+    temperature: float
+    feels_like: float
+    temp_min: float
+    temp_max: float
+    humidity: int
+    weather: str          # 天氣描述（依語言）
+    weather_main: str
+    icon: str
+    wind_speed: float
+    clouds: int
+    pop: float            # 降雨機率（%）
+
+
+@dataclass(frozen=True, slots=True)
+class DailySummary(Record):
+    """每日預報摘要（由 3 小時預報彙整）"""
+    date: date
+    temp_avg: float
+    temp_min: float
+    temp_max: float
+    humidity_avg: float
+    pop_max: float
+    weather: str
+    icon: str
+    wind_speed_avg: float
+
+
+@dataclass(frozen=True, slots=True)
+class AqiStation(Record):
+    """環境部測站的一筆紀錄（數值欄位已轉型，無法解析時為 None）"""
+    sitename: str
+    county: str
+    aqi: int | None
+    pm25: float | None    # 上游欄位名稱為 pm2.5
+    pm10: float | None
+    o3: float | None
+    pollutant: str
+    status: str
+    publishtime: str      # 台灣時間字串（如 "2026/03/01 14:00:00"），比較新舊用
@@ -0,0 +1,227 @@
+"""
+全國快照模組 - 每個更新週期建立一次、各分頁共用的唯讀全國資料
+
+一次更新即查齊 12 城市的即時天氣、預報、每日摘要、警報、UV、AQI 與旅遊推薦，
+並算好 AQI 排行與全國預報風險時間軸；完成後整份替換（單一 dict 指派），讀取端不需加鎖。
+各分頁（目前城市、圖表、比較、AQI、地圖）只做呈現，不再各自查詢 / 彙整。
+
+- 依語言分開保存（天氣描述與城市名稱隨語言不同）
+- 超過 SNAPSHOT_MAX_AGE_SECONDS 即於下次讀取時重建；重建期間其他 session 繼續讀舊版本
+- 有城市未取得資料（背景預取被限流跳過、上游錯誤）時，SNAPSHOT_RETRY_SECONDS 後即重建補齊
+- 更新按鈕呼叫 invalidate() 強制下次讀取重建
+- 觸發重建的使用者目前城市（focus）以一般優先序查詢，其餘城市為背景預取（upstream 限流時讓位）
+- 規則引擎警報以上一版快照成立的警報套用遲滯，門檻附近的數值不會每次重建都觸發 / 解除
+- 重建受觸發者的時間預算（weather_analysis.deadline）限制；預算內未取得的城市改用快取資料或標為缺漏
+"""
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from weather_analysis import anomaly, config, deadline, metrics, upstream
+from weather_analysis.alerts import WeatherAlert, evaluate_alerts, evaluate_onecall_alerts
+from weather_analysis.aqi_api import fetch_aqi_data, get_all_cities_aqi, get_city_aqi
+from weather_analysis.cache import FrozenDict, freeze
+from weather_analysis.hazards import Hazard, scan_forecasts
+from weather_analysis.travel import recommend_best_days
+from weather_analysis.weather_api import WeatherAPI, _cached_onecall, build_daily_summary
+
+# 資料來源（依使用者是否有對應 API Key）
+SOURCE_OWM = "owm"
+SOURCE_ONECALL = "onecall"
+SOURCE_AQI = "aqi"
+
+
+@dataclass(frozen=True)
+class CityView:
+    """單一城市在快照中的資料（皆為唯讀）"""
+    city: str
+    current: FrozenDict | None = None
+    forecast: tuple | None = None
+    daily_summary: tuple | None = None
+    alerts: tuple[WeatherAlert, ...] = ()  # 規則引擎 + 統計異常 + 官方警報
+    uv: FrozenDict | None = None
+    aqi: FrozenDict | None = None
+    travel: tuple = ()
+
+
+@dataclass(frozen=True)
+class NationalSnapshot:
+    """全國快照（版本號遞增，建立後不再修改）"""
+    version: int
+    lang: str
+    sources: frozenset
+    built_at: float                       # time.time()
+    cities: FrozenDict = field(default_factory=FrozenDict)  # city_en → CityView
+    aqi_available: bool = False
+    aqi_ranking: tuple = ()               # get_all_cities_aqi 結果（AQI 降序）
+    hazards: tuple[Hazard, ...] = ()      # 全國預報風險時間軸（scan_forecasts）
+    incomplete: frozenset = frozenset()   # 未取得天氣資料的城市
+    focus: str | None = None              # 建立時以一般優先序查詢的城市
+    _monotonic: float = field(default_factory=time.monotonic, repr=False, compare=False)
+
+    def city(self, city_en: str) -> CityView:
+        return self.cities.get(city_en) or CityView(city=city_en)
+
+    def covers(self, sources) -> bool:
+        """快照是否包含所需的資料來源"""
+        return set(sources) <= self.sources
+
+    def age(self) -> float:
+        return time.monotonic() - self._monotonic
+
+    def is_fresh(self, focus: str | None = None) -> bool:
+        """
+        是否不需重建。使用者目前城市（focus）缺資料、且此快照未曾優先查詢過它時，
+        視為需要重建，避免等到 SNAPSHOT_RETRY_SECONDS 才補上。
+        """
+        if focus in self.incomplete and focus != self.focus:
+            return False
+        max_age = config.SNAPSHOT_RETRY_SECONDS if self.incomplete else config.SNAPSHOT_MAX_AGE_SECONDS
+        return self.age() < max_age
+
+
+def _sources(owm_key, onecall_key, aqi_key) -> frozenset:
+    return frozenset(
+        name for name, key in (
+            (SOURCE_OWM, owm_key), (SOURCE_ONECALL, onecall_key), (SOURCE_AQI, aqi_key),
+        ) if key
+    )
+
+
+def _build_city(city_en: str, api: WeatherAPI | None, onecall_key, aqi_records,
+                focus: str | None, active: frozenset = frozenset()) -> CityView:
+    level = upstream.PRIORITY_USER if focus in (None, city_en) else upstream.PRIORITY_BACKGROUND
+    with upstream.priority(level):
+        return _collect_city(city_en, api, onecall_key, aqi_records, active)
+
+
+def _collect_city(city_en: str, api: WeatherAPI | None, onecall_key, aqi_records,
+                  active: frozenset = frozenset()) -> CityView:
+    coords = config.TAIWAN_CITIES_COORDS[city_en]
+    current = forecast = daily = None
+    if api is not None:
+        current = api.get_current_weather(city_en)
+        forecast = api.get_forecast(city_en)
+        daily = freeze(build_daily_summary(forecast))
+
+    alerts = evaluate_alerts(current, daily, active) + anomaly.current_alerts(city_en)
+    uv = None
+    if onecall_key:
+        onecall = _cached_onecall(onecall_key, coords["lat"], coords["lon"])
+        if onecall is not None:
+            alerts += evaluate_onecall_alerts(onecall["alerts"])
+            uv = onecall["uv"]
+
+    aqi = freeze(get_city_aqi(aqi_records, city_en)) if aqi_records else None
+    return CityView(
+        city=city_en,
+        current=current,
+        forecast=forecast,
+        daily_summary=daily,
+        alerts=tuple(alerts),
+        uv=uv,
+        aqi=aqi,
+        travel=freeze(recommend_best_days(daily)) if daily else (),
+    )
+
+
+_versions = itertools.count(1)
+
+
+def _active_alerts(previous: NationalSnapshot | None, city_en: str) -> frozenset:
+    """上一版快照中該城市成立的警報（規則引擎依此套用遲滯）"""
+    if previous is None:
+        return frozenset()
+    return frozenset(alert.title_key for alert in previous.city(city_en).alerts)
+
+
+@metrics.timed("snapshot_build")
+def build(lang: str, owm_key=None, onecall_key=None, aqi_key=None,
+          focus: str | None = None) -> NationalSnapshot:
+    """
+    查詢並彙整全國資料（各城市並行；上游結果仍經由資料快取）
+
+    Args:
+        lang: 介面語言（zh_tw / en）
+        owm_key / onecall_key / aqi_key: 各來源 API Key，未提供的來源略過
+        focus: 使用者目前城市（其餘城市以背景優先序查詢；None = 全部一般優先序）
+    """
+    aqi_records = fetch_aqi_data(aqi_key) if aqi_key else None
+    api = WeatherAPI(api_key=owm_key, lang=lang) if owm_key else None
+    previous = _snapshots.get(lang)
+
+    with ThreadPoolExecutor(max_workers=config.SNAPSHOT_WORKERS) as pool:
+        # 每個工作複製呼叫端 context（帶上時間預算與優先序）
+        futures = [
+            pool.submit(contextvars.copy_context().run, _build_city, c, api, onecall_key, aqi_records, focus,
+                        _active_alerts(previous, c))
+            for c in config.TAIWAN_CITIES_COORDS
+        ]
+        views = [f.result() for f in futures]
+
+    return NationalSnapshot(
+        version=next(_versions),
+        lang=lang,
+        sources=_sources(owm_key, onecall_key, aqi_key),
+        built_at=time.time(),
+        cities=FrozenDict({v.city: v for v in views}),
+        aqi_available=bool(aqi_records),
+        aqi_ranking=freeze(get_all_cities_aqi(aqi_records)) if aqi_records else (),
+        hazards=scan_forecasts({v.city: v.forecast for v in views if v.forecast}),
+        incomplete=frozenset(
+            v.city for v in views if api is not None and (v.current is None or v.forecast is None)
+        ),
+        focus=focus,
+    )
+
+
+# ── 目前快照（依語言） ──
+
+_snapshots: dict[str, NationalSnapshot] = {}
+_build_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _usable(snap: NationalSnapshot | None, sources: frozenset) -> bool:
+    return snap is not None and snap.covers(sources)
+
+
+def current(lang: str, owm_key=None, onecall_key=None, aqi_key=None,
+            focus: str | None = None) -> NationalSnapshot:
+    """
+    取得目前快照；不存在、過期或缺少所需來源時重建。
+
+    讀取不加鎖；同一語言同時只有一個執行緒重建。已有可用（僅過期）的舊快照時，
+    其他執行緒不等待、直接回傳舊版本；但快照缺少 focus 城市時等待重建結果。
+    等待不超過剩餘時間預算：逾時回傳舊快照，沒有舊快照時以快取資料建立一份（不保存）。
+    """
+    sources = _sources(owm_key, onecall_key, aqi_key)
+    snap = _snapshots.get(lang)
+    if _usable(snap, sources) and snap.is_fresh(focus):
+        return snap
+
+    with _locks_guard:
+        lock = _build_locks.setdefault(lang, threading.Lock())
+    must_wait = not _usable(snap, sources) or focus in snap.incomplete
+    acquired = lock.acquire(timeout=deadline.wait_timeout()) if must_wait else lock.acquire(blocking=False)
+    if not acquired:
+        if snap is not None:
+            return snap  # 其他執行緒重建中，先用舊快照
+        return build(lang, owm_key=owm_key, onecall_key=onecall_key, aqi_key=aqi_key, focus=focus)
+    try:
+        latest = _snapshots.get(lang)
+        if latest is not snap and _usable(latest, sources) and latest.is_fresh(focus):
+            return latest  # 等待期間已由其他執行緒重建
+        new = build(lang, owm_key=owm_key, onecall_key=onecall_key, aqi_key=aqi_key, focus=focus)
+        _snapshots[lang] = new
+        return new
+    finally:
+        lock.release()
+
+
+def invalidate() -> None:
+    """標記所有快照過期（下次讀取時重建）"""
+    _snapshots.clear()
@@ -0,0 +1,503 @@
+"""
+上游 HTTP 呼叫 - 所有外部 API 請求統一經過此處，記錄耗時與狀態碼並限流
+
+限流（token bucket）：
+- 依（主機, API Key）各一個 bucket，速率取自 config.UPSTREAM_RATE_LIMITS（未列出的主機用預設值）
+- 429 回應的 Retry-After 會暫停該 bucket；等待時間不超過 UPSTREAM_MAX_RETRY_AFTER_SECONDS 時自動重試一次
+- 背景預取（with upstream.priority(PRIORITY_BACKGROUND)）保留部分額度給使用者請求
+- 等不到額度時拋出 RateLimited（requests.RequestException 子類，呼叫端照一般網路錯誤處理）
+
+斷路器（每個服務一個）：
+- 連續失敗（逾時、連線錯誤、5xx）達 CIRCUIT_FAILURE_THRESHOLD 次即開路
+- 開路期間立即拋出 CircuitOpen（不等待逾時），資料快取改回傳過期資料
+- CIRCUIT_RESET_SECONDS 後進入半開，只放行一個探測請求：成功即關閉，失敗再開路
+
+對沖請求（get_hedged，僅 config.UPSTREAM_HEDGE_SERVICES 中的服務）：
+- 請求超過該服務近期延遲的 p95 仍未回應時，送出一份重複請求，取先成功者
+- 對沖請求以背景優先序送出（不等待限流額度），且總數不超過一般請求的 HEDGE_MAX_RATIO
+
+時間預算（weather_analysis.deadline）：請求逾時與等待限流額度的時間不超過本次 rerun 的剩餘預算，
+預算用完時不送出請求、拋出 DeadlineExceeded。
+
+限流、斷路器與對沖狀態只在本行程內共用（多個 worker 行程時請依行程數調低速率）。
+"""
+import contextlib
+import contextvars
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+from weather_analysis import config, deadline, metrics
+
+# 服務名稱（metrics label）
+OWM_WEATHER = "owm_weather"
+OWM_FORECAST = "owm_forecast"
+ONECALL = "onecall"
+MOENV_AQI = "moenv_aqi"
+OPENAI = "openai"
+
+# 請求優先序
+PRIORITY_USER = 0        # 使用者正在等待的請求
+PRIORITY_BACKGROUND = 1  # 背景預取（如全國快照中非目前城市）
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=PRIORITY_USER)
+
+
+# get() / get_hedged() 可能拋出的所有例外的基底（逾時、連線錯誤、RateLimited、CircuitOpen、DeadlineExceeded）
+UpstreamError = requests.exceptions.RequestException
+
+
+class RateLimited(requests.exceptions.RequestException):
+    """在允許的等待時間內取不到限流額度"""
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """服務斷路中（近期連續失敗），不送出請求"""
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """設定此區塊內上游請求的優先序"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket（rate_per_minute 為 0 時不限速，但仍遵守 Retry-After）"""
+
+    def __init__(self, rate_per_minute: float, burst: int, reserve: float = 0.0,
+                 clock=time.monotonic):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(burst, 1)
+        self.reserve = reserve * self.capacity  # 背景請求不可動用的額度
+        self.tokens = float(self.capacity)
+        self.blocked_until = 0.0
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, level: int = PRIORITY_USER) -> float:
+        """
+        嘗試取得一個額度。
+
+        Returns:
+            float: 0 表示已取得；否則為建議等待秒數
+        """
+        with self._lock:
+            now = self._clock()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if not self.rate:
+                return 0.0
+            self._refill(now)
+            needed = 1 + (self.reserve if level == PRIORITY_BACKGROUND else 0)
+            if self.tokens >= needed:
+                self.tokens -= 1
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def acquire(self, level: int, timeout: float, sleep=time.sleep) -> float:
+        """
+        等待並取得額度。
+
+        Returns:
+            float: 實際等待秒數
+
+        Raises:
+            RateLimited: timeout 內取不到額度
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(level)
+            if not wait:
+                return waited
+            if waited + wait > timeout:
+                raise RateLimited(f"upstream rate limit: would wait {waited + wait:.1f}s")
+            sleep(wait)
+            waited += wait
+
+    def block(self, seconds: float) -> None:
+        """上游回應 429 時暫停此 bucket（並清空累積額度）"""
+        with self._lock:
+            now = self._clock()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self._updated = now
+
+
+class CircuitBreaker:
+    """連續失敗計數的斷路器（closed → open → half_open → closed）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否放行請求（放行後呼叫端必須回報 record_success / record_failure / release）"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """放行後未實際送出請求（如被限流）：不計成功或失敗"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(service: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(service)
+        if breaker is None:
+            breaker = _breakers[service] = CircuitBreaker(
+                config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS,
+            )
+        return breaker
+
+
+def check_circuit(service: str) -> CircuitBreaker:
+    """
+    斷路中時拋出 CircuitOpen；放行時回傳 breaker，呼叫端須回報結果。
+    （非 requests 的客戶端，如 OpenAI SDK，可直接呼叫）
+    """
+    breaker = get_breaker(service)
+    if not breaker.allow():
+        metrics.UPSTREAM_REQUESTS.inc(service=service, status="circuit_open")
+        raise CircuitOpen(f"{service} circuit open")
+    return breaker
+
+
+_buckets: dict[tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(url: str, api_key: str = "") -> TokenBucket:
+    """取得（或建立）某主機 + API Key 的 bucket"""
+    host = urlsplit(url).netloc
+    key_id = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else ""
+    with _buckets_lock:
+        bucket = _buckets.get((host, key_id))
+        if bucket is None:
+            rate, burst = config.UPSTREAM_RATE_LIMITS.get(host, config.UPSTREAM_DEFAULT_RATE_LIMIT)
+            bucket = _buckets[(host, key_id)] = TokenBucket(
+                rate, burst, reserve=config.UPSTREAM_BACKGROUND_RESERVE,
+            )
+        return bucket
+
+
+class Hedger:
+    """單一服務的對沖狀態：最近的延遲樣本與對沖額度"""
+
+    def __init__(self, window: int, min_samples: int, percentile: float,
+                 min_delay: float, max_delay: float, max_ratio: float, burst: float):
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.credits = 0.0
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def delay(self) -> float | None:
+        """對沖等待時間（近期延遲百分位）；樣本不足時回傳 None（不對沖）"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        value = ordered[min(int(self.percentile * len(ordered)), len(ordered) - 1)]
+        return min(max(value, self.min_delay), self.max_delay)
+
+    def on_request(self) -> None:
+        """每個一般請求累積 max_ratio 的對沖額度"""
+        with self._lock:
+            self.credits = min(self.burst, self.credits + self.max_ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.credits < 1 - 1e-9:  # 容許累加的浮點誤差
+                return False
+            self.credits -= 1
+            return True
+
+
+_hedgers: dict[str, Hedger] = {}
+_hedgers_lock = threading.Lock()
+_hedge_pool: ThreadPoolExecutor | None = None
+_primary_pool: ThreadPoolExecutor | None = None
+
+
+def get_hedger(service: str) -> Hedger:
+    with _hedgers_lock:
+        hedger = _hedgers.get(service)
+        if hedger is None:
+            hedger = _hedgers[service] = Hedger(
+                config.HEDGE_WINDOW, config.HEDGE_MIN_SAMPLES, config.HEDGE_PERCENTILE,
+                config.HEDGE_MIN_DELAY_SECONDS, config.HEDGE_MAX_DELAY_SECONDS,
+                config.HEDGE_MAX_RATIO, config.HEDGE_BURST,
+            )
+        return hedger
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedgers_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(
+                max_workers=config.HEDGE_WORKERS, thread_name_prefix="upstream-hedge",
+            )
+        return _hedge_pool
+
+
+def _get_primary_pool() -> ThreadPoolExecutor:
+    """可對沖請求的原請求專用執行緒池（不與對沖請求搶 worker）"""
+    global _primary_pool
+    with _hedgers_lock:
+        if _primary_pool is None:
+            _primary_pool = ThreadPoolExecutor(
+                max_workers=config.HEDGE_PRIMARY_WORKERS, thread_name_prefix="upstream-primary",
+            )
+        return _primary_pool
+
+
+def reset_limits() -> None:
+    """清除所有 bucket、斷路器與對沖狀態（測試 / 設定變更後使用）"""
+    with _buckets_lock:
+        _buckets.clear()
+    with _breakers_lock:
+        _breakers.clear()
+    with _hedgers_lock:
+        _hedgers.clear()
+
+
+def parse_retry_after(value: str | None, default: float = 1.0) -> float:
+    """解析 Retry-After（秒數或 HTTP 日期），無法解析時回傳 default"""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def throttle(service: str, url: str, api_key: str = "") -> TokenBucket:
+    """
+    依目前優先序取得限流額度（非 requests 的客戶端，如 OpenAI SDK，可直接呼叫）。
+
+    Raises:
+        RateLimited: 等待超過上限
+    """
+    bucket = get_bucket(url, api_key)
+    level = _priority.get()
+    timeout = (config.UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS if level == PRIORITY_BACKGROUND
+               else config.UPSTREAM_MAX_WAIT_SECONDS)
+    left = deadline.remaining()
+    if left is not None:
+        timeout = min(timeout, left)
+    try:
+        waited = bucket.acquire(level, timeout)
+    except RateLimited:
+        metrics.UPSTREAM_REQUESTS.inc(service=service, status="throttled")
+        raise
+    if waited:
+        metrics.UPSTREAM_THROTTLE_SECONDS.observe(waited, service=service)
+    return bucket
+
+
+def observe(service: str, seconds: float, status: str) -> None:
+    """記錄一次上游呼叫（非 requests 的客戶端，如 OpenAI SDK，可直接呼叫）"""
+    metrics.UPSTREAM_SECONDS.observe(seconds, service=service)
+    metrics.UPSTREAM_REQUESTS.inc(service=service, status=status)
+
+
+def _api_key(params) -> str:
+    if not isinstance(params, dict):
+        return ""
+    return str(params.get("appid") or params.get("api_key") or "")
+
+
+def get(service: str, url: str, **kwargs) -> requests.Response:
+    """
+    requests.get 包裝：經斷路器與限流後送出，並記錄 weather_upstream_request_seconds 與
+    weather_upstream_requests_total（status 為 HTTP 狀態碼、timeout、error、throttled、
+    circuit_open 或 deadline）。
+
+    429 時依 Retry-After 暫停該 bucket，等待時間夠短（且在時間預算內）則重試一次；
+    仍為 429 時回傳該回應。逾時縮短為剩餘時間預算。例外照常拋出，由呼叫端處理。
+    """
+    api_key = _api_key(kwargs.get("params"))
+    for attempt in range(2):
+        try:
+            kwargs["timeout"] = deadline.clamp(kwargs.get("timeout"))
+        except deadline.DeadlineExceeded:
+            metrics.UPSTREAM_REQUESTS.inc(service=service, status="deadline")
+            raise
+        breaker = check_circuit(service)
+        try:
+            bucket = throttle(service, url, api_key)
+        except RateLimited:
+            breaker.release()
+            raise
+        start = time.perf_counter()
+        status = "error"
+        try:
+            resp = requests.get(url, **kwargs)
+            status = str(resp.status_code)
+        except requests.exceptions.Timeout:
+            status = "timeout"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            observe(service, elapsed, status)
+            if status in ("timeout", "error") or status.startswith("5"):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+                if service in config.UPSTREAM_HEDGE_SERVICES and status != "429":
+                    get_hedger(service).record(elapsed)
+
+        if resp.status_code != 429:
+            return resp
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        bucket.block(retry_after)
+        left = deadline.remaining()
+        if (attempt or retry_after > config.UPSTREAM_MAX_RETRY_AFTER_SECONDS
+                or (left is not None and retry_after >= left)):
+            return resp
+    return resp
+
+
+def _hedge(service: str, url: str, kwargs: dict) -> requests.Response:
+    with priority(PRIORITY_BACKGROUND):
+        return get(service, url, **kwargs)
+
+
+def _primary(started: threading.Event, service: str, url: str, kwargs: dict) -> requests.Response:
+    started.set()
+    return get(service, url, **kwargs)
+
+
+def _succeeded(future) -> bool:
+    return future.exception() is None and future.result().status_code < 500
+
+
+def get_hedged(service: str, url: str, **kwargs) -> requests.Response:
+    """
+    get() 加上對沖：等待超過近期 p95 延遲仍未回應、且對沖額度足夠時，再送出一份相同請求，
+    回傳先成功（非 5xx）完成者（落後的請求不取消，結果捨棄）。
+    兩者皆失敗時回傳原請求的回應，原請求拋出例外時改回傳對沖請求的回應，皆無回應時拋出原請求的例外。
+
+    原請求在專用執行緒池執行，對沖等待時間從原請求開始執行時起算（不含排隊時間）；
+    對沖執行緒池只用於對沖請求。原請求池滿載、剩餘時間預算內排不到時，改在呼叫端直接送出（不對沖），
+    由 get() 依剩餘預算縮短逾時或拋出 DeadlineExceeded。
+    僅用於冪等的 GET；服務不在 UPSTREAM_HEDGE_SERVICES 或樣本不足時等同 get()。
+    """
+    if service not in config.UPSTREAM_HEDGE_SERVICES:
+        return get(service, url, **kwargs)
+    hedger = get_hedger(service)
+    hedger.on_request()
+    delay = hedger.delay()
+    if delay is None:
+        return get(service, url, **kwargs)
+
+    started = threading.Event()
+    primary = _get_primary_pool().submit(
+        contextvars.copy_context().run, _primary, started, service, url, kwargs,
+    )
+    if not started.wait(deadline.remaining()):
+        # 原請求池滿載且預算內排不到：取消排隊中的原請求，改在呼叫端執行緒直接送出（不對沖）
+        if primary.cancel():
+            return get(service, url, **kwargs)
+        started.wait()
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    if not hedger.try_spend():
+        metrics.UPSTREAM_HEDGES.inc(service=service, result="denied")
+        return primary.result()
+
+    metrics.UPSTREAM_HEDGES.inc(service=service, result="fired")
+    hedge = _get_hedge_pool().submit(contextvars.copy_context().run, _hedge, service, url, kwargs)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=lambda f: f is hedge):  # 同時完成時優先取原請求
+            if _succeeded(future):
+                if future is hedge:
+                    metrics.UPSTREAM_HEDGES.inc(service=service, result="won")
+                return future.result()
+    if primary.exception() is not None and hedge.exception() is None:
+        return hedge.result()
+    return primary.result()
+
+
+def _circuit_states() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return {(service,): int(b.state != CircuitBreaker.CLOSED) for service, b in breakers}
+
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "weather_upstream_circuit_open", "gauge", "1 while the upstream circuit breaker is open or half-open.",
+    ("service",), _circuit_states,
+))
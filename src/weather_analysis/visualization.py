@@ -6,6 +6,7 @@ import plotly.express as px
 import streamlit as st
 from datetime import datetime
 from collections import defaultdict
+from weather_analysis import metrics
 from weather_analysis.i18n import t, weekday_name
 
 
@@ -24,11 +25,12 @@ class WeatherCharts:
     """天氣圖表生成類別"""
 
     @staticmethod
+    @metrics.timed("chart_temperature_chart")
     def create_temperature_chart(forecast_data):
         """創建溫度趨勢圖"""
-        dates = [item['datetime'] for item in forecast_data]
-        temps = [item['temperature'] for item in forecast_data]
-        feels_like = [item['feels_like'] for item in forecast_data]
+        dates = [item.datetime for item in forecast_data]
+        temps = [item.temperature for item in forecast_data]
+        feels_like = [item.feels_like for item in forecast_data]
 
         fig = go.Figure()
 
@@ -62,12 +64,13 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_daily_summary_chart")
     def create_daily_summary_chart(daily_summary):
         """創建每日天氣摘要圖表"""
-        dates = [item['date'].strftime('%m/%d') for item in daily_summary]
-        temp_max = [item['temp_max'] for item in daily_summary]
-        temp_min = [item['temp_min'] for item in daily_summary]
-        temp_avg = [item['temp_avg'] for item in daily_summary]
+        dates = [item.date.strftime('%m/%d') for item in daily_summary]
+        temp_max = [item.temp_max for item in daily_summary]
+        temp_min = [item.temp_min for item in daily_summary]
+        temp_avg = [item.temp_avg for item in daily_summary]
 
         fig = go.Figure()
 
@@ -111,11 +114,12 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_humidity_rain_chart")
     def create_humidity_rain_chart(forecast_data):
         """創建濕度與降雨機率圖表"""
-        dates = [item['datetime'] for item in forecast_data]
-        humidity = [item['humidity'] for item in forecast_data]
-        pop = [item['pop'] for item in forecast_data]
+        dates = [item.datetime for item in forecast_data]
+        humidity = [item.humidity for item in forecast_data]
+        pop = [item.pop for item in forecast_data]
 
         fig = go.Figure()
 
@@ -157,10 +161,11 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_daily_pop_chart")
     def create_daily_pop_chart(daily_summary):
         """創建每日降雨機率圖表"""
-        dates = [item['date'].strftime('%m/%d') for item in daily_summary]
-        pop = [item['pop_max'] for item in daily_summary]
+        dates = [item.date.strftime('%m/%d') for item in daily_summary]
+        pop = [item.pop_max for item in daily_summary]
 
         colors = ['#95E1D3' if p < 30 else '#FFD93D' if p < 60 else '#FF6B6B' for p in pop]
 
@@ -192,10 +197,11 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_wind_speed_chart")
     def create_wind_speed_chart(forecast_data):
         """創建風速圖表"""
-        dates = [item['datetime'] for item in forecast_data]
-        wind_speed = [item['wind_speed'] for item in forecast_data]
+        dates = [item.datetime for item in forecast_data]
+        wind_speed = [item.wind_speed for item in forecast_data]
 
         fig = go.Figure()
 
@@ -222,12 +228,13 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_comparison_temp_chart")
     def create_comparison_temp_chart(city_data_list):
         """
         多城市溫度比較折線圖。
 
         Args:
-            city_data_list: [{"city": str, "daily_summary": list[dict]}, ...]
+            city_data_list: [{"city": str, "daily_summary": list[DailySummary]}, ...]
         """
         colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7']
         fig = go.Figure()
@@ -235,8 +242,8 @@ class WeatherCharts:
         for idx, item in enumerate(city_data_list):
             city_name = item["city"]
             daily = item["daily_summary"]
-            dates = [d["date"].strftime("%m/%d") for d in daily]
-            temps = [d["temp_avg"] for d in daily]
+            dates = [d.date.strftime("%m/%d") for d in daily]
+            temps = [d.temp_avg for d in daily]
             color = colors[idx % len(colors)]
 
             fig.add_trace(go.Scatter(
@@ -260,12 +267,13 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_comparison_rain_chart")
     def create_comparison_rain_chart(city_data_list):
         """
         多城市降雨機率比較柱狀圖 (grouped bar)。
 
         Args:
-            city_data_list: [{"city": str, "daily_summary": list[dict]}, ...]
+            city_data_list: [{"city": str, "daily_summary": list[DailySummary]}, ...]
         """
         colors = ['#6C5CE7', '#00B894', '#FDCB6E', '#E17055', '#74B9FF']
         fig = go.Figure()
@@ -273,8 +281,8 @@ class WeatherCharts:
         for idx, item in enumerate(city_data_list):
             city_name = item["city"]
             daily = item["daily_summary"]
-            dates = [d["date"].strftime("%m/%d") for d in daily]
-            pops = [d["pop_max"] for d in daily]
+            dates = [d.date.strftime("%m/%d") for d in daily]
+            pops = [d.pop_max for d in daily]
             color = colors[idx % len(colors)]
 
             fig.add_trace(go.Bar(
@@ -299,6 +307,7 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_travel_radar_chart")
     def create_travel_radar_chart(scores: dict):
         """
         旅遊評分雷達圖。
@@ -347,24 +356,25 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_temp_heatmap")
     def create_temp_heatmap(forecast_data):
         """
         溫度熱力圖：X=時段, Y=日期, Z=溫度。
 
         Args:
-            forecast_data: 3 小時制預報資料 list[dict]
+            forecast_data: 3 小時制預報資料 list[ForecastSlot]
         """
         grid = defaultdict(dict)
         dates_set = set()
         for item in forecast_data:
-            dt = item["datetime"]
+            dt = item.datetime
             date_label = f"{dt.month:02d}/{dt.day:02d} ({weekday_name(dt.weekday())})"
             hour_label = f"{dt.hour:02d}:00"
-            grid[date_label][hour_label] = item["temperature"]
+            grid[date_label][hour_label] = item.temperature
             dates_set.add(date_label)
 
         dates = sorted(dates_set, key=lambda d: d)
-        hours = sorted({f"{h:02d}:00" for item in forecast_data for h in [item["datetime"].hour]})
+        hours = sorted({f"{h:02d}:00" for item in forecast_data for h in [item.datetime.hour]})
 
         z = []
         for date in dates:
@@ -394,24 +404,25 @@ class WeatherCharts:
         return fig
 
     @staticmethod
+    @metrics.timed("chart_rain_heatmap")
     def create_rain_heatmap(forecast_data):
         """
         降雨機率熱力圖：X=時段, Y=日期, Z=降雨機率%。
 
         Args:
-            forecast_data: 3 小時制預報資料 list[dict]
+            forecast_data: 3 小時制預報資料 list[ForecastSlot]
         """
         grid = defaultdict(dict)
         dates_set = set()
         for item in forecast_data:
-            dt = item["datetime"]
+            dt = item.datetime
             date_label = f"{dt.month:02d}/{dt.day:02d} ({weekday_name(dt.weekday())})"
             hour_label = f"{dt.hour:02d}:00"
-            grid[date_label][hour_label] = item["pop"]
+            grid[date_label][hour_label] = item.pop
             dates_set.add(date_label)
 
         dates = sorted(dates_set, key=lambda d: d)
-        hours = sorted({f"{h:02d}:00" for item in forecast_data for h in [item["datetime"].hour]})
+        hours = sorted({f"{h:02d}:00" for item in forecast_data for h in [item.datetime.hour]})
 
         z = []
         for date in dates:
@@ -441,3 +452,50 @@ class WeatherCharts:
         )
 
         return fig
+
+    @staticmethod
+    @metrics.timed("chart_forecast_accuracy_chart")
+    def create_forecast_accuracy_chart(accuracy_rows):
+        """
+        預報準確度圖：X=預報提前時數, 長條=MAE, 折線=bias。
+
+        Args:
+            accuracy_rows: forecast_accuracy.summary() 回傳的 list[dict]
+        """
+        leads = [row["lead_hours"] for row in accuracy_rows]
+        mae = [row["mae"] for row in accuracy_rows]
+        bias = [row["bias"] for row in accuracy_rows]
+        counts = [row["count"] for row in accuracy_rows]
+
+        fig = go.Figure()
+
+        fig.add_trace(go.Bar(
+            x=leads,
+            y=mae,
+            name=t('chart.accuracy_mae'),
+            marker_color='#74B9FF',
+            customdata=counts,
+            hovertemplate="%{x}h: %{y:.2f}°C (n=%{customdata})<extra></extra>",
+        ))
+
+        fig.add_trace(go.Scatter(
+            x=leads,
+            y=bias,
+            mode='lines+markers',
+            name=t('chart.accuracy_bias'),
+            line=dict(color='#FF6B6B', width=2),
+        ))
+
+        fig.add_hline(y=0, line_width=1, line_dash="dot", line_color="gray")
+
+        fig.update_layout(
+            title=t('chart.accuracy_title'),
+            xaxis_title=t('chart.accuracy_lead'),
+            yaxis_title=t('chart.temp_unit'),
+            hovermode='x unified',
+            template=_get_plotly_template(),
+            height=350,
+        )
+
+        return fig
+
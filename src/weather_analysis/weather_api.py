@@ -4,17 +4,27 @@
 import requests
 import streamlit as st
 from datetime import datetime, timedelta
-from weather_analysis import config
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from weather_analysis import (
+    anomaly, cache, config, deadline, forecast_accuracy, history, metrics, payload, upstream,
+)
 from weather_analysis.i18n import t, get_lang
+from weather_analysis.records import DailySummary, ForecastSlot
 
 
 class WeatherAPI:
     """天氣API整合類別"""
 
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, lang=None):
         self.api_key = api_key or config.OPENWEATHER_API_KEY
         self.base_url = config.OPENWEATHER_BASE_URL
         self.units = config.UNITS
+        self.lang = lang  # None = 依 session 語言（i18n.get_lang）
+
+    def _owm_lang(self):
+        """OWM API 語言參數"""
+        lang = self.lang or get_lang()
+        return "zh_tw" if lang == "zh_tw" else "en"
 
     # ── 驗證 ──
 
@@ -33,7 +43,7 @@ class WeatherAPI:
                 "appid": api_key,
                 "units": config.UNITS,
             }
-            resp = requests.get(url, params=params, timeout=8)
+            resp = upstream.get(upstream.OWM_WEATHER, url, params=params, timeout=8)
             if resp.status_code == 200:
                 return True, t("api.key_valid")
             if resp.status_code == 401:
@@ -48,53 +58,36 @@ class WeatherAPI:
 
     def get_current_weather(self, city):
         """取得即時天氣資料（透過快取層）"""
-        lang = get_lang()
-        owm_lang = "zh_tw" if lang == "zh_tw" else "en"
-        return _cached_current_weather(self.api_key, city, owm_lang)
+        return _cached_current_weather(self.api_key, city, self._owm_lang())
 
     def get_forecast(self, city, days=5):
         """取得天氣預報資料（透過快取層）"""
-        lang = get_lang()
-        owm_lang = "zh_tw" if lang == "zh_tw" else "en"
-        return _cached_forecast(self.api_key, city, owm_lang)
+        return _cached_forecast(self.api_key, city, self._owm_lang())
 
     def get_daily_forecast_summary(self, city, days=5):
         """取得每日天氣預報摘要"""
-        forecast_list = self.get_forecast(city, days)
-        if not forecast_list:
-            return None
+        return build_daily_summary(self.get_forecast(city, days), days)
 
-        # 按日期分組
-        daily_data = {}
-        for item in forecast_list:
-            date = item['datetime'].date()
-            if date not in daily_data:
-                daily_data[date] = []
-            daily_data[date].append(item)
-
-        # 計算每日摘要
-        daily_summary = []
-        for date, items in sorted(daily_data.items())[:days]:
-            temps = [item['temperature'] for item in items]
-            summary = {
-                'date': date,
-                'temp_avg': round(sum(temps) / len(temps), 1),
-                'temp_min': min([item['temp_min'] for item in items]),
-                'temp_max': max([item['temp_max'] for item in items]),
-                'humidity_avg': round(sum([item['humidity'] for item in items]) / len(items), 0),
-                'pop_max': max([item['pop'] for item in items]),
-                'weather': items[len(items)//2]['weather'],
-                'icon': items[len(items)//2]['icon'],
-                'wind_speed_avg': round(sum([item['wind_speed'] for item in items]) / len(items), 1)
-            }
-            daily_summary.append(summary)
+    def cache_remaining(self, city, source):
+        """
+        快取中該城市資料的剩餘 TTL（秒；未快取為 0）
 
-        return daily_summary
+        Args:
+            source: "current_weather" 或 "forecast"
+        """
+        fetcher = {"current_weather": _cached_current_weather, "forecast": _cached_forecast}[source]
+        return fetcher.remaining(self.api_key, city, self._owm_lang())
+
+    def invalidate_city(self, city):
+        """將該城市的即時天氣與預報快取標記為過期（下次讀取時重新取得，失敗時仍可用舊資料）"""
+        lang = self._owm_lang()
+        _cached_current_weather.expire(self.api_key, city, lang)
+        _cached_forecast.expire(self.api_key, city, lang)
 
     @staticmethod
-    def get_city_display_name(city_en):
-        """取得城市顯示名稱（依當前語言）"""
-        lang = get_lang()
+    def get_city_display_name(city_en, lang=None):
+        """取得城市顯示名稱（依指定語言，未指定時依當前 session 語言）"""
+        lang = lang or get_lang()
         entry = config.TAIWAN_CITIES_I18N.get(city_en)
         if entry:
             return entry.get(lang, city_en)
@@ -106,11 +99,161 @@ class WeatherAPI:
         return f"https://openweathermap.org/img/wn/{icon_code}@2x.png"
 
 
-# ── 快取函式（模組層級，供 @st.cache_data 使用） ──
+@metrics.timed("daily_summary")
+def build_daily_summary(forecast_list, days=5):
+    """
+    將 3 小時預報彙整為每日摘要
+
+    Args:
+        forecast_list: parse_forecast 產生的 ForecastSlot list
+
+    Returns:
+        list[DailySummary] | None: 每日摘要，無預報資料時回傳 None
+    """
+    if not forecast_list:
+        return None
+
+    # 按日期分組
+    daily_data = {}
+    for item in forecast_list:
+        daily_data.setdefault(item.datetime.date(), []).append(item)
+
+    # 計算每日摘要
+    daily_summary = []
+    for date, items in sorted(daily_data.items())[:days]:
+        n = len(items)
+        mid = items[n // 2]
+        daily_summary.append(DailySummary(
+            date=date,
+            temp_avg=round(sum(item.temperature for item in items) / n, 1),
+            temp_min=min(item.temp_min for item in items),
+            temp_max=max(item.temp_max for item in items),
+            humidity_avg=round(sum(item.humidity for item in items) / n, 0),
+            pop_max=max(item.pop for item in items),
+            weather=mid.weather,
+            icon=mid.icon,
+            wind_speed_avg=round(sum(item.wind_speed for item in items) / n, 1),
+        ))
+
+    return daily_summary
+
+
+# ── 回應解析（純函式，不含網路呼叫） ──
+
+def parse_current_weather(data: dict, city: str, lang: str | None = None) -> dict:
+    """將 OWM /weather 回應轉為即時天氣 dict（lang 未指定時依當前 session 語言）"""
+    # 取得顯示用城市名稱
+    city_display = WeatherAPI.get_city_display_name(city, lang)
+
+    return {
+        'city': city,
+        'city_tw': city_display,
+        'temperature': round(data['main']['temp'], 1),
+        'feels_like': round(data['main']['feels_like'], 1),
+        'temp_min': round(data['main']['temp_min'], 1),
+        'temp_max': round(data['main']['temp_max'], 1),
+        'humidity': int(data['main']['humidity']),
+        'pressure': int(data['main']['pressure']),
+        'weather': data['weather'][0]['description'],
+        'weather_main': data['weather'][0]['main'],
+        'icon': data['weather'][0]['icon'],
+        'wind_speed': round(data['wind']['speed'], 1),
+        'clouds': int(data['clouds']['all']),
+        'sunrise': datetime.fromtimestamp(data['sys']['sunrise']),
+        'sunset': datetime.fromtimestamp(data['sys']['sunset']),
+        'timestamp': datetime.fromtimestamp(data['dt']),
+    }
+
+
+def parse_forecast(data: dict) -> list[ForecastSlot]:
+    """將 OWM /forecast 回應轉為 3 小時預報 list（只讀取用到的欄位；缺欄位或型別不符時拋出例外）"""
+    slot = ForecastSlot
+    fromtimestamp = datetime.fromtimestamp
+    forecast_list = []
+    for item in data['list']:
+        main = item['main']
+        weather = item['weather'][0]
+        # 依 ForecastSlot 欄位順序以位置參數建立（每城市 40 筆，比關鍵字參數快約 1/4）
+        forecast_list.append(slot(
+            fromtimestamp(item['dt']),               # datetime
+            round(main['temp'], 1),                  # temperature
+            round(main['feels_like'], 1),            # feels_like
+            round(main['temp_min'], 1),              # temp_min
+            round(main['temp_max'], 1),              # temp_max
+            int(main['humidity']),                   # humidity
+            weather['description'],                  # weather
+            weather['main'],                         # weather_main
+            weather['icon'],                         # icon
+            round(item['wind']['speed'], 1),         # wind_speed
+            int(item['clouds']['all']),              # clouds
+            round(item.get('pop', 0) * 100, 0),      # pop
+        ))
+    return forecast_list
+
+
+def parse_onecall_uvi(data: dict) -> dict:
+    """從 One Call 回應取出目前 UV 指數"""
+    current = data.get("current", {})
+    return {
+        "uvi": current.get("uvi", 0),
+        "dt": datetime.fromtimestamp(current.get("dt", 0)),
+    }
+
+
+def parse_onecall_alerts(data: dict) -> tuple[dict, ...]:
+    """從 One Call 回應取出官方警報（event / description 原文）"""
+    return tuple(
+        {"event": item.get("event", ""), "description": item.get("description", "")}
+        for item in data.get("alerts", [])
+    )
 
-@st.cache_data(ttl=config.CACHE_EXPIRE_MINUTES * 60, show_spinner=False)
+
+def parse_onecall(data: dict) -> dict:
+    """One Call 回應 → {"uv": 目前 UV 指數, "alerts": 官方警報}"""
+    return {"uv": parse_onecall_uvi(data), "alerts": parse_onecall_alerts(data)}
+
+
+# ── 快取 TTL（依資料時間推算到下一次預期發布，見 config.CACHE_PUBLISH_SCHEDULES） ──
+
+def _data_ttl(name, published):
+    """published 為資料時間（datetime）"""
+    interval, lag = config.CACHE_PUBLISH_SCHEDULES[name]
+    return cache.publication_ttl(published.timestamp() if published else None, interval, lag)
+
+
+def current_weather_ttl(weather):
+    """即時天氣：觀測時間（dt）＋ 觀測間隔"""
+    return _data_ttl("current_weather", weather.get("timestamp"))
+
+
+def forecast_issued_at(forecast_list):
+    """預報發布時間：第一個時段減一個更新間隔（同一次發布不論語言、何時抓取皆相同）"""
+    if not forecast_list:
+        return None
+    interval, _ = config.CACHE_PUBLISH_SCHEDULES["forecast"]
+    return forecast_list[0].datetime - timedelta(seconds=interval)
+
+
+def forecast_ttl(forecast_list):
+    """3 小時預報：第一個時段過後上游換下一批"""
+    return _data_ttl("forecast", forecast_issued_at(forecast_list))
+
+
+def onecall_ttl(onecall):
+    return _data_ttl("onecall", onecall["uv"].get("dt"))
+
+
+# ── 快取函式（模組層級，weather_analysis.cache 有上限的 LRU / TTL 快取） ──
+
+def _show_error(message):
+    """在頁面顯示錯誤（全國快照的背景執行緒沒有 session，略過）"""
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        st.error(message)
+
+
+@cache.cached("current_weather", ttl=current_weather_ttl, ignore=("api_key",))
 def _cached_current_weather(api_key, city, lang):
-    """快取即時天氣（TTL 15 分鐘）"""
+    """快取即時天氣（下一次觀測預期可取得時到期）"""
     try:
         url = f"{config.OPENWEATHER_BASE_URL}/weather"
         params = {
@@ -119,45 +262,30 @@ def _cached_current_weather(api_key, city, lang):
             'units': config.UNITS,
             'lang': lang,
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = upstream.get_hedged(upstream.OWM_WEATHER, url, params=params, timeout=10)
         if response.status_code == 401:
-            st.error(t("api.key_invalid"))
+            _show_error(t("api.key_invalid"))
             return None
         response.raise_for_status()
-        data = response.json()
-
-        # 取得顯示用城市名稱
-        city_display = WeatherAPI.get_city_display_name(city)
-
-        return {
-            'city': city,
-            'city_tw': city_display,
-            'temperature': round(data['main']['temp'], 1),
-            'feels_like': round(data['main']['feels_like'], 1),
-            'temp_min': round(data['main']['temp_min'], 1),
-            'temp_max': round(data['main']['temp_max'], 1),
-            'humidity': data['main']['humidity'],
-            'pressure': data['main']['pressure'],
-            'weather': data['weather'][0]['description'],
-            'weather_main': data['weather'][0]['main'],
-            'icon': data['weather'][0]['icon'],
-            'wind_speed': round(data['wind']['speed'], 1),
-            'clouds': data['clouds']['all'],
-            'sunrise': datetime.fromtimestamp(data['sys']['sunrise']),
-            'sunset': datetime.fromtimestamp(data['sys']['sunset']),
-            'timestamp': datetime.fromtimestamp(data['dt']),
-        }
+        with metrics.timed("parse_current"):
+            weather = payload.decode(response, parse_current_weather, city, lang)
+        history.record_current(city, weather)
+        anomaly.observe(city, weather)
+        forecast_accuracy.record_observation(city, weather)
+        return weather
+    except deadline.DeadlineExceeded:
+        return None  # 時間預算用完：不顯示錯誤，由快取改回傳過期資料
     except requests.exceptions.RequestException:
-        st.error(t("api.error_request_safe"))
+        _show_error(t("api.error_request_safe"))
         return None
-    except KeyError as e:
-        st.error(t("api.error_parse", e=e))
+    except (KeyError, payload.PayloadError) as e:
+        _show_error(t("api.error_parse", e=e))
         return None
 
 
-@st.cache_data(ttl=config.CACHE_EXPIRE_MINUTES * 60, show_spinner=False)
+@cache.cached("forecast", ttl=forecast_ttl, ignore=("api_key",))
 def _cached_forecast(api_key, city, lang):
-    """快取預報資料（TTL 15 分鐘）"""
+    """快取預報資料（第一個預報時段過後到期）"""
     try:
         url = f"{config.OPENWEATHER_BASE_URL}/forecast"
         params = {
@@ -166,41 +294,36 @@ def _cached_forecast(api_key, city, lang):
             'units': config.UNITS,
             'lang': lang,
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = upstream.get_hedged(upstream.OWM_FORECAST, url, params=params, timeout=10)
         if response.status_code == 401:
-            st.error(t("api.key_invalid"))
+            _show_error(t("api.key_invalid"))
             return None
         response.raise_for_status()
-        data = response.json()
-
-        forecast_list = []
-        for item in data['list']:
-            forecast_list.append({
-                'datetime': datetime.fromtimestamp(item['dt']),
-                'temperature': round(item['main']['temp'], 1),
-                'feels_like': round(item['main']['feels_like'], 1),
-                'temp_min': round(item['main']['temp_min'], 1),
-                'temp_max': round(item['main']['temp_max'], 1),
-                'humidity': item['main']['humidity'],
-                'weather': item['weather'][0]['description'],
-                'weather_main': item['weather'][0]['main'],
-                'icon': item['weather'][0]['icon'],
-                'wind_speed': round(item['wind']['speed'], 1),
-                'clouds': item['clouds']['all'],
-                'pop': round(item.get('pop', 0) * 100, 0),
-            })
+        with metrics.timed("parse_forecast"):
+            forecast_list = payload.decode(response, parse_forecast)
+        if forecast_list:
+            # 快取依語言分開：以預報內容推算的發布時間登記，各語言重複抓到同一次發布只記一次
+            issued_at = forecast_issued_at(forecast_list)
+            history.record_forecast(city, forecast_list, issued_at)
+            forecast_accuracy.record_forecast(city, forecast_list, issued_at)
         return forecast_list
+    except deadline.DeadlineExceeded:
+        return None  # 時間預算用完：不顯示錯誤，由快取改回傳過期資料
     except requests.exceptions.RequestException:
-        st.error(t("api.error_request_safe"))
+        _show_error(t("api.error_request_safe"))
         return None
-    except KeyError as e:
-        st.error(t("api.error_parse", e=e))
+    except (KeyError, payload.PayloadError) as e:
+        _show_error(t("api.error_parse", e=e))
         return None
 
 
-@st.cache_data(ttl=config.CACHE_EXPIRE_MINUTES * 60, show_spinner=False)
-def _cached_onecall_uvi(api_key, lat, lon):
-    """快取 One Call API UVI 資料（TTL 15 分鐘）"""
+@cache.cached("onecall", ttl=onecall_ttl, ignore=("api_key",))
+def _cached_onecall(api_key, lat, lon):
+    """
+    快取 One Call API 回應（下一次更新預期可取得時到期）
+
+    UV 指數與官方警報取自同一次請求：付費 API 每座標每個更新週期只呼叫一次。
+    """
     try:
         url = f"{config.ONECALL_BASE_URL}/onecall"
         params = {
@@ -208,17 +331,12 @@ def _cached_onecall_uvi(api_key, lat, lon):
             "lon": lon,
             "appid": api_key,
             "units": config.UNITS,
-            "exclude": "minutely,alerts",
+            "exclude": "minutely,hourly,daily",
         }
-        resp = requests.get(url, params=params, timeout=10)
+        resp = upstream.get(upstream.ONECALL, url, params=params, timeout=10)
         resp.raise_for_status()
-        data = resp.json()
-
-        current = data.get("current", {})
-        return {
-            "uvi": current.get("uvi", 0),
-            "dt": datetime.fromtimestamp(current.get("dt", 0)),
-        }
+        with metrics.timed("parse_onecall"):
+            return payload.decode(resp, parse_onecall)
     except Exception:
         return None
 
@@ -0,0 +1,84 @@
+"""
+AI 分析測試 - GPT 回應快取（相同提示詞共用、失敗不快取）、時間預算 fallback
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from weather_analysis import ai_analyzer, deadline
+
+
+class FakeClient:
+    def __init__(self, fail=False, timeout=False):
+        self.calls = 0
+        self.fail = fail
+        self.timeout = timeout
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.timeout:
+            raise openai.APITimeoutError(request=None)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        message = SimpleNamespace(content=f"answer:{kwargs['messages'][1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture(autouse=True)
+def _clear_ai_cache():
+    ai_analyzer._cached_completion.clear()
+    yield
+    ai_analyzer._cached_completion.clear()
+
+
+def test_same_prompt_shared_across_clients():
+    first, second = FakeClient(), FakeClient()
+    args = ("gpt-test", "system", "prompt", 0.7, 100)
+    assert ai_analyzer._cached_completion(first, *args) == "answer:prompt"
+    assert ai_analyzer._cached_completion(second, *args) == "answer:prompt"
+    assert (first.calls, second.calls) == (1, 0)
+
+
+def test_failure_not_cached():
+    analyzer = ai_analyzer.WeatherAIAnalyzer(api_key="test")
+    analyzer.client = FakeClient(fail=True)
+    assert "upstream down" in analyzer._call_openai("system", "prompt")
+    analyzer.client = FakeClient()
+    assert analyzer._call_openai("system", "prompt") == "answer:prompt"
+
+
+def test_deadline_falls_back_per_section(monkeypatch):
+    """時間預算用完後的項目改用規則引擎，已完成的 GPT 結果保留"""
+    current = {"city_tw": "台北", "temperature": 25.0, "feels_like": 26.0, "humidity": 60,
+               "wind_speed": 3.0, "weather": "晴"}
+    daily = [{"date": date(2026, 3, d), "temp_min": 20.0, "temp_max": 28.0, "pop_max": 10,
+              "wind_speed_avg": 3.0, "humidity_avg": 60, "weather": "晴"} for d in (1, 2, 3)]
+    calls = []
+
+    def clamp(timeout):
+        calls.append(timeout)
+        if len(calls) > 1:
+            raise ai_analyzer.deadline.DeadlineExceeded("budget used up")
+        return timeout
+
+    monkeypatch.setattr(ai_analyzer.deadline, "clamp", clamp)
+    analyzer = ai_analyzer.WeatherAIAnalyzer(api_key="test")
+    analyzer.client = FakeClient()
+    result = analyzer.comprehensive_analysis(current, daily)
+    fallback = analyzer.get_fallback_analysis(current, daily)
+    assert result["mode"] == "gpt"
+    assert result["weather_analysis"].startswith("answer:")
+    assert result["outfit"] == fallback["outfit"]
+    assert result["health"] == fallback["health"]
+
+
+def test_timeout_under_deadline_falls_back():
+    """逾時被時間預算縮短時，GPT 逾時改用規則引擎而非顯示錯誤"""
+    analyzer = ai_analyzer.WeatherAIAnalyzer(api_key="test")
+    analyzer.client = FakeClient(timeout=True)
+    with deadline.budget(5):
+        assert analyzer._call_openai("system", "prompt") is None
+    assert "timed out" in analyzer._call_openai("system", "prompt")
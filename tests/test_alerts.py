@@ -1,8 +1,17 @@
 """
-警報模組測試 - evaluate_alerts
+警報模組測試 - evaluate_alerts、規則表（編譯、遲滯、規則檔）
 """
+import json
+
+import numpy as np
 import pytest
-from weather_analysis.alerts import evaluate_alerts, AlertSeverity, WeatherAlert
+from weather_analysis import alerts as alerts_module
+from weather_analysis import config, i18n
+from weather_analysis.alerts import (
+    ALERT_METRICS, ALERT_RULES, AlertRule, CompiledRules, evaluate_alerts, load_rules,
+    AlertSeverity, WeatherAlert,
+)
+from weather_analysis.i18n import TRANSLATIONS, t
 
 
 def _make_weather(temp=25, humidity=60, wind=3):
@@ -191,7 +200,163 @@ class TestWeatherAlertDataclass:
         )
         assert alert.severity == AlertSeverity.DANGER
         assert alert.value == 38.5
+        assert alert.event == ""
+
+    def test_frozen(self):
+        alert = WeatherAlert(AlertSeverity.DANGER, "alert.official_title", "", "⚠️", 0, 0,
+                             event="Heavy Rain", description="豪雨特報")
+        assert alert.event == "Heavy Rain"
+        with pytest.raises(AttributeError):
+            alert.event = "x"
+        with pytest.raises((AttributeError, TypeError)):  # slots：無法附加屬性
+            alert._raw_event = "x"
 
     def test_alert_severity_values(self):
         assert AlertSeverity.CAUTION.value == "caution"
         assert AlertSeverity.DANGER.value == "danger"
+
+
+def _series(metric, values):
+    """單一城市、單一指標的時間序列 → evaluate 輸入陣列"""
+    arr = np.full((1, len(values), len(ALERT_METRICS)), np.nan)
+    arr[0, :, ALERT_METRICS.index(metric)] = values
+    return arr
+
+
+class TestRuleTable:
+    """規則表編譯與評估"""
+
+    compiled = CompiledRules(ALERT_RULES)
+
+    def _hits(self, metric, values, key):
+        hits = self.compiled.evaluate(_series(metric, values))
+        return hits[self.compiled.index[key], 0].tolist()
+
+    def test_invalid_rule(self):
+        with pytest.raises(ValueError):
+            AlertRule("dew_point", ">", 20, AlertSeverity.CAUTION, "x", "x_msg", "⚠️")
+        with pytest.raises(ValueError):
+            AlertRule("temperature", "==", 20, AlertSeverity.CAUTION, "x", "x_msg", "⚠️")
+
+    def test_duplicated_title_key(self):
+        with pytest.raises(ValueError, match="alert.rain_title"):
+            CompiledRules(ALERT_RULES + (ALERT_RULES[-2],))
+
+    def test_hysteresis_holds_near_threshold(self):
+        """33.5 → 32.5（仍在解除門檻 32 內）→ 31（解除）→ 32.5（未重新越過 33）"""
+        assert self._hits("temperature", [33.5, 32.5, 31, 32.5, 34], "alert.high_temp_title") == [
+            True, True, False, False, True,
+        ]
+
+    def test_hysteresis_below_rule(self):
+        assert self._hits("temperature", [9, 10.5, 11.5, 10.5], "alert.low_temp_title") == [
+            True, True, False, False,
+        ]
+
+    def test_tier_suppression_with_hysteresis(self):
+        """暴雨成立期間（含遲滯）不輸出降雨注意"""
+        assert self._hits("pop", [70, 90, 75, 65, 40], "alert.rain_title") == [True, False, False, True, False]
+        assert self._hits("pop", [70, 90, 75, 65, 40], "alert.heavy_rain_title") == [
+            False, True, True, False, False,
+        ]
+
+    def test_previous_state_carries_into_series(self):
+        active = np.zeros((len(self.compiled), 1), dtype=bool)
+        active[self.compiled.index["alert.high_temp_title"]] = True
+        hits = self.compiled.evaluate(_series("temperature", [32.5, 31]), active)
+        assert hits[self.compiled.index["alert.high_temp_title"], 0].tolist() == [True, False]
+
+    def test_nan_never_triggers(self):
+        assert not self.compiled.evaluate(_series("temperature", [np.nan] * 3)).any()
+
+    @pytest.mark.parametrize("random_rules", [False, True])
+    def test_point_matches_vectorized(self, random_rules):
+        """evaluate_point 與 evaluate 逐點結果一致（含遲滯狀態、同門檻規則）"""
+        rng = np.random.default_rng(0)
+        compiled = self.compiled
+        if random_rules:
+            compiled = CompiledRules([
+                AlertRule(ALERT_METRICS[i % 6], (">", ">=", "<", "<=")[i % 4], float(rng.integers(3, 8) * 10),
+                          AlertSeverity.CAUTION, f"rule{i}", "msg", "⚠️", float(rng.integers(0, 15)))
+                for i in range(40)
+            ])
+        values = rng.uniform(0, 100, (1, 300, len(ALERT_METRICS)))
+        hits = compiled.evaluate(values)
+        active = set()
+        for t in range(values.shape[1]):
+            point = compiled.evaluate_point(values[0, t].tolist(), active)
+            assert point == np.flatnonzero(hits[:, 0, t]).tolist()
+            active = {compiled.rules[r].title_key for r in point}
+
+    def test_evaluate_alerts_hysteresis(self):
+        assert evaluate_alerts(_make_weather(temp=32.5), _make_daily()) == []
+        alerts = evaluate_alerts(_make_weather(temp=32.5), _make_daily(), active={"alert.high_temp_title"})
+        assert [(a.title_key, a.threshold) for a in alerts] == [("alert.high_temp_title", 33)]
+
+
+class TestRuleFile:
+    """ALERT_RULES_PATH 規則檔"""
+
+    RULE = {
+        "metric": "feels_like", "op": ">=", "threshold": 40, "severity": "danger",
+        "title_key": "alert.test_heat_index_title", "message_key": "alert.test_heat_index_msg",
+        "icon": "🥵", "hysteresis": 1,
+    }
+
+    @pytest.fixture(autouse=True)
+    def _restore(self, monkeypatch):
+        monkeypatch.setattr(alerts_module, "_compiled", None)
+        monkeypatch.setattr(i18n, "_extra_translations", {})
+
+    def _write(self, tmp_path, spec):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(spec), encoding="utf-8")
+        return str(path)
+
+    def test_append_rule(self, tmp_path, monkeypatch):
+        path = self._write(tmp_path, {
+            "rules": [self.RULE],
+            "translations": {"alert.test_heat_index_title": {"zh_tw": "體感高溫", "en": "Heat Index"}},
+        })
+        monkeypatch.setattr(config, "ALERT_RULES_PATH", path)
+        weather = {**_make_weather(temp=35), "feels_like": 40}
+        alerts = evaluate_alerts(weather, _make_daily())
+        assert [a.title_key for a in alerts] == ["alert.high_temp_title", "alert.test_heat_index_title"]
+        assert alerts[-1].severity == AlertSeverity.DANGER and alerts[-1].value == 40
+        assert t("alert.test_heat_index_title") == "體感高溫"
+        assert "alert.test_heat_index_title" not in TRANSLATIONS
+
+    def test_replace_builtin_rules(self, tmp_path):
+        rules, translations = load_rules(self._write(tmp_path, {"replace": True, "rules": [self.RULE]}))
+        assert [r.title_key for r in rules] == ["alert.test_heat_index_title"]
+        assert translations == {}
+
+    def test_load_has_no_side_effects(self, tmp_path):
+        translations = {"alert.test_heat_index_title": {"zh_tw": "體感高溫", "en": "Heat Index"}}
+        rules, loaded = load_rules(self._write(tmp_path, {"rules": [self.RULE], "translations": translations}))
+        assert len(rules) == len(ALERT_RULES) + 1 and loaded == translations
+        assert t("alert.test_heat_index_title") == "alert.test_heat_index_title"
+        assert alerts_module._compiled is None
+
+    def test_invalid_reload_keeps_rules(self, tmp_path, monkeypatch):
+        path = self._write(tmp_path, {
+            "rules": [self.RULE],
+            "translations": {"alert.test_heat_index_title": {"zh_tw": "體感高溫", "en": "Heat Index"}},
+        })
+        monkeypatch.setattr(config, "ALERT_RULES_PATH", path)
+        before = alerts_module.compiled_rules()
+        self._write(tmp_path, {"rules": [{**self.RULE, "severity": "severe"}]})
+        with pytest.raises(ValueError):
+            alerts_module.reload_rules()
+        assert alerts_module.compiled_rules() is before
+        assert t("alert.test_heat_index_title") == "體感高溫"
+
+    @pytest.mark.parametrize("spec", [
+        [],
+        {"rules": [{**RULE, "severity": "severe"}]},
+        {"rules": [{**RULE, "metric": "dew_point"}]},
+        {"rules": [{k: v for k, v in RULE.items() if k != "threshold"}]},
+    ])
+    def test_invalid_file(self, tmp_path, spec):
+        with pytest.raises(ValueError):
+            load_rules(self._write(tmp_path, spec))
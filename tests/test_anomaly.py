@@ -0,0 +1,111 @@
+"""
+異常偵測測試 - RunningStats, P2Quantile, AnomalyDetector
+"""
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+from weather_analysis.alerts import AlertSeverity
+from weather_analysis.anomaly import AnomalyDetector, P2Quantile, RunningStats
+
+
+class TestRunningStats:
+    """Welford 線上統計"""
+
+    def test_matches_statistics_module(self):
+        data = [random.Random(1).gauss(25, 3) for _ in range(200)]
+        stats = RunningStats()
+        for x in data:
+            stats.update(x)
+        assert stats.count == 200
+        assert stats.mean == pytest.approx(statistics.fmean(data))
+        assert stats.variance == pytest.approx(statistics.variance(data))
+
+    def test_single_sample(self):
+        stats = RunningStats()
+        stats.update(10)
+        assert stats.variance == 0.0
+        assert stats.zscore(20) == 0.0
+
+
+class TestP2Quantile:
+    """P² 串流分位數"""
+
+    @pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+    def test_approximates_true_quantile(self, p):
+        rng = random.Random(42)
+        data = [rng.uniform(0, 100) for _ in range(5000)]
+        sketch = P2Quantile(p)
+        for x in data:
+            sketch.update(x)
+        assert sketch.value == pytest.approx(p * 100, abs=3)
+
+    def test_few_samples(self):
+        sketch = P2Quantile(0.5)
+        assert sketch.value is None
+        for x in (3, 1, 2):
+            sketch.update(x)
+        assert sketch.value == 2
+
+
+def _weather(ts, temp=25.0, humidity=70, wind=3.0):
+    return {"timestamp": ts, "temperature": temp, "humidity": humidity, "wind_speed": wind}
+
+
+class TestAnomalyDetector:
+    """AnomalyDetector 異常判斷"""
+
+    BASE = datetime(2026, 3, 1, 14, 0)
+
+    def _warm(self, detector, days=30, city="Taipei"):
+        rng = random.Random(7)
+        for d in range(days):
+            detector.observe(city, _weather(
+                self.BASE + timedelta(days=d),
+                temp=25 + rng.uniform(-1, 1),
+                humidity=70 + rng.uniform(-3, 3),
+                wind=3 + rng.uniform(-0.5, 0.5),
+            ))
+
+    def test_no_alert_before_min_samples(self):
+        detector = AnomalyDetector(z_threshold=3, min_samples=20)
+        self._warm(detector, days=5)
+        assert detector.observe("Taipei", _weather(self.BASE + timedelta(days=10), temp=40)) == []
+
+    def test_unusual_heat_flagged(self):
+        detector = AnomalyDetector(z_threshold=3, min_samples=20)
+        self._warm(detector)
+        alerts = detector.observe("Taipei", _weather(self.BASE + timedelta(days=31), temp=31))
+        assert [a.title_key for a in alerts] == ["alert.anomaly_temp_high_title"]
+        assert alerts[0].severity == AlertSeverity.DANGER
+        assert alerts[0].threshold < 27
+
+    def test_unusual_cold_flagged(self):
+        detector = AnomalyDetector(z_threshold=3, min_samples=20)
+        self._warm(detector)
+        alerts = detector.observe("Taipei", _weather(self.BASE + timedelta(days=31), temp=22.5))
+        assert [a.title_key for a in alerts] == ["alert.anomaly_temp_low_title"]
+
+    def test_calm_wind_not_flagged(self):
+        """風速只有偏強才警報"""
+        detector = AnomalyDetector(z_threshold=3, min_samples=20)
+        self._warm(detector)
+        assert detector.observe("Taipei", _weather(self.BASE + timedelta(days=31), wind=0)) == []
+
+    def test_other_hour_has_separate_stats(self):
+        """其他時段沒有足夠樣本 → 不判斷"""
+        detector = AnomalyDetector(z_threshold=3, min_samples=20)
+        self._warm(detector)
+        night = self.BASE.replace(hour=3) + timedelta(days=31)
+        assert detector.observe("Taipei", _weather(night, temp=15)) == []
+
+    def test_same_timestamp_counted_once(self):
+        detector = AnomalyDetector(z_threshold=3, min_samples=20)
+        self._warm(detector)
+        ts = self.BASE + timedelta(days=31)
+        first = detector.observe("Taipei", _weather(ts, temp=31))
+        again = detector.observe("Taipei", _weather(ts, temp=31))
+        assert again == first
+        assert detector.stats_for("Taipei", "temperature", 14)["count"] == 31
+        assert detector.current_alerts("Taipei") == first
@@ -0,0 +1,159 @@
+"""
+JSON API 測試 - api_server 路由、ETag、錯誤處理
+"""
+import inspect
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("starlette")
+from starlette.testclient import TestClient  # noqa: E402
+
+from weather_analysis import api_server, config  # noqa: E402
+from weather_analysis.records import ForecastSlot  # noqa: E402
+from weather_analysis.weather_api import _cached_current_weather  # noqa: E402
+
+
+def _make_forecast():
+    """建立模擬 3 小時預報（2 天）"""
+    items = []
+    for day in (1, 2):
+        for hour in (9, 12, 15):
+            items.append(ForecastSlot(
+                datetime=datetime(2026, 3, day, hour),
+                temperature=25.0, feels_like=26.0,
+                temp_min=22.0, temp_max=28.0,
+                humidity=60, weather="clear", weather_main="Clear",
+                icon="01d", wind_speed=3.0, clouds=10, pop=10,
+            ))
+    return items
+
+
+def _make_current(city):
+    return {
+        "city": city, "city_tw": city, "temperature": 38.0, "feels_like": 40.0,
+        "humidity": 60, "wind_speed": 3.0, "weather": "clear",
+        "timestamp": datetime(2026, 3, 1, 12),
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, "OPENWEATHER_API_KEY", "test-key")
+    monkeypatch.setattr(config, "AQI_API_KEY", "")
+    monkeypatch.setattr(api_server.WeatherAPI, "get_current_weather",
+                        lambda self, city: _make_current(city))
+    monkeypatch.setattr(api_server.WeatherAPI, "get_forecast",
+                        lambda self, city, days=5: _make_forecast())
+    return TestClient(api_server.app)
+
+
+class TestCityEndpoints:
+    """單城市 / 全城市端點"""
+
+    def test_current(self, client):
+        resp = client.get("/v1/cities/taipei/current")
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["city"] == "Taipei"
+        assert body["current"]["timestamp"] == "2026-03-01T12:00:00"
+
+    def test_city_with_space(self, client):
+        """new-taipei → New Taipei"""
+        assert client.get("/v1/cities/new-taipei/daily").json()["city"] == "New Taipei"
+
+    def test_unknown_city(self, client):
+        assert client.get("/v1/cities/tokyo/current").status_code == 404
+
+    def test_daily_dates_serialized(self, client):
+        daily = client.get("/v1/cities/taipei/daily").json()["daily"]
+        assert [d["date"] for d in daily] == ["2026-03-01", "2026-03-02"]
+
+    def test_alerts_serialized(self, client):
+        """38°C → 極端高溫警報，severity 以字串輸出"""
+        alerts = client.get("/v1/cities/taipei/alerts").json()["alerts"]
+        assert alerts[0]["title_key"] == "alert.extreme_heat_title"
+        assert alerts[0]["severity"] == "danger"
+
+    def test_all_cities(self, client):
+        body = client.get("/v1/travel").json()
+        assert set(body) == set(config.TAIWAN_CITIES_COORDS)
+
+    def test_hazards(self, client, monkeypatch):
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=3)
+        windy = [
+            ForecastSlot(start + timedelta(hours=3 * i), 25.0, 25.0, 24.0, 26.0, 60, "wind", "Clouds",
+                         "03d", 18.0, 40, 10)
+            for i in range(2)
+        ]
+        monkeypatch.setattr(api_server.WeatherAPI, "get_forecast",
+                            lambda self, city, days=5: windy if city == "Keelung" else _make_forecast())
+        hazards = client.get("/v1/hazards").json()["hazards"]
+        assert len(hazards) == 1
+        assert hazards[0]["city"] == "Keelung" and hazards[0]["severity"] == "danger"
+        assert hazards[0]["start"] == start.isoformat(timespec="seconds") and hazards[0]["slots"] == 2
+
+    def test_metrics(self, client):
+        """每日摘要 / 警報評估耗時記入 /metrics"""
+        client.get("/v1/cities/taipei/alerts")
+        resp = client.get("/metrics")
+        assert resp.headers["content-type"].startswith("text/plain")
+        assert 'weather_stage_seconds_count{stage="daily_summary"}' in resp.text
+        assert 'weather_stage_seconds_count{stage="alerts"}' in resp.text
+
+    def test_cache_stats(self, client):
+        caches = client.get("/cache/stats").json()["caches"]
+        assert all({"entries", "bytes", "hit_rate", "evictions"} <= set(c) for c in caches)
+
+
+class TestCaching:
+    """ETag / Cache-Control"""
+
+    def test_cache_headers(self, client, monkeypatch):
+        """max-age 為所用快取項目的剩餘 TTL"""
+        remaining = {"current_weather": 412.7, "forecast": 95.2}
+        monkeypatch.setattr(api_server.WeatherAPI, "cache_remaining",
+                            lambda self, city, source: remaining[source])
+        resp = client.get("/v1/cities/taipei/current")
+        assert resp.headers["etag"]
+        assert "max-age=412" in resp.headers["cache-control"]
+        # 警報同時依賴即時天氣與預報 → 取較早到期者
+        assert "max-age=95" in client.get("/v1/cities/taipei/alerts").headers["cache-control"]
+
+    def test_max_age_from_cached_entry(self, monkeypatch):
+        """實際快取項目：max-age 不超過寫入時的 TTL"""
+        api = api_server.WeatherAPI(api_key="k", lang="en")
+        fetcher = _cached_current_weather
+        fetcher.cache.set(fetcher.key("k", "Taipei", "en"), {"temperature": 25.0}, ttl=300)
+        try:
+            assert 298 <= api.cache_remaining("Taipei", "current_weather") <= 300
+            assert api.cache_remaining("Tainan", "current_weather") == 0
+        finally:
+            fetcher.clear()
+
+    def test_if_none_match_304(self, client):
+        etag = client.get("/v1/cities/taipei/current").headers["etag"]
+        resp = client.get("/v1/cities/taipei/current", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+
+
+class TestThreadpool:
+    """會查詢上游 / SQLite 的路由不在 event loop 上執行"""
+
+    NON_BLOCKING = {"/health", "/metrics", "/cache/stats", "/v1/cities"}
+
+    def test_blocking_routes_are_sync(self):
+        for route in api_server.app.routes:
+            if route.path not in self.NON_BLOCKING:
+                assert not inspect.iscoroutinefunction(route.endpoint), route.path
+
+
+class TestMissingKeys:
+    """未設定 API Key → 503"""
+
+    def test_no_aqi_key(self, client):
+        assert client.get("/v1/aqi").status_code == 503
+
+    def test_no_owm_key(self, client, monkeypatch):
+        monkeypatch.setattr(config, "OPENWEATHER_API_KEY", "")
+        assert client.get("/v1/cities/taipei/current").status_code == 503
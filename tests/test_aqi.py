@@ -1,8 +1,15 @@
 """
 AQI 模組測試 - get_aqi_level, get_city_aqi, get_all_cities_aqi
 """
+import time
+from datetime import datetime, timedelta, timezone
+
 import pytest
-from weather_analysis.aqi_api import get_aqi_level, get_city_aqi, get_all_cities_aqi
+from weather_analysis.aqi_api import (
+    StationIndex, aqi_ttl, get_aqi_level, get_all_cities_aqi, get_city_aqi, latest_publish_time,
+    project_record,
+)
+from weather_analysis.records import AqiStation
 
 
 # ── get_aqi_level ──
@@ -128,3 +135,68 @@ class TestGetAllCitiesAqi:
     def test_empty_data(self):
         """空資料 → 空列表"""
         assert get_all_cities_aqi([]) == []
+
+
+class TestAqiTtl:
+
+    @staticmethod
+    def _publish(ts):
+        return datetime.fromtimestamp(ts, timezone(timedelta(hours=8))).strftime("%Y/%m/%d %H:%M:%S")
+
+    def test_latest_publish_time_is_taiwan_time(self):
+        records = [{"publishtime": "2026/03/01 13:00:00"}, {"publishtime": "2026/03/01 14:00:00"},
+                   {"publishtime": ""}]
+        expected = datetime(2026, 3, 1, 6, tzinfo=timezone.utc).timestamp()
+        assert latest_publish_time(records) == expected
+
+    def test_no_publish_time(self):
+        assert latest_publish_time([{"aqi": "10"}]) is None
+        assert aqi_ttl([{"aqi": "10"}]) == 30 * 60
+
+    def test_expires_after_next_hour(self):
+        hour = time.time() // 3600 * 3600
+        ttl = aqi_ttl([{"publishtime": self._publish(hour)}])
+        expected = hour + 3600 + 20 * 60 - time.time()
+        assert ttl == pytest.approx(max(expected, 120), abs=2)
+
+
+def _station(site, publishtime, aqi="50"):
+    return {"sitename": site, "county": "臺北市", "aqi": aqi, "pm2.5": "10", "pm10": "20", "o3": "30",
+            "pollutant": "", "status": "良好", "publishtime": publishtime,
+            "so2": "1.2", "longitude": "121.5", "latitude": "25.0", "siteid": "1"}
+
+
+class TestIngest:
+
+    def test_projection(self):
+        rec = project_record(_station("中山", "2026/03/01 14:00:00"))
+        assert isinstance(rec, AqiStation)
+        assert rec.aqi == 50 and rec.pm25 == 10.0 and rec.publishtime == "2026/03/01 14:00:00"
+        assert "so2" not in rec and rec.get("pm2.5", rec.get("pm25")) == 10.0
+
+    def test_unparsable_values(self):
+        rec = project_record({"sitename": "中山", "aqi": "", "pm2.5": "ND"})
+        assert rec.aqi is None and rec.pm25 is None and rec.county == ""
+
+    def test_skips_seen_publish_time(self):
+        index = StationIndex()
+        first, new = index.ingest([_station("中山", "2026/03/01 14:00:00"), _station("松山", "2026/03/01 14:00:00")])
+        assert len(new) == 2
+
+        current, new = index.ingest([
+            _station("中山", "2026/03/01 14:00:00", aqi="99"),   # 同一發布時間 → 沿用
+            _station("松山", "2026/03/01 15:00:00", aqi="60"),   # 新資料
+        ])
+        assert current[0] is first[0] and current[0].aqi == 50
+        assert [r["sitename"] for r in new] == ["松山"]
+        assert current[1].aqi == 60
+
+    def test_only_returns_stations_in_payload(self):
+        index = StationIndex()
+        index.ingest([_station("中山", "2026/03/01 14:00:00"), _station("松山", "2026/03/01 14:00:00")])
+        current, new = index.ingest([_station("中山", "2026/03/01 14:00:00")])
+        assert [r["sitename"] for r in current] == ["中山"] and not new
+
+    def test_projected_records_work_with_city_lookup(self):
+        current, _ = StationIndex().ingest([_station("中山", "2026/03/01 14:00:00", aqi="42")])
+        assert get_city_aqi(current, "Taipei")["aqi"] == 42
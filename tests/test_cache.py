@@ -0,0 +1,352 @@
+"""
+資料快取測試 - LRU / TTL / 依發布時間的 TTL / 位元組預算 / 並行 miss 合併 / 統計 / 過期資料 / 唯讀快照 / 暖啟動
+"""
+import copy
+import json
+import pickle
+import threading
+import time
+
+import pytest
+
+from weather_analysis import cache
+from weather_analysis.cache import BoundedCache, FrozenDict, cached, estimate_size, freeze
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBoundedCache:
+
+    def test_hit_and_miss_stats(self):
+        c = BoundedCache("t", ttl=60)
+        assert c.get("a") is None
+        c.set("a", 1)
+        assert c.get("a") == 1
+        stats = c.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=10, clock=clock)
+        c.set("a", 1)
+        clock.now += 9
+        assert c.get("a") == 1
+        clock.now += 2
+        assert c.get("a") is None
+        assert c.stats()["expirations"] == 1
+        assert c.stats()["entries"] == 0
+
+    def test_lru_max_entries(self):
+        c = BoundedCache("t", ttl=60, max_entries=2)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")          # a 變為最近使用
+        c.set("c", 3)       # 淘汰 b
+        assert c.get("b") is None
+        assert c.get("a") == 1 and c.get("c") == 3
+        assert c.stats()["evictions"] == 1
+
+    def test_byte_budget(self):
+        value = "x" * 1000
+        size = estimate_size(value)
+        c = BoundedCache("t", ttl=60, max_entries=100, max_bytes=size * 2)
+        for key in "abc":
+            c.set(key, value)
+        stats = c.stats()
+        assert stats["entries"] == 2
+        assert stats["bytes"] <= size * 2
+        assert c.get("a") is None
+
+    def test_oversized_value_not_cached(self):
+        c = BoundedCache("t", ttl=60, max_bytes=10)
+        c.set("a", "x" * 1000)
+        assert c.stats()["entries"] == 0
+
+    def test_remaining_ttl(self):
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=lambda value: value, clock=clock)
+        c.set("a", 30)
+        clock.now += 12
+        assert c.remaining("a") == 18
+        assert c.remaining("missing") == 0
+        clock.now += 20
+        assert c.remaining("a") == 0
+
+    def test_overwrite_updates_bytes(self):
+        c = BoundedCache("t", ttl=60)
+        c.set("a", "x" * 1000)
+        c.set("a", "y")
+        assert c.stats()["bytes"] == estimate_size("y")
+
+
+class TestPublicationTtl:
+
+    def test_until_next_publication(self):
+        now = time.time()
+        # 5 分鐘前發布、每 10 分鐘一次、延遲 1 分鐘 → 約 6 分鐘後到期
+        assert cache.publication_ttl(now - 300, 600, 60, floor=30) == pytest.approx(360, abs=2)
+
+    def test_just_overdue_uses_floor(self):
+        assert cache.publication_ttl(time.time() - 670, 600, 60, floor=30) == 30
+
+    def test_overdue_backs_off(self):
+        """上游資料時間落後：同一份資料重查間隔依逾期時間拉長，上限為一個發布週期"""
+        now = time.time()
+        published = now - 660 - 100
+        assert cache.publication_ttl(published, 600, 60, floor=30) == pytest.approx(100, abs=2)
+        later = cache.publication_ttl(published - 100, 600, 60, floor=30)
+        assert later == pytest.approx(200, abs=2)
+        assert cache.publication_ttl(now - 3600, 600, 60, floor=30) == 660
+
+    def test_future_timestamp_capped(self):
+        assert cache.publication_ttl(time.time() + 3600, 600, 60, floor=30) == 660
+
+    def test_missing_timestamp_fallback(self):
+        assert cache.publication_ttl(None, 600, 60, fallback=900) == 900
+
+    def test_callable_ttl(self):
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=lambda value: value["ttl"], clock=clock)
+        c.set("short", {"ttl": 5})
+        c.set("long", {"ttl": 50})
+        clock.now += 10
+        assert c.get("short") is None
+        assert c.get("long") == {"ttl": 50}
+
+
+class TestGetOrLoad:
+
+    def test_none_not_cached(self):
+        c = BoundedCache("t", ttl=60)
+        calls = []
+        c.get_or_load("a", lambda: calls.append(1))
+        c.get_or_load("a", lambda: calls.append(1))
+        assert len(calls) == 2
+
+    def test_concurrent_misses_load_once(self):
+        c = BoundedCache("t", ttl=60)
+        calls = []
+        barrier = threading.Barrier(5)
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return "data"
+
+        def worker(results):
+            barrier.wait()
+            results.append(c.get_or_load("k", loader))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(results,)) for _ in range(5)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        assert results == ["data"] * 5
+        assert len(calls) == 1
+        assert c.stats()["misses"] == 1
+
+
+class TestCachedDecorator:
+
+    def test_key_by_arguments(self):
+        calls = []
+
+        @cached("test_decorator", ttl=60)
+        def fetch(city, lang="en"):
+            calls.append((city, lang))
+            return f"{city}-{lang}"
+
+        assert fetch("Taipei") == "Taipei-en"
+        assert fetch("Taipei") == "Taipei-en"
+        assert fetch("Taipei", lang="zh_tw") == "Taipei-zh_tw"
+        assert calls == [("Taipei", "en"), ("Taipei", "zh_tw")]
+        fetch.clear()
+        fetch("Taipei")
+        assert len(calls) == 3
+
+    def test_ignored_params_share_entry(self):
+        """不同 API Key 查同一城市 → 一次上游呼叫、一筆快取"""
+        calls = []
+
+        @cached("test_ignore", ttl=60, ignore=("api_key",))
+        def fetch(api_key, city):
+            calls.append(api_key)
+            return {"city": city}
+
+        assert fetch("key-a", "Taipei") == fetch("key-b", "Taipei")
+        assert calls == ["key-a"]
+        assert fetch.cache.stats()["entries"] == 1
+        fetch("key-b", city="Tainan")
+        assert calls == ["key-a", "key-b"]
+        # remaining 以同一組 key 規則查詢（忽略 api_key）
+        assert 0 < fetch.remaining("key-c", "Taipei") <= 60
+        assert fetch.remaining("key-c", "Keelung") == 0
+
+    def test_positional_and_keyword_same_key(self):
+        calls = []
+
+        @cached("test_bind", ttl=60)
+        def fetch(city, lang="en"):
+            calls.append(city)
+            return city
+
+        fetch("Taipei")
+        fetch(city="Taipei", lang="en")
+        assert calls == ["Taipei"]
+
+
+class TestStale:
+
+    def test_stale_served_when_loader_fails(self):
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=10, stale_ttl=100, clock=clock)
+        assert c.get_or_load("k", lambda: {"v": 1}) == {"v": 1}
+        clock.now += 20
+        assert c.get_or_load("k", lambda: None) == {"v": 1}
+
+        def boom():
+            raise RuntimeError("upstream down")
+
+        assert c.get_or_load("k", boom) == {"v": 1}
+        assert c.stats()["stale_served"] == 2
+        # 上游恢復 → 取得新資料
+        assert c.get_or_load("k", lambda: {"v": 2}) == {"v": 2}
+
+    def test_stale_window_ends(self):
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=10, stale_ttl=100, clock=clock)
+        c.set("k", 1)
+        clock.now += 111
+        assert c.get_or_load("k", lambda: None) is None
+        assert c.stats()["entries"] == 0
+
+    def test_expired_value_not_returned_as_hit(self):
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=10, stale_ttl=100, clock=clock)
+        c.set("k", 1)
+        clock.now += 20
+        assert c.get("k") is None
+        assert c.get_or_load("k", lambda: 2) == 2
+
+    def test_expire_keeps_stale_fallback(self):
+        """更新按鈕：只讓指定項目過期，重新載入失敗時仍回傳舊資料，其他項目不受影響"""
+        clock = FakeClock()
+        c = BoundedCache("t", ttl=10, stale_ttl=100, clock=clock)
+        c.set("k", 1)
+        c.set("other", 2)
+        assert c.expire("k")
+        assert not c.expire("missing")
+        assert c.get("k") is None
+        assert c.get("other") == 2
+        assert c.get_or_load("k", lambda: None) == 1
+        assert c.get_or_load("k", lambda: 3) == 3
+
+    def test_error_without_stale_raises(self):
+        c = BoundedCache("t", ttl=10, stale_ttl=100)
+
+        def boom():
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            c.get_or_load("k", boom)
+
+
+class TestFrozenSnapshots:
+
+    def test_freeze_nested(self):
+        value = freeze({"list": [{"temp": 20}], "main": {"humidity": 70}})
+        assert isinstance(value, FrozenDict)
+        assert value["list"] == ({"temp": 20},)
+        assert isinstance(value["list"][0], FrozenDict)
+        assert isinstance(value["main"], FrozenDict)
+
+    def test_mutation_raises(self):
+        value = freeze({"main": {"temp": 20}})
+        with pytest.raises(TypeError):
+            value["main"]["temp"] = 30
+        with pytest.raises(TypeError):
+            value.update({"x": 1})
+        with pytest.raises(TypeError):
+            del value["main"]
+        with pytest.raises(TypeError):
+            value.pop("main")
+
+    def test_copy_is_mutable(self):
+        value = freeze({"temp": 20})
+        mutable = value.copy()
+        mutable["temp"] = 30
+        assert value["temp"] == 20
+        assert copy.deepcopy(value) is value
+
+    def test_json_and_pickle_compatible(self):
+        value = freeze({"records": [{"aqi": "42"}]})
+        assert json.loads(json.dumps(value)) == {"records": [{"aqi": "42"}]}
+        restored = pickle.loads(pickle.dumps(value))
+        assert restored == value and isinstance(restored, FrozenDict)
+
+    def test_hits_share_same_object(self):
+        """命中直接回傳同一個物件（不複製），loader 呼叫端拿到的也是快照"""
+
+        @cached("test_frozen", ttl=60)
+        def fetch(city):
+            return {"city": city, "list": [1, 2]}
+
+        first = fetch("Taipei")
+        assert isinstance(first, FrozenDict)
+        assert fetch("Taipei") is first
+
+
+class TestCheckpoint:
+
+    def test_round_trip_keeps_remaining_ttl(self, tmp_path):
+        c = cache.get_cache("test_ckpt", ttl=600)
+        c.set(("Taipei",), {"temp": 20}, ttl=300)
+        c.set(("Tainan",), {"temp": 25}, ttl=-1)  # 已過期 → 不寫出
+        path = str(tmp_path / "cache.pickle")
+        assert cache.checkpoint(path) >= 1
+
+        c.clear()
+        assert cache.restore(path) >= 1
+        assert c.get(("Taipei",)) == {"temp": 20}
+        assert c.get(("Tainan",)) is None
+        remaining = c.export()[0][2]
+        assert 290 < remaining <= 300
+
+    def test_expired_while_down(self, tmp_path, monkeypatch):
+        c = cache.get_cache("test_ckpt_expired", ttl=60)
+        c.set("k", "v")
+        path = str(tmp_path / "cache.pickle")
+        cache.checkpoint(path)
+        c.clear()
+        real_time = time.time
+        monkeypatch.setattr(cache.time, "time", lambda: real_time() + 120)
+        cache.restore(path)
+        assert c.get("k") is None
+
+    def test_unregistered_cache_loaded_on_creation(self, tmp_path):
+        """快取檔先載入、模組後匯入：建立快取時套用"""
+        c = cache.get_cache("test_ckpt_late", ttl=60)
+        c.set("k", "v")
+        path = str(tmp_path / "cache.pickle")
+        cache.checkpoint(path)
+        with cache._registry_lock:
+            del cache._caches["test_ckpt_late"]
+        cache.restore(path)
+        assert cache.get_cache("test_ckpt_late", ttl=60).get("k") == "v"
+
+    def test_missing_or_corrupt_file(self, tmp_path):
+        assert cache.restore(str(tmp_path / "missing.pickle")) == 0
+        bad = tmp_path / "bad.pickle"
+        bad.write_bytes(b"not a pickle")
+        assert cache.restore(str(bad)) == 0
+        wrong_version = tmp_path / "old.pickle"
+        wrong_version.write_bytes(pickle.dumps({"version": 0, "caches": {}}))
+        assert cache.restore(str(wrong_version)) == 0
@@ -0,0 +1,111 @@
+"""
+時間預算測試 - 巢狀預算、逾時縮短、用完時不送出上游請求、快取等待改回傳過期資料
+"""
+import threading
+import time
+
+import pytest
+
+from weather_analysis import config, deadline, upstream
+from weather_analysis.cache import BoundedCache
+
+
+class TestBudget:
+
+    def test_unlimited_by_default(self):
+        assert deadline.remaining() is None
+        assert deadline.clamp(10) == 10
+        assert deadline.wait_timeout() == -1
+
+    def test_clamps_timeout(self):
+        with deadline.budget(2):
+            assert 1.5 < deadline.clamp(10) <= 2
+            assert deadline.clamp(1) == 1
+        assert deadline.remaining() is None
+
+    def test_nested_takes_earlier(self):
+        with deadline.budget(1):
+            with deadline.budget(60):
+                assert deadline.remaining() <= 1
+            with deadline.budget(0.5):
+                assert deadline.remaining() <= 0.5
+
+    def test_replace_ignores_outer(self):
+        with deadline.budget(0.5):
+            with deadline.budget(60, replace=True):
+                assert deadline.remaining() > 30
+            assert deadline.remaining() <= 0.5
+
+    def test_zero_means_unlimited(self):
+        with deadline.budget(0):
+            assert deadline.remaining() is None
+
+    def test_exhausted_raises(self):
+        with deadline.budget(config.DEADLINE_MIN_REQUEST_SECONDS / 2):
+            with pytest.raises(deadline.DeadlineExceeded):
+                deadline.clamp(10)
+
+    def test_decorator(self):
+        @deadline.budget(5)
+        def inner():
+            return deadline.remaining()
+
+        assert 0 < inner() <= 5
+        assert deadline.remaining() is None
+
+
+class TestUpstream:
+
+    @pytest.fixture(autouse=True)
+    def _fresh(self):
+        upstream.reset_limits()
+        yield
+        upstream.reset_limits()
+
+    def test_timeout_shortened(self, monkeypatch):
+        seen = {}
+
+        def fake_get(url, **kw):
+            seen.update(kw)
+            return type("R", (), {"status_code": 200, "headers": {}})()
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        with deadline.budget(2):
+            upstream.get(upstream.OWM_WEATHER, "http://owm.test/weather", timeout=10)
+        assert seen["timeout"] <= 2
+
+    def test_exhausted_budget_skips_request(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(upstream.requests, "get", lambda url, **kw: calls.append(url))
+        with deadline.budget(0.01):
+            with pytest.raises(deadline.DeadlineExceeded):
+                upstream.get(upstream.OWM_WEATHER, "http://owm.test/weather", timeout=10)
+        assert not calls
+
+
+class TestCacheWait:
+
+    def test_waiter_serves_stale_within_budget(self):
+        clock_now = [0.0]
+        c = BoundedCache("t", ttl=10, stale_ttl=100, clock=lambda: clock_now[0])
+        c.set("k", "old")
+        clock_now[0] = 20
+        started, release = threading.Event(), threading.Event()
+
+        def slow_loader():
+            started.set()
+            release.wait(5)
+            return "new"
+
+        loader_thread = threading.Thread(target=c.get_or_load, args=("k", slow_loader))
+        loader_thread.start()
+        started.wait(5)
+        try:
+            start = time.monotonic()
+            with deadline.budget(0.2):
+                assert c.get_or_load("k", lambda: "unused") == "old"
+            assert time.monotonic() - start < 1
+        finally:
+            release.set()
+            loader_thread.join()
+        assert c.get("k") == "new"
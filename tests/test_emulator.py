@@ -0,0 +1,109 @@
+"""
+上游模擬器測試 - 回應格式與既有解析器相容、錯誤 / 限流注入
+"""
+import pytest
+
+pytest.importorskip("starlette")
+from starlette.testclient import TestClient  # noqa: E402
+
+from weather_analysis import payload  # noqa: E402
+from weather_analysis.aqi_api import AQI_FIELDS, parse_aqi_payload  # noqa: E402
+from weather_analysis.emulator import INVALID_KEY, EmulatorSettings, create_app  # noqa: E402
+from weather_analysis.weather_api import parse_current_weather, parse_forecast, parse_onecall_uvi  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return TestClient(create_app(EmulatorSettings(latency_ms=0, jitter_ms=0)))
+
+
+class TestOpenWeatherMap:
+
+    def test_current_weather_parses(self, client):
+        resp = client.get("/data/2.5/weather", params={"q": "Taipei,TW", "appid": "k", "lang": "zh_tw"})
+        assert resp.status_code == 200
+        weather = parse_current_weather(resp.json(), "Taipei")
+        assert weather["city"] == "Taipei"
+        assert 10 < weather["temperature"] < 40
+
+    def test_deterministic_within_window(self, client):
+        params = {"q": "Tainan,TW", "appid": "k"}
+        a = client.get("/data/2.5/weather", params=params).json()
+        b = client.get("/data/2.5/weather", params=params).json()
+        assert a["main"] == b["main"]
+
+    def test_forecast_parses(self, client):
+        resp = client.get("/data/2.5/forecast", params={"q": "Kaohsiung,TW", "appid": "k"})
+        items = payload.decode(resp, parse_forecast)
+        assert len(items) == 40
+        assert items[1]["datetime"] > items[0]["datetime"]
+
+    def test_onecall_uvi(self, client):
+        resp = client.get("/data/3.0/onecall", params={"lat": 25.03, "lon": 121.56, "appid": "k"})
+        assert parse_onecall_uvi(resp.json()) is not None
+
+    def test_unknown_city(self, client):
+        resp = client.get("/data/2.5/weather", params={"q": "Atlantis", "appid": "k"})
+        assert resp.status_code == 404
+
+    def test_invalid_key(self, client):
+        resp = client.get("/data/2.5/weather", params={"q": "Taipei", "appid": INVALID_KEY})
+        assert resp.status_code == 401
+
+
+class TestAqi:
+
+    def test_records_cover_all_counties(self, client):
+        resp = client.get("/api/v2/aqx_p_432", params={"api_key": "k", "limit": 1000})
+        records = parse_aqi_payload(resp.json())
+        assert len({r["county"] for r in records}) == 12
+
+    def test_fields_projection(self, client):
+        resp = client.get("/api/v2/aqx_p_432", params={"api_key": "k", "fields": ",".join(AQI_FIELDS)})
+        records = parse_aqi_payload(resp.json())
+        assert records and all(set(r) == set(AQI_FIELDS) for r in records)
+
+    def test_invalid_key_returns_text(self, client):
+        resp = client.get("/api/v2/aqx_p_432", params={"api_key": INVALID_KEY})
+        assert resp.status_code == 200
+        with pytest.raises(ValueError):
+            resp.json()
+
+
+class TestOpenAI:
+
+    def test_chat_completion_shape(self, client):
+        resp = client.post(
+            "/v1/chat/completions",
+            headers={"Authorization": "Bearer k"},
+            json={"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "天氣如何"}]},
+        )
+        body = resp.json()
+        assert body["choices"][0]["message"]["role"] == "assistant"
+        assert body["choices"][0]["message"]["content"]
+
+    def test_models_invalid_key(self, client):
+        resp = client.get("/v1/models", headers={"Authorization": f"Bearer {INVALID_KEY}"})
+        assert resp.status_code == 401
+
+
+class TestFaultInjection:
+
+    def test_rate_limit(self):
+        client = TestClient(create_app(EmulatorSettings(latency_ms=0, jitter_ms=0, rate_limit_rate=1.0, retry_after=7)))
+        resp = client.get("/data/2.5/weather", params={"q": "Taipei", "appid": "k"})
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "7"
+
+    def test_quota_per_minute(self):
+        client = TestClient(create_app(EmulatorSettings(latency_ms=0, jitter_ms=0, quota_per_minute=2)))
+        codes = [
+            client.get("/data/2.5/weather", params={"q": "Taipei", "appid": "k"}).status_code
+            for _ in range(3)
+        ]
+        assert codes == [200, 200, 429]
+
+    def test_error_rate(self):
+        client = TestClient(create_app(EmulatorSettings(latency_ms=0, jitter_ms=0, error_rate=1.0)))
+        resp = client.get("/data/2.5/forecast", params={"q": "Taipei", "appid": "k"})
+        assert resp.status_code == 500
@@ -0,0 +1,114 @@
+"""
+預報準確度追蹤測試 - ForecastAccuracyTracker
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from weather_analysis.forecast_accuracy import ErrorStats, ForecastAccuracyTracker
+
+
+def _slot(target, temp, humidity=70, wind=3.0):
+    return {"datetime": target, "temperature": temp, "humidity": humidity, "wind_speed": wind}
+
+
+def _obs(ts, temp, humidity=70, wind=3.0):
+    return {"timestamp": ts, "temperature": temp, "humidity": humidity, "wind_speed": wind}
+
+
+class TestErrorStats:
+
+    def test_mae_and_bias(self):
+        stats = ErrorStats()
+        for err in (2, -1, 3):
+            stats.update(err)
+        assert stats.mae == pytest.approx(2.0)
+        assert stats.bias == pytest.approx(4 / 3)
+
+    def test_empty(self):
+        assert ErrorStats().mae == 0.0
+
+
+class TestForecastAccuracyTracker:
+    """預報 / 觀測配對與誤差累加"""
+
+    ISSUED = datetime(2026, 3, 1, 0, 0)
+
+    def test_match_by_lead_time(self):
+        tracker = ForecastAccuracyTracker()
+        tracker.record_forecast("Taipei", [
+            _slot(self.ISSUED + timedelta(hours=3), 25),
+            _slot(self.ISSUED + timedelta(hours=24), 20),
+        ], self.ISSUED)
+        assert tracker.record_observation("Taipei", _obs(self.ISSUED + timedelta(hours=3, minutes=10), 24)) == 1
+        assert tracker.record_observation("Taipei", _obs(self.ISSUED + timedelta(hours=24), 22)) == 1
+        assert tracker.summary("Taipei") == [
+            {"lead_hours": 3, "count": 1, "mae": 1.0, "bias": 1.0},
+            {"lead_hours": 24, "count": 1, "mae": 2.0, "bias": -2.0},
+        ]
+
+    def test_slot_matched_once(self):
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=6)
+        tracker.record_forecast("Taipei", [_slot(target, 25)], self.ISSUED)
+        tracker.record_observation("Taipei", _obs(target, 24))
+        assert tracker.record_observation("Taipei", _obs(target + timedelta(minutes=10), 24)) == 0
+        assert tracker.summary("Taipei")[0]["count"] == 1
+
+    def test_same_cycle_registered_once(self):
+        """同一 3 小時更新週期重複抓到的預報只算一次"""
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=9)
+        tracker.record_forecast("Taipei", [_slot(target, 25)], self.ISSUED)
+        tracker.record_forecast("Taipei", [_slot(target, 26)], self.ISSUED + timedelta(minutes=30))
+        tracker.record_observation("Taipei", _obs(target, 24))
+        assert tracker.summary("Taipei") == [{"lead_hours": 9, "count": 1, "mae": 1.0, "bias": 1.0}]
+
+    def test_multiple_issuances_same_target(self):
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=24)
+        tracker.record_forecast("Taipei", [_slot(target, 28)], self.ISSUED)
+        tracker.record_forecast("Taipei", [_slot(target, 25)], self.ISSUED + timedelta(hours=21))
+        assert tracker.record_observation("Taipei", _obs(target, 24)) == 2
+        leads = {r["lead_hours"]: r["mae"] for r in tracker.summary("Taipei")}
+        assert leads == {3: 1.0, 24: 4.0}
+
+    def test_early_observation_not_matched(self):
+        """目標 15:00 的完美預報不應與 13:30 的觀測配對"""
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=15)
+        tracker.record_forecast("Taipei", [_slot(target, 30)], self.ISSUED)
+        assert tracker.record_observation("Taipei", _obs(target - timedelta(minutes=90), 27)) == 0
+        assert tracker.record_observation("Taipei", _obs(target, 30)) == 1
+        assert tracker.summary("Taipei") == [{"lead_hours": 15, "count": 1, "mae": 0.0, "bias": 0.0}]
+
+    @pytest.mark.parametrize("after, expected_mae", [(5, 0.0), (12, 1.0)])
+    def test_nearest_observation_wins(self, after, expected_mae):
+        """目標前 10 分鐘（29°C）與目標後 after 分鐘（30°C）的觀測取較接近者"""
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=15)
+        tracker.record_forecast("Taipei", [_slot(target, 30)], self.ISSUED)
+        assert tracker.record_observation("Taipei", _obs(target - timedelta(minutes=10), 29)) == 0
+        assert tracker.record_observation("Taipei", _obs(target + timedelta(minutes=after), 30)) == 1
+        assert tracker.summary("Taipei")[0]["mae"] == expected_mae
+
+    def test_candidate_scored_after_window(self):
+        """目標前的候選觀測在下一筆（已超過範圍的）觀測到達時計分"""
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=15)
+        tracker.record_forecast("Taipei", [_slot(target, 30)], self.ISSUED)
+        tracker.record_observation("Taipei", _obs(target - timedelta(minutes=5), 28))
+        assert tracker.record_observation("Taipei", _obs(target + timedelta(hours=1), 20)) == 1
+        assert tracker.summary("Taipei")[0]["bias"] == 2.0
+
+    def test_far_observation_not_matched(self):
+        tracker = ForecastAccuracyTracker()
+        tracker.record_forecast("Taipei", [_slot(self.ISSUED + timedelta(hours=12), 25)], self.ISSUED)
+        assert tracker.record_observation("Taipei", _obs(self.ISSUED + timedelta(hours=6), 24)) == 0
+
+    def test_other_metrics_and_cities(self):
+        tracker = ForecastAccuracyTracker()
+        target = self.ISSUED + timedelta(hours=3)
+        tracker.record_forecast("Taipei", [_slot(target, 25, humidity=80)], self.ISSUED)
+        tracker.record_observation("Taipei", _obs(target, 25, humidity=70))
+        assert tracker.summary("Taipei", "humidity")[0]["bias"] == 10
+        assert tracker.summary("Tainan") == []
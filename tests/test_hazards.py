@@ -0,0 +1,125 @@
+"""
+hazards 模組測試 - 全國預報風險掃描（陣列評估、分級、事件合併）
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from weather_analysis.alerts import ALERT_METRICS, AlertRule, AlertSeverity, CompiledRules
+from weather_analysis.hazards import SLOT_LENGTH, forecast_matrix, scan_forecasts
+from weather_analysis.records import ForecastSlot
+
+T0 = datetime(2026, 3, 1, 0)
+
+
+def _slot(i, temperature=25.0, wind_speed=3.0, humidity=60, pop=0):
+    return ForecastSlot(
+        datetime=T0 + i * SLOT_LENGTH, temperature=temperature, feels_like=temperature,
+        temp_min=temperature, temp_max=temperature, humidity=humidity, weather="", weather_main="",
+        icon="01d", wind_speed=wind_speed, clouds=0, pop=pop,
+    )
+
+
+def _forecast(overrides=None, n=8):
+    """overrides: 時段索引 → 欄位值 dict"""
+    overrides = overrides or {}
+    return [_slot(i, **overrides.get(i, {})) for i in range(n)]
+
+
+def _titles(hazards):
+    return [h.title_key for h in hazards]
+
+
+class TestMatrix:
+
+    def test_shape_and_missing_slots(self):
+        cities, times, values = forecast_matrix({"Taipei": _forecast(n=4), "Tainan": _forecast(n=2)})
+        assert cities == ("Taipei", "Tainan")
+        assert values.shape == (2, 4, len(ALERT_METRICS))
+        assert np.isnan(values[1, 3]).all()
+        assert values[0, 0, 0] == 25.0
+
+    def test_since_drops_past_slots(self):
+        _, times, _ = forecast_matrix({"Taipei": _forecast(n=4)}, since=T0 + 2 * SLOT_LENGTH)
+        assert times == (T0 + 2 * SLOT_LENGTH, T0 + 3 * SLOT_LENGTH)
+
+    def test_skips_empty_forecasts(self):
+        cities, _, _ = forecast_matrix({"Taipei": _forecast(n=2), "Tainan": None, "Hualien": []})
+        assert cities == ("Taipei",)
+
+
+class TestScan:
+
+    def test_no_hazards(self):
+        assert scan_forecasts({"Taipei": _forecast()}, now=T0) == ()
+
+    def test_consecutive_slots_merged(self):
+        hot = {"temperature": 34.0}
+        hazards = scan_forecasts({"Taipei": _forecast({2: hot, 3: {"temperature": 35.5}, 4: hot})}, now=T0)
+        assert len(hazards) == 1
+        h = hazards[0]
+        assert h.title_key == "alert.high_temp_title" and h.severity == AlertSeverity.CAUTION
+        assert (h.start, h.end, h.slots) == (T0 + 2 * SLOT_LENGTH, T0 + 5 * SLOT_LENGTH, 3)
+        assert h.peak == 35.5 and h.threshold == 33
+
+    def test_gap_splits_events(self):
+        wet = {"pop": 70}
+        hazards = scan_forecasts({"Taipei": _forecast({1: wet, 3: wet})}, now=T0)
+        assert [h.start for h in hazards] == [T0 + SLOT_LENGTH, T0 + 3 * SLOT_LENGTH]
+
+    def test_hysteresis_merges_short_dip(self):
+        """34 → 32.5（未低於解除門檻 32）→ 34 視為同一事件"""
+        temps = {2: {"temperature": 34.0}, 3: {"temperature": 32.5}, 4: {"temperature": 34.0}}
+        hazards = scan_forecasts({"Taipei": _forecast(temps)}, now=T0)
+        assert [(h.title_key, h.slots) for h in hazards] == [("alert.high_temp_title", 3)]
+
+    def test_custom_rules(self):
+        rules = CompiledRules([AlertRule("feels_like", ">", 30, AlertSeverity.CAUTION, "x_title", "x_msg", "🥵")])
+        hazards = scan_forecasts({"Taipei": _forecast({1: {"temperature": 31.0}})}, now=T0, rules=rules)
+        assert _titles(hazards) == ["x_title"] and hazards[0].peak == 31.0
+
+    def test_tiers_keep_most_severe(self):
+        """同一時段 > 80% 只出暴雨警報，不同時出降雨注意（同 evaluate_alerts 的 elif）"""
+        hazards = scan_forecasts({"Taipei": _forecast({1: {"pop": 70}, 2: {"pop": 90}})}, now=T0)
+        assert [(h.title_key, h.slots) for h in hazards] == [
+            ("alert.rain_title", 1), ("alert.heavy_rain_title", 1),
+        ]
+
+    def test_below_threshold_peak_is_minimum(self):
+        hazards = scan_forecasts({"Taipei": _forecast({0: {"temperature": 8.0}, 1: {"temperature": 6.5}})}, now=T0)
+        assert _titles(hazards) == ["alert.low_temp_title"] and hazards[0].peak == 6.5
+
+    def test_multiple_cities_and_metrics(self):
+        hazards = scan_forecasts({
+            "Taipei": _forecast({5: {"wind_speed": 16.0}}),
+            "Kaohsiung": _forecast({5: {"temperature": 37.0, "humidity": 95}}),
+        }, now=T0)
+        assert {(h.city, h.title_key) for h in hazards} == {
+            ("Taipei", "alert.strong_wind_title"),
+            ("Kaohsiung", "alert.extreme_heat_title"),
+            ("Kaohsiung", "alert.high_humidity_title"),
+        }
+        # 同時開始：DANGER 排在 CAUTION 前
+        assert hazards[-1].severity == AlertSeverity.CAUTION
+
+    def test_sorted_by_start(self):
+        hazards = scan_forecasts({
+            "Taipei": _forecast({6: {"pop": 90}}),
+            "Tainan": _forecast({1: {"pop": 90}}),
+        }, now=T0)
+        assert [h.city for h in hazards] == ["Tainan", "Taipei"]
+
+    def test_past_slots_ignored(self):
+        forecast = _forecast({0: {"temperature": 37.0}})
+        assert scan_forecasts({"Taipei": forecast}, now=T0 + 4 * SLOT_LENGTH) == ()
+
+    def test_event_at_end_of_horizon(self):
+        hazards = scan_forecasts({"Taipei": _forecast({7: {"pop": 90}})}, now=T0)
+        assert hazards[0].end == T0 + 8 * SLOT_LENGTH and hazards[0].peak == 90
+
+    @pytest.mark.parametrize("n_cities", [1, 12])
+    def test_every_slot_hazardous(self, n_cities):
+        forecast = [_slot(i, temperature=40.0) for i in range(40)]
+        hazards = scan_forecasts({f"c{i}": forecast for i in range(n_cities)}, now=T0)
+        assert len(hazards) == n_cities and all(h.slots == 40 for h in hazards)
@@ -0,0 +1,342 @@
+"""
+歷史觀測資料庫測試 - ObservationStore 寫入 / 查詢
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from weather_analysis import forecast_accuracy, history, weather_api
+from weather_analysis.history import (
+    TAIPEI_TZ, ObservationStore, decode_series, encode_series, parse_publish_time,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ObservationStore(str(tmp_path / "history.sqlite3"))
+    yield s
+    s.close()
+
+
+def _make_weather(ts, temp=25.0):
+    return {
+        "timestamp": ts, "temperature": temp, "feels_like": temp + 1,
+        "humidity": 60, "pressure": 1010, "wind_speed": 3.0, "clouds": 20,
+        "weather_main": "Clouds",
+    }
+
+
+class TestObservations:
+    """即時天氣觀測"""
+
+    def test_roundtrip(self, store):
+        ts = datetime(2026, 3, 1, 12, 0)
+        store.record_current("Taipei", _make_weather(ts))
+        rows = store.query_observations("Taipei", ts - timedelta(hours=1), ts + timedelta(hours=1))
+        assert len(rows) == 1
+        assert rows[0]["ts"] == ts
+        assert rows[0]["temperature"] == 25.0
+        assert rows[0]["weather_main"] == "Clouds"
+
+    def test_duplicate_ignored(self, store):
+        """同城市同時間重複寫入（快取 miss 重抓）→ 僅一筆"""
+        ts = datetime(2026, 3, 1, 12, 0)
+        store.record_current("Taipei", _make_weather(ts, 25.0))
+        store.record_current("Taipei", _make_weather(ts, 26.0))
+        rows = store.query_observations("Taipei", ts, ts + timedelta(minutes=1))
+        assert [r["temperature"] for r in rows] == [25.0]
+
+    def test_range_spans_days_and_filters_city(self, store):
+        base = datetime(2026, 3, 1, 22, 0)
+        for i in range(6):
+            store.record_current("Taipei", _make_weather(base + timedelta(hours=i), 20 + i))
+        store.record_current("Tainan", _make_weather(base, 30))
+        rows = store.query_observations("Taipei", base + timedelta(hours=1), base + timedelta(hours=4))
+        assert [r["temperature"] for r in rows] == [21, 22, 23]
+
+    def test_end_exclusive(self, store):
+        ts = datetime(2026, 3, 1, 12, 0)
+        store.record_current("Taipei", _make_weather(ts))
+        assert store.query_observations("Taipei", ts - timedelta(hours=1), ts) == []
+
+
+class TestForecasts:
+    """預報發布"""
+
+    def test_multiple_issuances(self, store):
+        target = datetime(2026, 3, 2, 12, 0)
+        slot = {"datetime": target, "temperature": 24.0, "humidity": 70, "wind_speed": 2.0, "pop": 30}
+        store.record_forecast("Taipei", [slot], datetime(2026, 3, 1, 0, 0))
+        store.record_forecast("Taipei", [{**slot, "temperature": 25.0}], datetime(2026, 3, 1, 6, 0))
+        rows = store.query_forecasts("Taipei", target, target + timedelta(hours=1))
+        assert [r["temperature"] for r in rows] == [24.0, 25.0]
+        assert rows[0]["issued_ts"] == datetime(2026, 3, 1, 0, 0)
+
+    def test_languages_share_issuance(self, store, monkeypatch):
+        """zh_tw / en 快取各自 miss 時，同一次預報發布只寫入一次"""
+        first = int(datetime(2026, 3, 2, 12, 0).timestamp())
+        body = json.dumps({"list": [
+            {"dt": first + i * 3 * 3600,
+             "main": {"temp": 25.0, "feels_like": 25.0, "temp_min": 24.0, "temp_max": 26.0, "humidity": 70},
+             "weather": [{"description": "晴", "main": "Clear", "icon": "01d"}],
+             "wind": {"speed": 2.0}, "clouds": {"all": 0}, "pop": 0.1}
+            for i in range(2)
+        ]}).encode()
+        response = SimpleNamespace(status_code=200, content=body, raise_for_status=lambda: None)
+        tracker = forecast_accuracy.ForecastAccuracyTracker()
+        monkeypatch.setattr(weather_api.upstream, "get_hedged", lambda *a, **kw: response)
+        monkeypatch.setattr(history, "get_store", lambda: store)
+        monkeypatch.setattr(forecast_accuracy, "get_tracker", lambda: tracker)
+        try:
+            for lang in ("zh_tw", "en"):
+                assert weather_api._cached_forecast("k", "Taipei", lang)
+        finally:
+            weather_api._cached_forecast.clear()
+
+        rows = store.query_forecasts("Taipei", datetime(2026, 3, 2), datetime(2026, 3, 3))
+        assert len(rows) == 2
+        assert {r["issued_ts"] for r in rows} == {datetime(2026, 3, 2, 9, 0)}
+        assert all(len(issues) == 1 for issues in tracker._pending["Taipei"].values())
+
+
+class TestAqi:
+    """AQI 測站資料"""
+
+    def test_record_and_query(self, store):
+        records = [
+            {"sitename": "中山", "county": "臺北市", "aqi": "45", "pm2.5": "12",
+             "pm10": "30", "o3": "", "publishtime": "2026/03/01 14:00:00"},
+            {"sitename": "前鎮", "county": "高雄市", "aqi": "120",
+             "publishtime": "2026/03/01 14:00:00"},
+            {"sitename": "無時間", "county": "臺北市", "aqi": "1"},
+        ]
+        store.record_aqi(records)
+        rows = store.query_aqi("臺北市", datetime(2026, 3, 1), datetime(2026, 3, 2))
+        assert len(rows) == 1
+        assert rows[0]["site"] == "中山"
+        assert rows[0]["pm25"] == 12.0
+        assert rows[0]["o3"] is None
+
+    def test_publish_time_is_taipei_time_on_utc_host(self, store, monkeypatch):
+        """publishtime 為台灣時間：UTC 主機上 14:00 應存為 06:00Z"""
+        monkeypatch.setenv("TZ", "UTC")
+        time.tzset()
+        try:
+            store.record_aqi([{"sitename": "中山", "county": "臺北市", "aqi": "45",
+                               "publishtime": "2026/03/01 14:00:00"}])
+            with store._lock:
+                ts, day = store._conn.execute("SELECT ts, day FROM aqi").fetchone()
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+        assert ts == int(datetime(2026, 3, 1, 6, 0, tzinfo=timezone.utc).timestamp())
+        assert day == "2026-03-01"
+
+    def test_query_by_host_local_time_on_utc_host(self, store, monkeypatch):
+        """台灣 03-02 01:00 發布 = UTC 主機的 03-01 17:00，以主機時間查詢應查得到"""
+        monkeypatch.setenv("TZ", "UTC")
+        time.tzset()
+        try:
+            store.record_aqi([{"sitename": "中山", "county": "臺北市", "aqi": "45",
+                               "publishtime": "2026/03/02 01:00:00"}])
+            rows = store.query_aqi("臺北市", datetime(2026, 3, 1, 16), datetime(2026, 3, 1, 18))
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+        assert [r["ts"] for r in rows] == [datetime(2026, 3, 1, 17)]
+
+
+class TestParsePublishTime:
+
+    @pytest.mark.parametrize("value,expected", [
+        ("2026/03/01 14:00:00", datetime(2026, 3, 1, 14, 0, tzinfo=TAIPEI_TZ)),
+        ("2026-03-01 14:00", datetime(2026, 3, 1, 14, 0, tzinfo=TAIPEI_TZ)),
+        ("", None),
+        ("not a date", None),
+    ])
+    def test_formats(self, value, expected):
+        assert parse_publish_time(value) == expected
+
+
+# ── 壓縮 / 彙整 ──
+
+
+class TestDeltaEncoding:
+    """encode_series / decode_series"""
+
+    def test_roundtrip(self):
+        ts = [1_700_000_000 + i * 900 for i in range(96)]
+        vals = [20.0 + (i % 7) * 0.3 - (i % 3) for i in range(96)]
+        out_ts, out_vals = decode_series(encode_series(ts, vals))
+        assert out_ts == ts
+        assert out_vals == pytest.approx(vals, abs=0.05)
+
+    def test_negative_values(self):
+        _, vals = decode_series(encode_series([1, 2, 3], [-3.2, 0.0, 5.5]))
+        assert vals == [-3.2, 0.0, 5.5]
+
+    def test_empty(self):
+        assert decode_series(encode_series([], [])) == ([], [])
+
+    def test_compact_size(self):
+        """一天 96 筆 15 分鐘資料 → 遠小於原始 16 bytes/筆"""
+        ts = [1_700_000_000 + i * 900 for i in range(96)]
+        assert len(encode_series(ts, [25.0] * 96)) < 96 * 2
+
+
+class TestCompact:
+    """ObservationStore.compact / query_rollups"""
+
+    NOW = datetime(2026, 3, 20, 12, 0)
+
+    def _fill(self, store, start, hours, step_minutes=15):
+        ts = start
+        i = 0
+        while ts < start + timedelta(hours=hours):
+            store.record_current("Taipei", _make_weather(ts, 20 + i % 4))
+            ts += timedelta(minutes=step_minutes)
+            i += 1
+
+    def test_raw_rows_rolled_up_and_removed(self, store):
+        old_day = datetime(2026, 3, 1)
+        self._fill(store, old_day, 24)
+        stats = store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+        assert stats["raw_rows"] == 96
+        assert store.query_observations("Taipei", old_day, old_day + timedelta(days=1)) == []
+
+        hourly = store.query_rollups(
+            "observations", "Taipei", "temperature", "hour", old_day, old_day + timedelta(days=1),
+        )
+        assert len(hourly) == 24
+        assert hourly[0] == {"bucket": old_day, "min": 20, "max": 23, "mean": 21.5, "count": 4}
+
+        daily = store.query_rollups(
+            "observations", "Taipei", "temperature", "day", old_day, old_day + timedelta(days=1),
+        )
+        assert daily == [{"bucket": old_day, "min": 20, "max": 23, "mean": 21.5, "count": 96}]
+
+    def test_archive_keeps_raw_series(self, store):
+        old_day = datetime(2026, 3, 1)
+        self._fill(store, old_day, 2)
+        store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+        archived = store.query_archive("observations", "Taipei", "temperature", "2026-03-01")
+        assert [v for _, v in archived] == [20, 21, 22, 23, 20, 21, 22, 23]
+        assert archived[0][0] == old_day
+
+    def test_recent_rows_kept_and_merged(self, store):
+        """保留期內的原始資料不壓縮，查詢時即時彙整"""
+        recent = datetime(2026, 3, 19, 0, 0)
+        self._fill(store, recent, 2)
+        store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+        assert len(store.query_observations("Taipei", recent, recent + timedelta(hours=2))) == 8
+        hourly = store.query_rollups(
+            "observations", "Taipei", "humidity", "hour", recent, recent + timedelta(hours=2),
+        )
+        assert [h["count"] for h in hourly] == [4, 4]
+
+    def test_hourly_retention(self, store):
+        old_day = datetime(2026, 1, 1)
+        self._fill(store, old_day, 1)
+        store.compact(now=self.NOW, raw_days=7, hourly_days=30, daily_days=0)
+        end = old_day + timedelta(days=1)
+        assert store.query_rollups("observations", "Taipei", "temperature", "hour", old_day, end) == []
+        assert len(store.query_rollups("observations", "Taipei", "temperature", "day", old_day, end)) == 1
+        assert store.query_archive("observations", "Taipei", "temperature", "2026-01-01") == []
+
+    def test_day_buckets_merged_across_groups(self, store, monkeypatch):
+        """
+        舊版以台灣日期寫入 day 的 AQI 列：UTC 主機上兩個 day 分組落在同一天 bucket，
+        彙整應合併而非後者覆寫前者
+        """
+        monkeypatch.setenv("TZ", "UTC")
+        time.tzset()
+        try:
+            for day, hour, aqi in (("2026-03-01", 15, 10.0), ("2026-03-02", 17, 90.0)):
+                ts = int(datetime(2026, 3, 1, hour, tzinfo=timezone.utc).timestamp())
+                with store._lock, store._conn:
+                    store._conn.execute(
+                        "INSERT INTO aqi VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        ("中山", "臺北市", day, ts, aqi, None, None, None),
+                    )
+            store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+            daily = store.query_rollups(
+                "aqi", "中山", "aqi", "day", datetime(2026, 3, 1), datetime(2026, 3, 2),
+            )
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+        assert daily == [{"bucket": datetime(2026, 3, 1), "min": 10, "max": 90, "mean": 50, "count": 2}]
+
+    def test_late_rows_merged_into_existing_rollup(self, store):
+        old_day = datetime(2026, 3, 1)
+        self._fill(store, old_day, 1)
+        store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+        store.record_current("Taipei", _make_weather(old_day + timedelta(minutes=5), 30))
+        store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+        hourly = store.query_rollups(
+            "observations", "Taipei", "temperature", "hour", old_day, old_day + timedelta(hours=1),
+        )
+        assert hourly == [{"bucket": old_day, "min": 20, "max": 30, "mean": 23.2, "count": 5}]
+        archived = store.query_archive("observations", "Taipei", "temperature", "2026-03-01")
+        assert [v for _, v in archived] == [20, 30, 21, 22, 23]
+
+    def test_lock_released_between_chunks(self, store):
+        """壓縮分批進行：每個 (key, 日期) 各自取得、釋放一次鎖，抓取端寫入可在批次之間進行"""
+        for day in (1, 2, 3):
+            self._fill(store, datetime(2026, 3, day), 1)
+
+        class CountingLock:
+            def __init__(self):
+                self._lock = threading.Lock()
+                self.acquired = 0
+
+            def __enter__(self):
+                self._lock.acquire()
+                self.acquired += 1
+                return self
+
+            def __exit__(self, *exc):
+                self._lock.release()
+
+        store._lock = CountingLock()
+        chunk = store._compact_chunk
+        seen = []
+
+        def compact_chunk(*args):
+            seen.append(store._lock.acquired)
+            chunk(*args)
+
+        store._compact_chunk = compact_chunk
+        store.compact(now=self.NOW, raw_days=7, hourly_days=90, daily_days=0)
+        assert len(seen) == 3 and len(set(seen)) == 3
+
+    def test_unknown_metric(self, store):
+        with pytest.raises(ValueError):
+            store.query_rollups("observations", "Taipei", "weather_main", "hour", self.NOW, self.NOW)
+
+
+class TestBackgroundCompaction:
+    """自動壓縮在背景執行緒執行，不在寫入路徑上"""
+
+    def test_compact_off_request_path(self, tmp_path, monkeypatch):
+        done = threading.Event()
+        threads = []
+
+        def fake_compact(self, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            done.set()
+            return {}
+
+        monkeypatch.setattr(history.ObservationStore, "compact", fake_compact)
+        monkeypatch.setattr(history.config, "HISTORY_DB_PATH", str(tmp_path / "h.sqlite3"))
+        monkeypatch.setattr(history, "_store", None)
+        history.record_current("Taipei", _make_weather(datetime(2026, 3, 1, 12)))
+        assert done.wait(2)
+        assert threads == ["history-compact"]
+        history.get_store().close()
+
+    def test_disabled_interval(self, store):
+        assert history._start_compaction(store, 0) is False
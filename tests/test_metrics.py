@@ -0,0 +1,83 @@
+"""
+效能指標測試 - 計數器 / 直方圖輸出格式、階段計時、快取命中統計
+"""
+import inspect
+import urllib.request
+
+import pytest
+
+from weather_analysis import metrics
+from weather_analysis.metrics import Counter, Histogram, Registry
+
+
+class TestExposition:
+    """Prometheus text format"""
+
+    def test_counter(self):
+        registry = Registry()
+        c = registry.register(Counter("demo_total", "Demo.", ("service", "status")))
+        c.inc(service="owm", status="200")
+        c.inc(2, service="owm", status="200")
+        c.inc(service="owm", status="429")
+        text = registry.render()
+        assert "# TYPE demo_total counter" in text
+        assert 'demo_total{service="owm",status="200"} 3' in text
+        assert 'demo_total{service="owm",status="429"} 1' in text
+
+    def test_histogram_cumulative_buckets(self):
+        registry = Registry()
+        h = registry.register(Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0)))
+        for v in (0.05, 0.5, 0.5, 3.0):
+            h.observe(v, stage="parse")
+        text = registry.render()
+        assert 'demo_seconds_bucket{stage="parse",le="0.1"} 1' in text
+        assert 'demo_seconds_bucket{stage="parse",le="1.0"} 3' in text
+        assert 'demo_seconds_bucket{stage="parse",le="+Inf"} 4' in text
+        assert 'demo_seconds_count{stage="parse"} 4' in text
+        assert 'demo_seconds_sum{stage="parse"} 4.05' in text
+
+    def test_label_escaping(self):
+        c = Counter("esc_total", "Esc.", ("city",))
+        c.inc(city='a"b')
+        assert c.samples() == ['esc_total{city="a\\"b"} 1']
+
+    def test_duplicate_name(self):
+        registry = Registry()
+        registry.register(Counter("dup_total", "Dup."))
+        with pytest.raises(ValueError):
+            registry.register(Counter("dup_total", "Dup."))
+
+
+class TestTimed:
+
+    def test_context_manager(self):
+        before = (metrics.STAGE_SECONDS.snapshot(stage="test_cm") or {"count": 0})["count"]
+        with metrics.timed("test_cm"):
+            pass
+        assert metrics.STAGE_SECONDS.snapshot(stage="test_cm")["count"] == before + 1
+
+    def test_decorator_records_on_exception(self):
+        @metrics.timed("test_raise")
+        def boom():
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            boom()
+        assert metrics.STAGE_SECONDS.snapshot(stage="test_raise")["count"] >= 1
+
+
+class TestHttpServer:
+
+    def test_serves_metrics(self):
+        import socket
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        if not metrics.start_http_server(port, host="127.0.0.1"):
+            pytest.skip("metrics server already running in this process")
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert "# TYPE weather_stage_seconds histogram" in body
+
+    def test_binds_localhost_by_default(self):
+        assert inspect.signature(metrics.start_http_server).parameters["host"].default == "127.0.0.1"
@@ -0,0 +1,77 @@
+"""
+payload 模組測試 - JSON 解碼與格式驗證
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from weather_analysis import payload
+from weather_analysis.aqi_api import parse_aqi_payload
+from weather_analysis.records import ForecastSlot
+from weather_analysis.weather_api import parse_current_weather, parse_forecast
+
+
+def _response(data) -> SimpleNamespace:
+    raw = data if isinstance(data, bytes) else json.dumps(data).encode("utf-8")
+    return SimpleNamespace(content=raw)
+
+
+def _forecast_item(**main):
+    return {
+        "dt": 1772330400,
+        "main": {"temp": 25.04, "feels_like": 26, "temp_min": 22, "temp_max": 28, "humidity": 60, **main},
+        "weather": [{"description": "晴", "main": "Clear", "icon": "01d"}],
+        "wind": {"speed": 3.06}, "clouds": {"all": 10}, "pop": 0.35,
+        "sys": {"pod": "d"}, "dt_txt": "2026-03-01 02:00:00",  # 未使用欄位
+    }
+
+
+@pytest.fixture(params=["orjson", "json"])
+def decoder(request, monkeypatch):
+    """orjson 與標準庫 json 兩種解碼路徑"""
+    if request.param == "json":
+        monkeypatch.setattr(payload, "orjson", None)
+    elif payload.orjson is None:
+        pytest.skip("orjson 未安裝")
+    return request.param
+
+
+class TestDecode:
+
+    def test_forecast(self, decoder):
+        items = payload.decode(_response({"list": [_forecast_item()] * 3}), parse_forecast)
+        assert len(items) == 3 and isinstance(items[0], ForecastSlot)
+        assert items[0].temperature == 25.0 and items[0].humidity == 60
+
+    def test_numeric_strings_coerced(self, decoder):
+        item = payload.decode(_response({"list": [_forecast_item(humidity="60")]}), parse_forecast)[0]
+        assert item.humidity == 60
+
+    def test_parser_args(self, decoder):
+        data = {
+            "main": {"temp": 25, "feels_like": 26, "temp_min": 22, "temp_max": 28, "humidity": 60, "pressure": 1012},
+            "weather": [{"description": "晴", "main": "Clear", "icon": "01d"}],
+            "wind": {"speed": 3}, "clouds": {"all": 10},
+            "sys": {"sunrise": 1772316000, "sunset": 1772358000}, "dt": 1772330400,
+        }
+        weather = payload.decode(_response(data), parse_current_weather, "Taipei", "en")
+        assert weather["city"] == "Taipei" and weather["pressure"] == 1012
+
+    def test_aqi(self, decoder):
+        records = payload.decode(_response({"records": [{"sitename": "中山", "aqi": "42"}]}), parse_aqi_payload)
+        assert records == [{"sitename": "中山", "aqi": "42"}]
+
+    @pytest.mark.parametrize("data", [
+        {"list": [{"dt": 1772330400}]},                       # 缺欄位
+        {"list": [_forecast_item(temp="hot")]},               # 型別不符
+        {"list": [{**_forecast_item(), "weather": []}]},      # 空陣列
+        {"message": "city not found"},
+        b"<html>502 Bad Gateway</html>",                     # 非 JSON
+    ])
+    def test_invalid_payload(self, decoder, data):
+        with pytest.raises(payload.PayloadError, match="parse_forecast"):
+            payload.decode(_response(data), parse_forecast)
+
+    def test_error_is_value_error(self):
+        assert issubclass(payload.PayloadError, ValueError)
@@ -0,0 +1,58 @@
+"""
+效能剖析測試 - 管理者 token、熱點摘要、剖析檔保留數
+"""
+import cProfile
+import os
+import pstats
+
+from weather_analysis.profiling import is_admin_token, summarize, write_profile
+
+
+def _busy():
+    return sum(i * i for i in range(20000))
+
+
+def _profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    _busy()
+    profiler.disable()
+    return profiler
+
+
+class TestAdminToken:
+
+    def test_match(self):
+        assert is_admin_token("s3cret", "s3cret")
+
+    def test_mismatch(self):
+        assert not is_admin_token("guess", "s3cret")
+
+    def test_unset_token_rejects_everything(self):
+        """未設定 PROFILE_ADMIN_TOKEN → 網址參數無法啟用"""
+        assert not is_admin_token("", "")
+        assert not is_admin_token("anything", "")
+
+
+class TestSummarize:
+
+    def test_top_n_sorted_by_self_time(self):
+        rows = summarize(pstats.Stats(_profile()), top_n=3)
+        assert len(rows) <= 3
+        assert rows == sorted(rows, key=lambda r: r["tottime_ms"], reverse=True)
+        assert any("_busy" in r["function"] or "genexpr" in r["function"] for r in rows)
+        assert set(rows[0]) == {"function", "ncalls", "tottime_ms", "cumtime_ms"}
+
+
+class TestWriteProfile:
+
+    def test_loadable(self, tmp_path):
+        path = write_profile(_profile(), str(tmp_path), "abcd1234")
+        assert path.endswith("-abcd1234.prof")
+        assert pstats.Stats(path).total_calls > 0
+
+    def test_keeps_latest(self, tmp_path):
+        profiler = _profile()
+        paths = [write_profile(profiler, str(tmp_path), f"s{i}", keep=2) for i in range(4)]
+        remaining = sorted(os.listdir(tmp_path))
+        assert remaining == sorted(os.path.basename(p) for p in paths[-2:])
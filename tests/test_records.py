@@ -0,0 +1,67 @@
+"""
+records 模組測試 - slots 紀錄的屬性 / dict 相容存取
+"""
+import copy
+import pickle
+from datetime import datetime
+
+import pytest
+
+from weather_analysis.records import AqiStation, ForecastSlot
+from weather_analysis.weather_api import build_daily_summary, parse_forecast
+
+
+def _slot(hour=9, temp=25.0):
+    return ForecastSlot(
+        datetime=datetime(2026, 3, 1, hour), temperature=temp, feels_like=26.0,
+        temp_min=22.0, temp_max=28.0, humidity=60, weather="clear", weather_main="Clear",
+        icon="01d", wind_speed=3.0, clouds=10, pop=20,
+    )
+
+
+class TestRecord:
+
+    def test_no_instance_dict(self):
+        assert not hasattr(_slot(), "__dict__")
+
+    def test_mapping_access(self):
+        slot = _slot()
+        assert slot["temperature"] == slot.temperature == 25.0
+        assert slot.get("missing", 1) == 1
+        assert "pop" in slot and "missing" not in slot
+        with pytest.raises(KeyError):
+            slot["missing"]
+
+    def test_as_dict(self):
+        data = _slot().as_dict()
+        assert list(data) == list(ForecastSlot.__match_args__)
+        assert dict(_slot()) == data
+
+    def test_immutable_and_shared_on_copy(self):
+        slot = _slot()
+        with pytest.raises(AttributeError):
+            slot.temperature = 0
+        assert copy.deepcopy(slot) is slot
+
+    def test_pickle_roundtrip(self):
+        station = AqiStation("中山", "臺北市", 42, 10.0, None, 30.0, "", "良好", "2026/03/01 14:00:00")
+        assert pickle.loads(pickle.dumps(station)) == station
+
+
+class TestParse:
+
+    def test_parse_forecast(self):
+        data = {"list": [{
+            "dt": 1772330400,
+            "main": {"temp": 25.04, "feels_like": 26, "temp_min": 22, "temp_max": 28, "humidity": 60},
+            "weather": [{"description": "晴", "main": "Clear", "icon": "01d"}],
+            "wind": {"speed": 3.06}, "clouds": {"all": 10}, "pop": 0.35,
+        }]}
+        slot = parse_forecast(data)[0]
+        assert isinstance(slot, ForecastSlot)
+        assert slot.temperature == 25.0 and slot.wind_speed == 3.1 and slot.pop == 35
+
+    def test_daily_summary(self):
+        daily = build_daily_summary([_slot(9, 20.0), _slot(12, 30.0)])
+        assert daily[0].temp_avg == 25.0 and daily[0].pop_max == 20
+        assert daily[0]["date"] == datetime(2026, 3, 1).date()
@@ -0,0 +1,200 @@
+"""
+全國快照測試 - 建立內容、版本替換、過期重建、來源涵蓋、缺漏城市補齊
+"""
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from weather_analysis import config, snapshot, weather_api
+from weather_analysis.records import DailySummary, ForecastSlot
+
+
+def _make_current(city, temperature=38.0):
+    return {
+        "city": city, "city_tw": city, "temperature": temperature, "feels_like": 40.0,
+        "humidity": 60, "wind_speed": 3.0, "weather": "clear",
+        "timestamp": datetime(2026, 3, 1, 12),
+    }
+
+
+def _make_forecast():
+    return [
+        ForecastSlot(
+            datetime=datetime(2026, 3, day, hour),
+            temperature=25.0, feels_like=26.0, temp_min=22.0, temp_max=28.0,
+            humidity=60, weather="clear", weather_main="Clear", icon="01d",
+            wind_speed=3.0, clouds=10, pop=10,
+        )
+        for day in (1, 2) for hour in (9, 12, 15)
+    ]
+
+
+_AQI_RECORDS = [
+    {"county": "臺北市", "sitename": "中山", "aqi": "42", "pm2.5": "10"},
+    {"county": "高雄市", "sitename": "前金", "aqi": "120", "pm2.5": "55"},
+]
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """以假資料取代上游查詢，記錄查詢次數"""
+    counts = {"current": 0, "aqi": 0}
+
+    def fake_current(self, city):
+        counts["current"] += 1
+        return _make_current(city)
+
+    monkeypatch.setattr(snapshot.WeatherAPI, "get_current_weather", fake_current)
+    monkeypatch.setattr(snapshot.WeatherAPI, "get_forecast", lambda self, city, days=5: _make_forecast())
+
+    def fake_aqi(api_key):
+        counts["aqi"] += 1
+        return _AQI_RECORDS
+
+    monkeypatch.setattr(snapshot, "fetch_aqi_data", fake_aqi)
+    monkeypatch.setattr(snapshot.anomaly, "current_alerts", lambda city: [])
+    snapshot.invalidate()
+    yield counts
+    snapshot.invalidate()
+
+
+class TestBuild:
+
+    def test_all_cities(self, calls):
+        snap = snapshot.build("en", owm_key="k", aqi_key="a")
+        assert set(snap.cities) == set(config.TAIWAN_CITIES_COORDS)
+        taipei = snap.city("Taipei")
+        assert taipei.current["city"] == "Taipei"
+        assert len(taipei.daily_summary) == 2
+        assert taipei.travel and taipei.travel[0]["date"] == datetime(2026, 3, 1).date()
+        # 38°C → 規則引擎高溫警報
+        assert any(a.title_key == "alert.extreme_heat_title" for a in taipei.alerts)
+        assert calls["current"] == len(config.TAIWAN_CITIES_COORDS)
+        assert calls["aqi"] == 1
+
+    def test_aqi_ranking(self, calls):
+        snap = snapshot.build("en", owm_key="k", aqi_key="a")
+        assert snap.aqi_available
+        assert [r["city_en"] for r in snap.aqi_ranking] == ["Kaohsiung", "Taipei"]
+        assert snap.city("Kaohsiung").aqi["aqi"] == 120
+        assert snap.city("Hualien").aqi is None
+
+    def test_read_only(self, calls):
+        snap = snapshot.build("en", owm_key="k")
+        view = snap.city("Taipei")
+        assert isinstance(view.daily_summary[0], DailySummary)
+        with pytest.raises(TypeError):
+            view.daily_summary[0]["temp_max"] = 0
+        with pytest.raises(AttributeError):
+            view.daily_summary[0].temp_max = 0
+        with pytest.raises(AttributeError):
+            view.current = None
+
+    def test_hazard_timeline(self, calls, monkeypatch):
+        """全國預報風險：只有 Tainan 未來兩個時段高溫（其他城市預報時段已過）"""
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=3)
+        hot = [
+            ForecastSlot(start + timedelta(hours=3 * i), 37.0, 39.0, 36.0, 38.0, 50, "clear", "Clear",
+                         "01d", 2.0, 0, 0)
+            for i in range(2)
+        ]
+        monkeypatch.setattr(snapshot.WeatherAPI, "get_forecast",
+                            lambda self, city, days=5: hot if city == "Tainan" else _make_forecast())
+        snap = snapshot.build("en", owm_key="k")
+        assert [(h.city, h.title_key, h.slots) for h in snap.hazards] == [
+            ("Tainan", "alert.extreme_heat_title", 2),
+        ]
+
+    def test_onecall_shared_by_uv_and_alerts(self, calls, monkeypatch):
+        """UV 與官方警報共用快取的 One Call 回應：多次建立 / 多語言快照每座標只請求一次"""
+        requests = []
+        body = json.dumps({
+            "current": {"dt": int(time.time()), "uvi": 6.5},
+            "alerts": [{"event": "Heavy Rain", "description": "Heavy rain advisory"}],
+        }).encode()
+
+        def fake_get(service, url, **kwargs):
+            requests.append(kwargs["params"]["lat"])
+            return SimpleNamespace(status_code=200, content=body, raise_for_status=lambda: None)
+
+        monkeypatch.setattr(weather_api.upstream, "get", fake_get)
+        weather_api._cached_onecall.clear()
+        try:
+            snapshot.build("en", owm_key="k", onecall_key="o")
+            snap = snapshot.build("zh_tw", owm_key="k", onecall_key="o")
+        finally:
+            weather_api._cached_onecall.clear()
+        assert len(requests) == len(config.TAIWAN_CITIES_COORDS)
+        taipei = snap.city("Taipei")
+        assert taipei.uv["uvi"] == 6.5
+        assert [a.event for a in taipei.alerts if a.event] == ["Heavy Rain"]
+
+    def test_missing_sources(self, calls):
+        snap = snapshot.build("en")
+        assert snap.sources == frozenset()
+        assert snap.city("Taipei").current is None
+        assert not snap.aqi_available
+        assert snap.city("Unknown").current is None
+
+
+class TestCurrent:
+
+    def test_reused_until_invalidated(self, calls):
+        first = snapshot.current("en", owm_key="k")
+        assert snapshot.current("en", owm_key="k") is first
+        snapshot.invalidate()
+        second = snapshot.current("en", owm_key="k")
+        assert second is not first
+        assert second.version > first.version
+
+    def test_per_language(self, calls):
+        assert snapshot.current("en", owm_key="k") is not snapshot.current("zh_tw", owm_key="k")
+
+    def test_expired_rebuilt(self, calls, monkeypatch):
+        first = snapshot.current("en", owm_key="k")
+        monkeypatch.setattr(config, "SNAPSHOT_MAX_AGE_SECONDS", 0)
+        assert snapshot.current("en", owm_key="k") is not first
+
+    def test_rebuilt_for_missing_source(self, calls):
+        """快照缺少使用者擁有 Key 的來源（AQI）時重建"""
+        without_aqi = snapshot.current("en", owm_key="k")
+        with_aqi = snapshot.current("en", owm_key="k", aqi_key="a")
+        assert with_aqi is not without_aqi and with_aqi.aqi_available
+        # 較少來源的請求可直接共用
+        assert snapshot.current("en", owm_key="k") is with_aqi
+
+
+class TestIncomplete:
+
+    @pytest.fixture
+    def flaky(self, calls, monkeypatch):
+        """Hualien 取不到資料（如背景預取被限流跳過）"""
+        missing = {"Hualien"}
+
+        def fake_current(self, city):
+            return None if city in missing else _make_current(city)
+
+        monkeypatch.setattr(snapshot.WeatherAPI, "get_current_weather", fake_current)
+        return missing
+
+    def test_incomplete_cities_recorded(self, flaky):
+        snap = snapshot.build("en", owm_key="k")
+        assert snap.incomplete == {"Hualien"}
+
+    def test_retry_sooner(self, flaky, monkeypatch):
+        first = snapshot.current("en", owm_key="k")
+        assert snapshot.current("en", owm_key="k") is first
+        monkeypatch.setattr(config, "SNAPSHOT_RETRY_SECONDS", 0)
+        assert snapshot.current("en", owm_key="k") is not first
+
+    def test_focus_city_missing_rebuilds_once(self, flaky):
+        first = snapshot.current("en", owm_key="k", focus="Taipei")
+        second = snapshot.current("en", owm_key="k", focus="Hualien")
+        assert second is not first and second.focus == "Hualien"
+        # 已優先查詢過仍失敗 → 等一般重試間隔，不在每次 rerun 重建
+        assert snapshot.current("en", owm_key="k", focus="Hualien") is second
+        flaky.clear()
+        assert snapshot.current("en", owm_key="k", focus="Hualien") is second
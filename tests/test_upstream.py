@@ -0,0 +1,410 @@
+"""
+上游呼叫測試 - token bucket 限流、優先序、Retry-After、斷路器、對沖請求
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from weather_analysis import config, deadline, upstream
+from weather_analysis.upstream import (
+    PRIORITY_BACKGROUND, PRIORITY_USER, CircuitBreaker, CircuitOpen, Hedger, RateLimited,
+    TokenBucket, parse_retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket:
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, burst=2, clock=clock)  # 每秒 1 個
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == pytest.approx(1.0)
+        clock.now += 1
+        assert bucket.try_acquire() == 0
+
+    def test_unlimited(self):
+        bucket = TokenBucket(0, burst=1, clock=FakeClock())
+        assert all(bucket.try_acquire() == 0 for _ in range(100))
+
+    def test_background_keeps_reserve(self):
+        """背景請求不可動用保留額度，使用者請求可以"""
+        bucket = TokenBucket(60, burst=10, reserve=0.3, clock=FakeClock())
+        taken = 0
+        while bucket.try_acquire(PRIORITY_BACKGROUND) == 0:
+            taken += 1
+        assert taken == 7
+        assert bucket.try_acquire(PRIORITY_USER) == 0
+
+    def test_acquire_waits(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, burst=1, clock=clock)
+        assert bucket.acquire(PRIORITY_USER, timeout=5, sleep=clock.sleep) == 0
+        assert bucket.acquire(PRIORITY_USER, timeout=5, sleep=clock.sleep) == pytest.approx(1.0)
+
+    def test_acquire_timeout(self):
+        clock = FakeClock()
+        bucket = TokenBucket(6, burst=1, clock=clock)  # 每 10 秒 1 個
+        bucket.acquire(PRIORITY_USER, timeout=1, sleep=clock.sleep)
+        with pytest.raises(RateLimited):
+            bucket.acquire(PRIORITY_USER, timeout=1, sleep=clock.sleep)
+
+    def test_block_applies_even_when_unlimited(self):
+        clock = FakeClock()
+        bucket = TokenBucket(0, burst=1, clock=clock)
+        bucket.block(3)
+        assert bucket.try_acquire() == pytest.approx(3)
+        clock.now += 3
+        assert bucket.try_acquire() == 0
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_consecutive_failures(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(3, reset_seconds=30, clock=clock)
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record_failure()
+        breaker.record_success()  # 成功即重新計數
+        for _ in range(3):
+            assert breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_half_open_single_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(1, reset_seconds=30, clock=clock)
+        breaker.allow()
+        breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow()       # 探測請求
+        assert not breaker.allow()   # 探測進行中，其他請求不放行
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(5, reset_seconds=30, clock=clock)
+        for _ in range(5):
+            breaker.allow()
+            breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_release_frees_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(1, reset_seconds=0, clock=clock)
+        breaker.allow()
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.allow()
+
+
+def _hedger(**overrides):
+    params = dict(window=100, min_samples=10, percentile=0.95, min_delay=0.0, max_delay=10.0,
+                  max_ratio=0.1, burst=2)
+    params.update(overrides)
+    return Hedger(**params)
+
+
+class TestHedger:
+
+    def test_no_delay_until_enough_samples(self):
+        hedger = _hedger()
+        for _ in range(9):
+            hedger.record(0.1)
+        assert hedger.delay() is None
+        hedger.record(0.1)
+        assert hedger.delay() == pytest.approx(0.1)
+
+    def test_delay_is_percentile(self):
+        hedger = _hedger()
+        for i in range(100):
+            hedger.record(i / 100)
+        assert hedger.delay() == pytest.approx(0.95)
+
+    def test_delay_clamped(self):
+        hedger = _hedger(min_delay=0.2, max_delay=0.5)
+        for _ in range(10):
+            hedger.record(0.01)
+        assert hedger.delay() == 0.2
+        for _ in range(10):
+            hedger.record(5.0)
+        assert hedger.delay() == 0.5
+
+    def test_budget_bounds_extra_load(self):
+        hedger = _hedger(max_ratio=0.1, burst=2)
+        spent = 0
+        for _ in range(100):
+            hedger.on_request()
+            spent += hedger.try_spend()
+        assert spent == 10
+        for _ in range(100):
+            hedger.on_request()
+        assert hedger.try_spend() and hedger.try_spend() and not hedger.try_spend()
+
+
+class TestRetryAfter:
+
+    @pytest.mark.parametrize("value,expected", [
+        ("2", 2.0), ("0", 0.0), (None, 1.0), ("garbage", 1.0), ("-5", 0.0),
+    ])
+    def test_parse(self, value, expected):
+        assert parse_retry_after(value) == expected
+
+    def test_http_date_in_past(self):
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def _response(status, retry_after=None):
+    headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    return SimpleNamespace(status_code=status, headers=headers)
+
+
+class TestGet:
+
+    @pytest.fixture(autouse=True)
+    def _fresh_buckets(self):
+        upstream.reset_limits()
+        yield
+        upstream.reset_limits()
+
+    def test_retries_short_retry_after(self, monkeypatch):
+        responses = [_response(429, "0"), _response(200)]
+        monkeypatch.setattr(upstream.requests, "get", lambda url, **kw: responses.pop(0))
+        resp = upstream.get(upstream.OWM_WEATHER, "http://owm.test/weather", params={"appid": "k"})
+        assert resp.status_code == 200
+        assert not responses
+
+    def test_long_retry_after_returned_and_blocks(self, monkeypatch):
+        calls = []
+
+        def fake_get(url, **kw):
+            calls.append(url)
+            return _response(429, "3600")
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        url = "http://owm.test/weather"
+        resp = upstream.get(upstream.OWM_WEATHER, url, params={"appid": "k"})
+        assert resp.status_code == 429 and len(calls) == 1
+        # 同主機同 Key 暫停中 → 不送出請求
+        with pytest.raises(RateLimited):
+            upstream.get(upstream.OWM_WEATHER, url, params={"appid": "k"})
+        assert len(calls) == 1
+        # 其他 API Key 不受影響
+        upstream.get(upstream.OWM_WEATHER, url, params={"appid": "other"})
+        assert len(calls) == 2
+
+    def test_per_host_limits(self, monkeypatch):
+        monkeypatch.setitem(config.UPSTREAM_RATE_LIMITS, "limited.test", (60, 3))
+        assert upstream.get_bucket("https://limited.test/a").capacity == 3
+        assert upstream.get_bucket("https://limited.test/b") is upstream.get_bucket("https://limited.test/c")
+        assert upstream.get_bucket("https://limited.test/a", "k1") is not upstream.get_bucket(
+            "https://limited.test/a", "k2")
+
+    def test_circuit_opens_on_server_errors(self, monkeypatch):
+        monkeypatch.setattr(config, "CIRCUIT_FAILURE_THRESHOLD", 2)
+        calls = []
+
+        def fake_get(url, **kw):
+            calls.append(url)
+            return _response(503)
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        for _ in range(2):
+            assert upstream.get(upstream.OWM_FORECAST, "http://owm.test/forecast").status_code == 503
+        with pytest.raises(CircuitOpen):
+            upstream.get(upstream.OWM_FORECAST, "http://owm.test/forecast")
+        assert len(calls) == 2
+        # 其他服務不受影響
+        upstream.get(upstream.OWM_WEATHER, "http://owm.test/weather")
+        assert len(calls) == 3
+
+    def test_client_errors_do_not_trip(self, monkeypatch):
+        monkeypatch.setattr(config, "CIRCUIT_FAILURE_THRESHOLD", 1)
+        monkeypatch.setattr(upstream.requests, "get", lambda url, **kw: _response(401))
+        for _ in range(3):
+            assert upstream.get(upstream.OWM_WEATHER, "http://owm.test/weather").status_code == 401
+
+    def test_priority_context(self):
+        with upstream.priority(PRIORITY_BACKGROUND):
+            assert upstream._priority.get() == PRIORITY_BACKGROUND
+        assert upstream._priority.get() == PRIORITY_USER
+
+
+class TestGetHedged:
+
+    @pytest.fixture(autouse=True)
+    def _hedging(self, monkeypatch):
+        monkeypatch.setattr(config, "UPSTREAM_HEDGE_SERVICES", (upstream.OWM_WEATHER,))
+        monkeypatch.setattr(config, "HEDGE_MIN_SAMPLES", 5)
+        monkeypatch.setattr(config, "HEDGE_MIN_DELAY_SECONDS", 0.05)
+        monkeypatch.setattr(config, "HEDGE_MAX_RATIO", 1.0)
+        upstream.reset_limits()
+        hedger = upstream.get_hedger(upstream.OWM_WEATHER)
+        for _ in range(5):
+            hedger.record(0.01)
+        yield
+        upstream.reset_limits()
+
+    def _slow_first(self, monkeypatch, first_delay=1.0):
+        """第一個請求很慢，之後的請求立即回應"""
+        calls = []
+        lock = threading.Lock()
+
+        def fake_get(url, **kw):
+            with lock:
+                calls.append(url)
+                n = len(calls)
+            if n == 1:
+                time.sleep(first_delay)
+                return _response(200, "slow")
+            return _response(200, "fast")
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        return calls
+
+    def test_hedge_wins_on_slow_primary(self, monkeypatch):
+        calls = self._slow_first(monkeypatch)
+        start = time.perf_counter()
+        resp = upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather")
+        assert time.perf_counter() - start < 0.5
+        assert resp.headers["Retry-After"] == "fast"
+        assert len(calls) == 2
+
+    def test_fast_primary_not_hedged(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(upstream.requests, "get", lambda url, **kw: calls.append(url) or _response(200))
+        for _ in range(5):
+            upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather")
+        assert len(calls) == 5
+
+    def test_no_budget_waits_for_primary(self, monkeypatch):
+        monkeypatch.setattr(config, "HEDGE_MAX_RATIO", 0.01)
+        upstream.reset_limits()
+        hedger = upstream.get_hedger(upstream.OWM_WEATHER)
+        for _ in range(5):
+            hedger.record(0.01)
+        calls = self._slow_first(monkeypatch, first_delay=0.2)
+        resp = upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather")
+        assert resp.headers["Retry-After"] == "slow"
+        assert len(calls) == 1
+
+    def test_primary_error_falls_back_to_hedge(self, monkeypatch):
+        calls = []
+
+        def fake_get(url, **kw):
+            calls.append(url)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                raise upstream.requests.exceptions.ConnectionError("reset")
+            time.sleep(0.3)
+            return _response(200)
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        assert upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather").status_code == 200
+
+    def test_5xx_primary_waits_for_pending_hedge(self, monkeypatch):
+        calls = []
+        lock = threading.Lock()
+
+        def fake_get(url, **kw):
+            with lock:
+                calls.append(url)
+                n = len(calls)
+            if n == 1:
+                time.sleep(0.2)
+                return _response(503)
+            time.sleep(0.3)
+            return _response(200)
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        assert upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather").status_code == 200
+
+    def test_primary_not_in_hedge_pool(self, monkeypatch):
+        """對沖池滿載時，原請求不需排隊，對沖等待時間也不含排隊時間"""
+        threads = []
+        release = threading.Event()
+
+        def fake_get(url, **kw):
+            threads.append(threading.current_thread().name)
+            return _response(200)
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        pool = upstream._get_hedge_pool()
+        busy = [pool.submit(release.wait) for _ in range(config.HEDGE_WORKERS)]
+        try:
+            start = time.perf_counter()
+            assert upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather").status_code == 200
+            assert time.perf_counter() - start < 0.5
+        finally:
+            release.set()
+            for future in busy:
+                future.result()
+        assert threads and threads[0].startswith("upstream-primary")
+
+    def test_saturated_primary_pool_bounded_by_deadline(self, monkeypatch):
+        """原請求池滿載時等待不超過時間預算，預算用完時拋出 DeadlineExceeded 而非無限等待"""
+        calls = []
+        monkeypatch.setattr(upstream.requests, "get", lambda url, **kw: calls.append(url) or _response(200))
+        release = threading.Event()
+        pool = upstream._get_primary_pool()
+        busy = [pool.submit(release.wait) for _ in range(config.HEDGE_PRIMARY_WORKERS)]
+        try:
+            start = time.perf_counter()
+            with deadline.budget(0.5), pytest.raises(deadline.DeadlineExceeded):
+                upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather")
+            assert time.perf_counter() - start < 1.0
+        finally:
+            release.set()
+            for future in busy:
+                future.result()
+        assert calls == []
+
+    def test_saturated_primary_pool_sent_directly(self, monkeypatch):
+        """預算內排不到原請求池時，改在呼叫端執行緒直接送出"""
+        threads = []
+
+        def fake_get(url, **kw):
+            threads.append(threading.current_thread().name)
+            return _response(200)
+
+        monkeypatch.setattr(upstream.requests, "get", fake_get)
+        monkeypatch.setattr(config, "DEADLINE_MIN_REQUEST_SECONDS", 0.05)
+        release = threading.Event()
+        pool = upstream._get_primary_pool()
+        busy = [pool.submit(release.wait) for _ in range(config.HEDGE_PRIMARY_WORKERS)]
+        # 預算只夠等待排隊一小段：剩餘預算在請求送出前仍高於下限
+        monkeypatch.setattr(upstream.deadline, "remaining", lambda: 0.1)
+        try:
+            resp = upstream.get_hedged(upstream.OWM_WEATHER, "http://owm.test/weather")
+        finally:
+            release.set()
+            for future in busy:
+                future.result()
+        assert resp.status_code == 200
+        assert threads == [threading.current_thread().name]
+
+    def test_not_enabled_service(self, monkeypatch):
+        calls = self._slow_first(monkeypatch, first_delay=0.2)
+        upstream.get_hedged(upstream.OWM_FORECAST, "http://owm.test/forecast")
+        assert len(calls) == 1